@@ -6,6 +6,7 @@ import shutil
 
 import cv2
 from gfpgan import GFPGANer
+from service import Wav2LipService
 
 # This check is for Hugging Face Spaces environment
 try:
@@ -27,6 +28,9 @@ if not os.path.exists(GFPGAN_WEIGHTS):
 # Initialize Restorer
 restorer = GFPGANer(model_path=GFPGAN_WEIGHTS, upscale=2, arch='clean', channel_multiplier=2, bg_upsampler=None)
 
+# Keep Wav2Lip + face detector loaded between requests
+lipsync = Wav2LipService("checkpoints/wav2lip_gan.pth")
+
 # Fallback decorator
 def gpu_decorator(duration=120):
     if has_gpu:
@@ -45,17 +49,8 @@ def sync_lip(face_file, audio_file, resize_factor):
     final_output = f"results/{job_id}_FINAL_HD.mp4"
     
     # 1. Wav2Lip Syncing
-    command = [
-        "python", "inference.py",
-        "--checkpoint_path", "checkpoints/wav2lip_gan.pth",
-        "--face", face_file,
-        "--audio", audio_file,
-        "--outfile", temp_output,
-        "--resize_factor", str(int(resize_factor))
-    ]
-    
     try:
-        subprocess.run(command, capture_output=True, text=True)
+        lipsync.run(face_file, audio_file, temp_output, resize_factor=int(resize_factor))
         
         # 2. GFPGAN Enhancement
         video_cap = cv2.VideoCapture(temp_output)
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+# File layout: MAGIC | uint64 header length | JSON header | padding | raw array
+# The array starts on a page boundary so it can be memory-mapped directly.
+MAGIC = b'W2LCACHE'
+ALIGN = 4096
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """sha1 of a file's contents, used to key caches on the input data."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def create(path, shape, dtype, meta):
+    """Create a cache file and return a writable np.memmap over its array.
+
+    `meta` must be JSON-serialisable; it is stored in the header together with
+    the array shape and dtype. Call .flush() on the result when done.
+    """
+    header = dict(meta, shape=list(shape), dtype=np.dtype(dtype).str)
+    blob = json.dumps(header).encode('utf-8')
+    offset = _data_offset(len(blob))
+
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(blob)) + blob)
+        f.write(b'\0' * (offset - f.tell()))
+    return np.memmap(path, dtype=dtype, mode='r+', offset=offset, shape=tuple(shape))
+
+
+def _read_header(path):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{} is not a wav2lip array cache'.format(path))
+        (length,) = struct.unpack('<Q', f.read(8))
+        meta = json.loads(f.read(length).decode('utf-8'))
+    return meta, _data_offset(length)
+
+
+def _data_offset(header_length):
+    return -(-(len(MAGIC) + 8 + header_length) // ALIGN) * ALIGN
+
+
+def read_meta(path):
+    return _read_header(path)[0]
+
+
+def load(path, mode='r'):
+    """Open a cache file, returning (np.memmap, meta)."""
+    meta, offset = _read_header(path)
+    array = np.memmap(path, dtype=np.dtype(meta['dtype']), mode=mode,
+                      offset=offset, shape=tuple(meta['shape']))
+    return array, meta
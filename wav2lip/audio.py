@@ -1,3 +1,5 @@
+import subprocess
+
 import librosa
 import librosa.filters
 import numpy as np
@@ -7,7 +9,44 @@ from scipy.io import wavfile
 from hparams import hparams as hp
 
 def load_wav(path, sr):
-    return librosa.load(path, sr=sr)[0]
+    """Decode any audio ffmpeg can read straight to mono float32 at `sr` Hz.
+
+    One ffmpeg process does demuxing and resampling, so there is no
+    intermediate wav and no librosa resample. Channels are averaged here, as
+    librosa.load does, rather than by ffmpeg's -ac 1 downmix, which weights
+    stereo channels by about 0.707 each. Resampling uses soxr at the quality
+    librosa.load defaults to (soxr_hq); resampling each channel before the
+    average is linear, so mono and stereo input at other rates come out
+    within float rounding of what librosa returns rather than bit for bit.
+    """
+    command = ['ffmpeg', '-v', 'error', '-nostdin', '-i', path, '-vn', '-map', '0:a:0',
+               '-af', 'aresample=resampler=soxr', '-ar', str(sr), '-f', 'wav', '-acodec', 'pcm_f32le', '-']
+    proc = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise ValueError('Could not decode audio {}: {}'.format(path, proc.stderr.decode(errors='replace').strip()))
+    channels, data = _parse_wav_stream(proc.stdout)
+    wav = np.frombuffer(data, np.float32)
+    if channels == 1:
+        return wav
+    return wav[:len(wav) // channels * channels].reshape(-1, channels).mean(axis=1, dtype=np.float32)
+
+def _parse_wav_stream(buf):
+    """(channels, sample bytes) of a wav ffmpeg wrote to a pipe.
+
+    A piped wav has no valid data chunk size, so the samples are everything
+    after the data chunk header.
+    """
+    if buf[:4] != b'RIFF' or buf[8:12] != b'WAVE':
+        raise ValueError('ffmpeg did not return a wav stream')
+    channels, pos = None, 12
+    while pos + 8 <= len(buf):
+        chunk_id, size = buf[pos:pos + 4], int.from_bytes(buf[pos + 4:pos + 8], 'little')
+        if chunk_id == b'data':
+            return channels, buf[pos + 8:]
+        if chunk_id == b'fmt ':
+            channels = int.from_bytes(buf[pos + 10:pos + 12], 'little')
+        pos += 8 + size + (size & 1)
+    raise ValueError('ffmpeg returned a wav stream without samples')
 
 def save_wav(wav, path, sr):
     wav *= 32767 / max(0.01, np.max(np.abs(wav)))
@@ -0,0 +1,275 @@
+import os
+import json
+import time
+import resource
+import argparse
+import platform
+import subprocess
+
+import cv2
+import numpy as np
+import torch
+from scipy.io import wavfile
+
+import face_detection
+import inference
+import memory_plan
+import restoration
+from face_detection.detection.sfd.net_s3fd import s3fd
+from models import Wav2Lip
+
+SAMPLE_RATE = 16000
+
+
+def synth_speech(seconds, seed=0, sr=SAMPLE_RATE):
+    """Speech-like mono float32 audio: voiced syllables of 120-250 ms between short and long pauses."""
+    rng = np.random.RandomState(seed)
+    wav = np.zeros(int(seconds * sr), np.float32)
+    t = 0.2
+    while t < seconds - 0.3:
+        length = rng.uniform(0.12, 0.25)
+        n = int(length * sr)
+        i = int(t * sr)
+        time_axis = np.arange(n) / sr
+        f0 = rng.uniform(100, 220) * (1 + 0.05 * np.sin(2 * np.pi * 5 * time_axis))
+        phase = 2 * np.pi * np.cumsum(f0) / sr
+        formant = rng.uniform(500, 1500)
+        voiced = sum(np.sin(k * phase) / k * np.exp(-((k * f0.mean() - formant) / 800.) ** 2)
+                     for k in range(1, 25))
+        wav[i:i + n] += (voiced * np.hanning(n) * rng.uniform(0.2, 0.5)).astype(np.float32)
+        t += length + (rng.uniform(0.4, 0.8) if rng.rand() < 0.15 else rng.uniform(0.02, 0.08))
+    wav += rng.normal(0, 1e-3, len(wav)).astype(np.float32)
+    return np.clip(wav, -1, 1)
+
+
+def frame_openness(wav, fps, num_frames, sr=SAMPLE_RATE):
+    """Mouth opening in [0, 1] per video frame, from the audio's RMS envelope."""
+    hop = sr / fps
+    rms = np.array([np.sqrt(np.mean(wav[int(i * hop):int((i + 1) * hop)] ** 2) + 1e-12) for i in range(num_frames)])
+    return np.clip(rms / max(rms.max(), 1e-6), 0, 1)
+
+
+def face_geometry(width, height):
+    """Centre, axes and head-motion amplitude of the synthetic face, and the (top, bottom, left, right) box covering it."""
+    cx, cy = width // 2, int(height * 0.45)
+    ax, ay = int(height * 0.18), int(height * 0.25)
+    sway = max(2, width // 80)
+    box = (max(0, cy - ay - sway), min(height, cy + ay + sway + height // 20),
+           max(0, cx - ax - 2 * sway), min(width, cx + ax + 2 * sway))
+    return (cx, cy), (ax, ay), sway, box
+
+
+def synth_video(path, wav, seconds, fps, width, height, seed=0):
+    """Write a synthetic talking head: a face that sways and opens its mouth with the audio. Returns its box."""
+    rng = np.random.RandomState(seed)
+    num_frames = int(round(seconds * fps))
+    (cx, cy), (ax, ay), sway, box = face_geometry(width, height)
+    openness = frame_openness(wav, fps, num_frames)
+    background = (np.linspace(40, 160, width)[None, :, None] + np.linspace(0, 60, height)[:, None, None]
+                  + rng.randint(0, 20, (height, width, 1))).astype(np.uint8).repeat(3, axis=2)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for i in range(num_frames):
+        f = background.copy()
+        x = cx + int(2 * sway * np.sin(2 * np.pi * i / (fps * 3.)))
+        y = cy + int(sway * np.sin(2 * np.pi * i / (fps * 2.)))
+        cv2.ellipse(f, (x, y), (ax, ay), 0, 0, 360, (120, 160, 210), -1)                     # skin
+        for side in (-1, 1):
+            cv2.circle(f, (x + side * ax // 2, y - ay // 4), max(2, ax // 8), (60, 40, 30), -1)  # eyes
+        cv2.line(f, (x, y - ay // 8), (x, y + ay // 6), (100, 130, 180), max(1, ax // 20))   # nose
+        mouth_h = max(1, int(ay * 0.2 * openness[i]))
+        cv2.ellipse(f, (x, y + ay // 2), (ax // 3, mouth_h), 0, 0, 360, (40, 30, 120), -1)   # mouth
+        writer.write(f)
+    writer.release()
+    return box
+
+
+def random_weights(workdir, seed=0):
+    """Checkpoints of randomly initialised Wav2Lip and S3FD, in the formats inference.py loads."""
+    torch.manual_seed(seed)
+    checkpoint_path = os.path.join(workdir, 'wav2lip_random.pth')
+    torch.save({'state_dict': Wav2Lip().state_dict()}, checkpoint_path)
+    s3fd_path = os.path.join(workdir, 's3fd_random.pth')
+    net = s3fd()
+    for p in net.parameters():
+        p.data.normal_(0, 0.01)
+    torch.save(net.state_dict(), s3fd_path)
+    return checkpoint_path, s3fd_path
+
+
+def read_frames(path, max_frames):
+    video_stream = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < max_frames:
+        ret, f = video_stream.read()
+        if not ret:
+            break
+        frames.append(f)
+    video_stream.release()
+    return frames
+
+
+class PhasePeak:
+    """Peak resident memory (bytes) of the process while the block ran; whole-process peak off Linux."""
+
+    def __enter__(self):
+        self.memory = memory_plan.PeakMemory('cpu') if memory_plan.can_measure('cpu') else None
+        if self.memory is not None:
+            self.memory.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        if self.memory is not None:
+            self.memory.__exit__(*exc)
+            self.peak = self.memory.start + self.memory.peak
+        else:
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def bench_detection(args, frames, s3fd_path):
+    """Frames/sec of inference.detect_rects, the detector path inference.py runs."""
+    kwargs = {'min_face_size': args.face_det_min_size, 'max_face_size': args.face_det_max_size}
+    if args.face_detector == 'sfd':
+        kwargs['path_to_detector'] = s3fd_path
+    detector = face_detection.FaceAlignment(face_detection.LandmarksType._2D, flip_input=False,
+                                            device=inference.device, face_detector=args.face_detector,
+                                            face_detector_kwargs=kwargs)
+    inference.detect_rects(frames[:1], args, detector)  # warm-up
+    start = time.perf_counter()
+    rects = inference.detect_rects(frames, args, detector)
+    seconds = time.perf_counter() - start
+    return {'frames': len(frames), 'seconds': round(seconds, 3), 'fps': round(len(frames) / seconds, 2),
+            'detected': sum(r is not None for r in rects)}
+
+
+def stage_report(stats, frames):
+    """{stage: {'seconds', 'fps'}} from the pipeline's StageStats; each stage handles every frame once."""
+    names = {'restore': 'restoration', 'write': 'encode'}
+    return {names.get(s.name, s.name): {'seconds': round(s.busy, 3), 'fps': round(frames / s.busy, 2) if s.busy else None}
+            for s in stats}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(report, baseline):
+    print('Against {} ({}):'.format(baseline.get('label') or 'baseline', (baseline.get('commit') or '?')[:10]))
+    for name, entry in report['stages'].items():
+        old = ((baseline.get('stages') or {}).get(name) or {}).get('fps')
+        if entry and entry.get('fps') and old:
+            print('  {:<12} {:>9.2f} fps  (was {:>9.2f}, x{:.2f})'.format(name, entry['fps'], old, entry['fps'] / old))
+    old_rss = baseline.get('peak_rss_mb', {}).get('overall')
+    if old_rss:
+        print('  {:<12} {:>9.1f} MB   (was {:>9.1f})'.format('peak RSS', report['peak_rss_mb']['overall'], old_rss))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline lip-sync benchmark on synthetic talking-head video and audio. '
+                                     'Reports per-stage frames/sec and peak RSS as JSON to compare across commits')
+    parser.add_argument('--seconds', type=float, default=10., help='Length of the synthetic video and audio')
+    parser.add_argument('--fps', type=float, default=25.)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=360)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--checkpoint_path', type=str, default=None,
+                        help='Real Wav2Lip weights (default: randomly initialised, same speed)')
+    parser.add_argument('--s3fd_path', type=str, default=None, help='Real S3FD weights (default: random)')
+    parser.add_argument('--restorer_path', type=str, default=None,
+                        help='GFPGAN weights; the restoration stage is only benchmarked when given')
+    parser.add_argument('--restore_mode', type=str, default='crop', choices=['full', 'crop'])
+    parser.add_argument('--face_detector', type=str, default='sfd', choices=face_detection.FACE_DETECTORS)
+    parser.add_argument('--detect_frames', type=int, default=64,
+                        help='Frames timed through face detection (S3FD is slow on the CPU)')
+    parser.add_argument('--face_det_batch_size', type=int, default=16)
+    parser.add_argument('--batch_size', type=int, default=64, help='Wav2Lip batch size')
+    parser.add_argument('--pipeline', default=False, action='store_true',
+                        help='Run the render stages on separate threads (per-stage fps are then busy-time based)')
+    parser.add_argument('--threads', type=int, default=None, help='torch CPU threads (default: torch default)')
+    parser.add_argument('--workdir', type=str, default=os.path.join('temp', 'benchmark'),
+                        help='Where the synthetic inputs, random weights and output video go')
+    parser.add_argument('--label', type=str, default=None, help='Name stored in the report, e.g. a branch')
+    parser.add_argument('--output', type=str, default=None, help='JSON report path')
+    parser.add_argument('--compare', type=str, default=None, help='Earlier JSON report to print speedups against')
+    cli = parser.parse_args()
+
+    if inference.device != 'cpu':
+        print('⚠️ CUDA is available; set FORCE_CPU=true for numbers comparable with CPU runs')
+    if cli.threads:
+        torch.set_num_threads(cli.threads)
+    os.makedirs(cli.workdir, exist_ok=True)
+
+    # Inputs
+    video_path = os.path.join(cli.workdir, 'face.mp4')
+    audio_path = os.path.join(cli.workdir, 'speech.wav')
+    wav = synth_speech(cli.seconds, cli.seed)
+    wavfile.write(audio_path, SAMPLE_RATE, (wav * 32767).astype(np.int16))
+    top, bottom, left, right = synth_video(video_path, wav, cli.seconds, cli.fps, cli.width, cli.height, cli.seed)
+    checkpoint_path, s3fd_path = random_weights(cli.workdir, cli.seed)
+    checkpoint_path = cli.checkpoint_path or checkpoint_path
+    s3fd_path = cli.s3fd_path or s3fd_path
+    restorer = cli.restorer_path is not None
+    if restorer and not restoration.HAS_GFPGAN:
+        parser.error('--restorer_path needs the gfpgan package')
+
+    args = inference.make_args(checkpoint_path, video_path, audio_path, box=[top, bottom, left, right],
+                               outfile=os.path.join(cli.workdir, 'result.mp4'), wav2lip_batch_size=cli.batch_size,
+                               face_det_batch_size=cli.face_det_batch_size, face_detector=cli.face_detector,
+                               face_box_cache='', mel_cache='', pipeline=cli.pipeline,
+                               restorer='gfpgan' if restorer else None, restorer_path=cli.restorer_path,
+                               restore_mode=cli.restore_mode)
+    print(f'{cli.seconds:g}s of {cli.width}x{cli.height} @ {cli.fps:g} fps, {torch.get_num_threads()} threads, '
+          f'{"real" if cli.checkpoint_path else "random"} Wav2Lip weights')
+
+    # Detection
+    with PhasePeak() as detection_peak:
+        detection = bench_detection(args, read_frames(video_path, cli.detect_frames), s3fd_path)
+    print(f"detection: {detection['fps']} fps on {detection['frames']} frames")
+
+    # Decode, model, paste, restoration and encode, through inference.main with the synthetic face box
+    with PhasePeak() as render_peak:
+        start = time.perf_counter()
+        models = inference.load_models(args, detector=False)
+        load_seconds = time.perf_counter() - start
+        stats = []
+        start = time.perf_counter()
+        inference.main(args, models, stats=stats)
+        render_seconds = time.perf_counter() - start
+    frames = len(inference.load_mel_chunks(args, cli.fps))   # output frames, one per mel chunk
+
+    report = {
+        'label': cli.label,
+        'commit': git_commit(),
+        'config': {k: getattr(cli, k) for k in ('seconds', 'fps', 'width', 'height', 'seed', 'face_detector',
+                                                'detect_frames', 'face_det_batch_size', 'batch_size', 'pipeline',
+                                                'restore_mode')},
+        'weights': {'wav2lip': 'real' if cli.checkpoint_path else 'random',
+                    's3fd': 'real' if cli.s3fd_path else 'random', 'restorer': 'real' if restorer else None},
+        'environment': {'device': inference.device, 'threads': torch.get_num_threads(), 'torch': torch.__version__,
+                        'python': platform.python_version(), 'machine': platform.machine(),
+                        'cpu_count': os.cpu_count()},
+        'stages': dict({'detection': detection}, **stage_report(stats, frames)),
+        'total': {'frames': frames, 'load_seconds': round(load_seconds, 3), 'seconds': round(render_seconds, 3),
+                  'fps': round(frames / render_seconds, 2)},
+        'peak_rss_mb': {'detection': round(detection_peak.peak / 1e6, 1), 'render': round(render_peak.peak / 1e6, 1),
+                        'overall': round(max(detection_peak.peak, render_peak.peak,
+                                             resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024) / 1e6, 1)},
+    }
+    if not restorer:
+        report['stages']['restoration'] = None
+
+    print('Per-stage throughput:')
+    for name, entry in report['stages'].items():
+        print('  {:<12} {}'.format(name, '{:>9.2f} fps'.format(entry['fps']) if entry and entry.get('fps') else 'skipped'))
+    print('  {:<12} {:>9.2f} fps end to end, peak RSS {:.1f} MB'.format('total', report['total']['fps'],
+                                                                        report['peak_rss_mb']['overall']))
+    if cli.compare:
+        with open(cli.compare) as f:
+            print_comparison(report, json.load(f))
+    if cli.output:
+        with open(cli.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'✅ Report saved to {cli.output}')
@@ -0,0 +1,99 @@
+import os
+
+import torch
+
+from array_cache import file_digest
+
+SAFETENSORS_EXT = '.safetensors'
+
+
+def is_safetensors(path):
+    return path.endswith(SAFETENSORS_EXT)
+
+
+def inference_state_dict(checkpoint):
+    """The weights of a training checkpoint (or bare state dict), without DataParallel's 'module.' prefix."""
+    state_dict = checkpoint.get('state_dict', checkpoint)
+    return {k.replace('module.', ''): v for k, v in state_dict.items()}
+
+
+def convert(src, dst, kind):
+    """Write the inference weights of the pickled checkpoint `src` as a safetensors file `dst`.
+
+    Optimizer state and anything else that is not a tensor of the model is
+    dropped. The header records the kind of network, the sha1 of `src` and
+    its stat_key(), so later checks can skip hashing `src` while it is
+    untouched.
+    """
+    from safetensors.torch import save_file
+
+    checkpoint = torch.load(src, map_location='cpu', weights_only=False)
+    state_dict = {k: v.contiguous() for k, v in inference_state_dict(checkpoint).items()}
+    partial_path = dst + '.partial'
+    metadata = {'kind': kind, 'source_sha1': file_digest(src), 'source_stat': stat_key(src)}
+    save_file(state_dict, partial_path, metadata=metadata)
+    os.replace(partial_path, dst)
+    return sum(v.numel() * v.element_size() for v in state_dict.values())
+
+
+def stat_key(path):
+    """Absolute path, size and mtime of `path`: identifies a file without reading it, as long as it is untouched."""
+    st = os.stat(path)
+    return '{}:{}:{}'.format(os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
+def _metadata(path):
+    from safetensors import safe_open
+
+    with safe_open(path, framework='pt') as f:
+        return f.metadata() or {}
+
+
+def is_converted_from(path, src):
+    """Whether the safetensors file at `path` was written by convert() from `src`.
+
+    Compares the recorded size and mtime of `src` first and only hashes
+    `src` when those changed.
+    """
+    metadata = _metadata(path)
+    if metadata.get('source_sha1') and metadata.get('source_stat') == stat_key(src):
+        return True
+    return metadata.get('source_sha1') == file_digest(src)
+
+
+def source_digest(path):
+    """sha1 of the checkpoint the weights at `path` came from.
+
+    For a file written by convert() that is the source_sha1 in its header,
+    so caches and exported graphs keyed on it are shared by a checkpoint and
+    its safetensors copy. A checkpoint with an untouched safetensors copy
+    beside it takes the digest from that header too; any other file is
+    hashed as is.
+    """
+    if is_safetensors(path):
+        source_sha1 = _metadata(path).get('source_sha1')
+        if source_sha1:
+            return source_sha1
+        return file_digest(path)
+    converted = os.path.splitext(path)[0] + SAFETENSORS_EXT
+    if os.path.isfile(converted):
+        metadata = _metadata(converted)
+        if metadata.get('source_sha1') and metadata.get('source_stat') == stat_key(path):
+            return metadata['source_sha1']
+    return file_digest(path)
+
+
+def load(model_cls, path, device):
+    """Build model_cls() in eval mode with its weights memory-mapped from the safetensors file at `path`.
+
+    The model is constructed on the meta device, so no memory is allocated
+    or randomly initialised for weights that are then overwritten. On the
+    CPU the parameters are views of the mapped file: pages are read on first
+    use and shared by every process that loads the same file.
+    """
+    from safetensors.torch import load_file
+
+    with torch.device('meta'):
+        model = model_cls()
+    model.load_state_dict(load_file(path, device=device), assign=True)
+    return model.eval()
@@ -0,0 +1,98 @@
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+import face_detection
+from face_tracking import box_iou
+
+
+def read_frames(video_path, max_dim=360, every=1, max_frames=None):
+    """Frames of video_path downscaled like inference.face_detect does (longest side <= max_dim)."""
+    video_stream = cv2.VideoCapture(video_path)
+    if not video_stream.isOpened():
+        raise ValueError('Could not open video {}'.format(video_path))
+    frames, idx = [], 0
+    while max_frames is None or len(frames) < max_frames:
+        ret, f = video_stream.read()
+        if not ret:
+            break
+        if idx % every == 0:
+            h, w = f.shape[:2]
+            if max(h, w) > max_dim:
+                scale = max_dim / float(max(h, w))
+                f = cv2.resize(f, (int(w * scale), int(h * scale)))
+            frames.append(f)
+        idx += 1
+    video_stream.release()
+    return frames
+
+
+def run_detector(name, frames, batch_size, device, detector_kwargs):
+    detector = face_detection.FaceAlignment(face_detection.LandmarksType._2D, flip_input=False, device=device,
+                                            face_detector=name, face_detector_kwargs=detector_kwargs)
+    boxes = []
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        boxes.extend(detector.get_detections_for_batch(np.array(frames[i:i + batch_size])))
+    return boxes, time.perf_counter() - start
+
+
+def compare(reference, boxes):
+    """IoU and normalised edge offsets (x1, y1, x2, y2) of boxes against the reference boxes."""
+    ious, offsets = [], []
+    for r, b in zip(reference, boxes):
+        if r is None or b is None:
+            continue
+        ious.append(box_iou(r, b))
+        size = np.array([r[2] - r[0], r[3] - r[1]] * 2, np.float32)
+        offsets.append((np.array(b, np.float32) - np.array(r, np.float32)) / size)
+    if not ious:
+        return {}
+    return {
+        'iou_mean': round(float(np.mean(ious)), 4),
+        'iou_p5': round(float(np.percentile(ious, 5)), 4),
+        'iou_min': round(float(np.min(ious)), 4),
+        'edge_offset_mean': [round(float(v), 4) for v in np.mean(offsets, axis=0)],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare face detector backends for speed and agreement with S3FD')
+    parser.add_argument('--video', type=str, required=True, help='Path to Base-vedio.mp4')
+    parser.add_argument('--detectors', nargs='+', default=['sfd', 'haar'], choices=face_detection.FACE_DETECTORS,
+                        help='Backends to run; the first one is the reference')
+    parser.add_argument('--max_dim', type=int, default=360, help='Detection resolution (longest side)')
+    parser.add_argument('--every', type=int, default=1, help='Use every Nth frame')
+    parser.add_argument('--max_frames', type=int, default=None)
+    parser.add_argument('--batch_size', type=int, default=16)
+    parser.add_argument('--device', type=str, default='cpu')
+    parser.add_argument('--face_det_min_size', type=int, default=None)
+    parser.add_argument('--face_det_max_size', type=int, default=None)
+    parser.add_argument('--output', type=str, default=None, help='Optional JSON report path')
+    args = parser.parse_args()
+
+    frames = read_frames(args.video, args.max_dim, args.every, args.max_frames)
+    print(f'{len(frames)} frames at {frames[0].shape[1]}x{frames[0].shape[0]}')
+    detector_kwargs = {'min_face_size': args.face_det_min_size, 'max_face_size': args.face_det_max_size}
+
+    report, reference = {}, None
+    for name in args.detectors:
+        boxes, seconds = run_detector(name, frames, args.batch_size, args.device, detector_kwargs)
+        found = sum(b is not None for b in boxes)
+        entry = {'fps': round(len(frames) / seconds, 2), 'seconds': round(seconds, 3),
+                 'found': found, 'missed': len(frames) - found}
+        if reference is None:
+            reference = boxes
+        else:
+            entry['vs_' + args.detectors[0]] = compare(reference, boxes)
+        report[name] = entry
+        print(f'{name:<6} {entry["fps"]:>8.2f} fps  found {found}/{len(frames)}  '
+              + ' '.join('{}={}'.format(k, v) for k, v in entry.get('vs_' + args.detectors[0], {}).items()))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'video': args.video, 'frames': len(frames), 'detectors': report}, f, indent=2)
+        print(f'✅ Report saved to {args.output}')
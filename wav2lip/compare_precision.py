@@ -0,0 +1,101 @@
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+import torch
+
+import face_boxes
+import inference
+import precision
+from array_cache import file_digest
+
+
+def load_batches(args, max_frames):
+    """Decoded Wav2Lip batches for the first max_frames output frames of args.face/args.audio."""
+    video_sha1 = file_digest(args.face)
+    src_size = face_boxes.source_size(args.face)
+    full_frames, video_stream, fps, num_frames = inference.open_frames(args, video_sha1)
+    cached_boxes = inference.find_cached_boxes(args, video_sha1, src_size, num_frames)
+    if cached_boxes is None and args.box[0] == -1:
+        raise ValueError('Pass --box, --face_det_results or a face-box cache entry for this video')
+    mel_chunks = inference.load_mel_chunks(args, fps)
+    calibration = list(inference.calibration_batches(args, video_stream, full_frames, num_frames, mel_chunks,
+                                                     cached_boxes))
+    if video_stream is not None:
+        video_stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    batches = list(inference.iter_batches(args, video_stream, full_frames, mel_chunks[:max_frames], cached_boxes))
+    if video_stream is not None:
+        video_stream.release()
+    return batches, calibration
+
+
+def run(model, batches, args):
+    """(predictions as one (N, 3, H, W) float32 tensor, seconds spent in run_model)."""
+    inference.run_model(model, dict(batches[0]), args)  # warm-up
+    preds, seconds = [], 0.
+    for batch in batches:
+        start = time.perf_counter()
+        preds.append(inference.run_model(model, dict(batch), args)['pred'].cpu())
+        seconds += time.perf_counter() - start
+    return torch.cat(preds), seconds
+
+
+def psnr(reference, pred):
+    mse = float(((reference - pred) ** 2).mean())
+    return float('inf') if mse == 0 else 10 * np.log10(1. / mse)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare Wav2Lip speed and output PSNR across --precision modes')
+    parser.add_argument('--checkpoint_path', type=str, required=True)
+    parser.add_argument('--video', type=str, required=True, help='Path to Base-vedio.mp4')
+    parser.add_argument('--audio', type=str, required=True)
+    parser.add_argument('--box', nargs='+', type=int, default=[-1, -1, -1, -1], help='Constant box (top, bottom, left, right)')
+    parser.add_argument('--face_det_results', type=str, default=None, help='Face boxes from precompute_face.py')
+    parser.add_argument('--precisions', nargs='+', default=list(precision.PRECISIONS), choices=precision.PRECISIONS,
+                        help='Modes to run; PSNR is measured against fp32')
+    parser.add_argument('--frames', type=int, default=256, help='Output frames to render per mode')
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--calibration_frames', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=None, help='torch CPU threads (default: torch default)')
+    parser.add_argument('--output', type=str, default=None, help='Optional JSON report path')
+    cli = parser.parse_args()
+
+    if cli.threads:
+        torch.set_num_threads(cli.threads)
+    args = inference.make_args(cli.checkpoint_path, cli.video, cli.audio, box=cli.box,
+                               face_det_results=cli.face_det_results, wav2lip_batch_size=cli.batch_size,
+                               calibration_frames=cli.calibration_frames)
+    batches, calibration = load_batches(args, cli.frames)
+    frames = sum(len(b['frames']) for b in batches)
+    print(f'{frames} frames, batch size {cli.batch_size}, {torch.get_num_threads()} threads on {inference.device}')
+
+    fp32_model = inference.load_model(cli.checkpoint_path)
+    report, reference = {}, None
+    for mode in ['fp32'] + [p for p in cli.precisions if p != 'fp32']:
+        precision.check_device(mode, inference.device)
+        args.precision = mode
+        model = fp32_model
+        if mode == 'bf16':
+            model = precision.to_precision(inference.load_model(cli.checkpoint_path), mode)
+        elif mode == 'int8':
+            model = precision.quantize(fp32_model, calibration)
+        preds, seconds = run(model, batches, args)
+        entry = {'fps': round(frames / seconds, 2), 'seconds': round(seconds, 3)}
+        if reference is None:
+            reference = preds
+        else:
+            entry['psnr_db'] = round(psnr(reference, preds), 2)
+            entry['speedup'] = round(report['fp32']['seconds'] / seconds, 2)
+        report[mode] = entry
+        print(f'{mode:<5} {entry["fps"]:>8.2f} fps' + (f'  x{entry["speedup"]:<5} PSNR {entry["psnr_db"]} dB'
+                                                      if 'psnr_db' in entry else ''))
+
+    if cli.output:
+        with open(cli.output, 'w') as f:
+            json.dump({'video': cli.video, 'audio': cli.audio, 'frames': frames, 'batch_size': cli.batch_size,
+                       'threads': torch.get_num_threads(), 'device': inference.device, 'precisions': report}, f,
+                      indent=2)
+        print(f'✅ Report saved to {cli.output}')
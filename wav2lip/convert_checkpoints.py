@@ -0,0 +1,26 @@
+import os
+import argparse
+
+import checkpoints
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write inference-only safetensors copies of the Wav2Lip and S3FD '
+                                     'checkpoints, which load memory-mapped instead of unpickled')
+    parser.add_argument('--checkpoint_path', type=str, default=None,
+                        help='Wav2Lip training checkpoint; pass the written .safetensors as --checkpoint_path')
+    parser.add_argument('--s3fd_path', type=str, default=None,
+                        help='S3FD weights (face_detection/detection/sfd/s3fd.pth); s3fd.safetensors beside '
+                        'them is picked up automatically')
+    cli = parser.parse_args()
+
+    if not cli.checkpoint_path and not cli.s3fd_path:
+        parser.error('Pass --checkpoint_path and/or --s3fd_path')
+
+    for kind, path in (('wav2lip', cli.checkpoint_path), ('s3fd', cli.s3fd_path)):
+        if not path:
+            continue
+        output = os.path.splitext(path)[0] + checkpoints.SAFETENSORS_EXT
+        nbytes = checkpoints.convert(path, output, kind)
+        print('✅ {} weights ({:.1f} MB) saved to {} (was {:.1f} MB)'.format(
+            kind, nbytes / 1e6, output, os.path.getsize(path) / 1e6))
@@ -0,0 +1,76 @@
+import time
+import argparse
+
+import torch
+
+import checkpoints
+import graph_export
+import inference
+from face_detection.detection.sfd.net_s3fd import s3fd
+
+
+def check(name, eager, graph, example_inputs):
+    """Print the largest output difference and the speed of the exported graph against the eager model."""
+    def timed(model):
+        with torch.no_grad():
+            model(*example_inputs)
+            start = time.perf_counter()
+            out = model(*example_inputs)
+        return out if isinstance(out, (list, tuple)) else [out], time.perf_counter() - start
+
+    ref, eager_seconds = timed(eager)
+    out, graph_seconds = timed(graph)
+    diff = max(float((a - b).abs().max()) for a, b in zip(ref, out))
+    print('{}: max abs diff {:.2e}, eager {:.1f} ms, exported {:.1f} ms'.format(
+        name, diff, eager_seconds * 1000, graph_seconds * 1000))
+
+
+def export(model, example_inputs, weights_path, kind, cli, input_names, output_names):
+    graph = graph_export.trace(model, example_inputs)
+    path = graph_export.artifact_path(weights_path)
+    graph_export.save(graph, path, kind, weights_path, optimize=cli.optimize)
+    if cli.optimize:
+        graph = torch.jit.optimize_for_inference(graph)
+    check(kind, model, graph, example_inputs)
+    print(f'✅ {kind} graph saved to {path}')
+    if cli.onnx:
+        onnx_path = graph_export.artifact_path(weights_path, '.onnx')
+        graph_export.export_onnx(model, example_inputs, onnx_path, input_names, output_names)
+        print(f'✅ {kind} ONNX model saved to {onnx_path}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fold BatchNorm into the convolutions of Wav2Lip and S3FD and save '
+                                     'TorchScript graphs that inference.py loads when present')
+    parser.add_argument('--checkpoint_path', type=str, default=None, help='Wav2Lip checkpoint; writes <checkpoint>.ts')
+    parser.add_argument('--s3fd_path', type=str, default=None,
+                        help='S3FD weights (face_detection/detection/sfd/s3fd.pth); writes s3fd.ts beside them')
+    parser.add_argument('--batch_size', type=int, default=16, help='Batch size of the example inputs used for tracing')
+    parser.add_argument('--img_size', type=int, default=96)
+    parser.add_argument('--optimize', default=False, action='store_true',
+                        help='Have the loader also fuse Conv+ReLU and residual adds (optimize_for_inference) '
+                        'for the device it runs on')
+    parser.add_argument('--onnx', default=False, action='store_true',
+                        help='Also write .onnx models for other runtimes (needs the onnx package)')
+    cli = parser.parse_args()
+
+    if not cli.checkpoint_path and not cli.s3fd_path:
+        parser.error('Pass --checkpoint_path and/or --s3fd_path')
+
+    if cli.checkpoint_path:
+        model = inference.load_model(cli.checkpoint_path)
+        example_inputs = (torch.randn(cli.batch_size, 1, 80, 16, device=inference.device),
+                          torch.rand(cli.batch_size, 6, cli.img_size, cli.img_size, device=inference.device))
+        export(model, example_inputs, cli.checkpoint_path, graph_export.KIND_WAV2LIP, cli,
+               ['mel', 'face'], ['pred'])
+
+    if cli.s3fd_path:
+        if checkpoints.is_safetensors(cli.s3fd_path):
+            net = checkpoints.load(s3fd, cli.s3fd_path, inference.device)
+        else:
+            net = s3fd()
+            net.load_state_dict(torch.load(cli.s3fd_path, map_location='cpu', weights_only=False))
+            net = net.to(inference.device).eval()
+        example_inputs = (torch.randn(2, 3, 256, 256, device=inference.device) * 64,)
+        outputs = ['{}{}'.format(kind, i) for i in range(1, 7) for kind in ('cls', 'reg')]
+        export(net, example_inputs, cli.s3fd_path, graph_export.KIND_S3FD, cli, ['image'], outputs)
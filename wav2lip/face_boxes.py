@@ -0,0 +1,177 @@
+import glob
+import hashlib
+import json
+import os
+
+import cv2
+import numpy as np
+
+import array_cache
+
+KIND = 'wav2lip_face_boxes'
+DEFAULT_CACHE_DIR = os.path.join('cache', 'face_boxes')
+
+
+def transform_key(args):
+    return {'resize_factor': args.resize_factor, 'rotate': bool(args.rotate), 'crop': list(args.crop)}
+
+
+def settings_key(args, raw=True):
+    """Everything besides the video that shapes the stored boxes.
+
+    Cache entries hold raw detector boxes (no pads, no smoothing), which
+    resolve() pads and smooths for the job at load time; raw=False records
+    boxes that already carry args.pads and smoothing.
+    """
+    if raw:
+        return {'transform': transform_key(args), 'pads': [0, 0, 0, 0], 'smooth': False}
+    return {'transform': transform_key(args), 'pads': list(args.pads), 'smooth': not args.nosmooth}
+
+
+def is_raw(meta):
+    return meta.get('pads') == [0, 0, 0, 0] and meta.get('smooth') is False
+
+
+def cache_path(cache_dir, video_sha1, args):
+    """Content-addressed file for this video's raw boxes under this transform."""
+    digest = hashlib.sha1(json.dumps(transform_key(args), sort_keys=True).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, '{}-{}.boxes'.format(video_sha1, digest[:12]))
+
+
+def source_size(path):
+    """(width, height) of the untransformed video or image."""
+    if os.path.splitext(path)[1].lower() in ['.jpg', '.png', '.jpeg']:
+        h, w = cv2.imread(path).shape[:2]
+        return w, h
+    video_stream = cv2.VideoCapture(path)
+    size = (int(video_stream.get(cv2.CAP_PROP_FRAME_WIDTH)), int(video_stream.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    video_stream.release()
+    return size
+
+
+def _resized_size(src_size, args):
+    w, h = src_size
+    if args.resize_factor > 1:
+        return w // args.resize_factor, h // args.resize_factor
+    return w, h
+
+
+def source_to_frame(boxes, src_size, args):
+    """Map (N, 4) x1, y1, x2, y2 boxes from source pixels into transform_frame() pixels."""
+    boxes = np.asarray(boxes, np.float64).reshape(-1, 4).copy()
+    rw, rh = _resized_size(src_size, args)
+    boxes[:, [0, 2]] *= rw / float(src_size[0])
+    boxes[:, [1, 3]] *= rh / float(src_size[1])
+    if args.rotate:
+        # 90 degrees clockwise: (x, y) -> (h - y, x)
+        x1, y1, x2, y2 = boxes.T.copy()
+        boxes = np.stack([rh - y2, x1, rh - y1, x2], 1)
+    cy1, _, cx1, _ = args.crop
+    boxes[:, [0, 2]] -= cx1
+    boxes[:, [1, 3]] -= cy1
+    return np.round(boxes)
+
+
+def frame_size(src_size, args):
+    """(width, height) of transform_frame() output for a source of src_size."""
+    rw, rh = _resized_size(src_size, args)
+    if args.rotate:
+        rw, rh = rh, rw
+    y1, y2, x1, x2 = args.crop
+    if x2 == -1: x2 = rw
+    if y2 == -1: y2 = rh
+    return len(range(rw)[x1:x2]), len(range(rh)[y1:y2])
+
+
+def smooth(boxes, T=5):
+    """In-place temporal smoothing of (N, 4) boxes over a window of T frames."""
+    for i in range(len(boxes)):
+        if i + T > len(boxes):
+            window = boxes[len(boxes) - T:]
+        else:
+            window = boxes[i : i + T]
+        boxes[i] = np.mean(window, axis=0)
+    return boxes
+
+
+def pad_and_smooth(boxes, size, args):
+    """Whole-pixel x1, y1, x2, y2 boxes with args.pads (clipped to a frame of
+    `size` = (width, height)) and, unless args.nosmooth, temporal smoothing,
+    as inference.face_detect makes them from raw detector boxes."""
+    w, h = size
+    pady1, pady2, padx1, padx2 = args.pads
+    x1, y1, x2, y2 = np.trunc(np.asarray(boxes, np.float64).reshape(-1, 4)).astype(np.int64).T
+    boxes = np.stack([np.maximum(0, x1 - padx1), np.maximum(0, y1 - pady1),
+                      np.minimum(w, x2 + padx2), np.minimum(h, y2 + pady2)], 1)
+    if not args.nosmooth:
+        boxes = smooth(boxes, T=5)
+    return boxes
+
+
+def frame_to_source(boxes, src_size, args):
+    """Inverse of source_to_frame()."""
+    boxes = np.asarray(boxes, np.float64).reshape(-1, 4).copy()
+    rw, rh = _resized_size(src_size, args)
+    cy1, _, cx1, _ = args.crop
+    boxes[:, [0, 2]] += cx1
+    boxes[:, [1, 3]] += cy1
+    if args.rotate:
+        x1, y1, x2, y2 = boxes.T.copy()
+        boxes = np.stack([y1, rh - x2, y2, rh - x1], 1)
+    boxes[:, [0, 2]] *= src_size[0] / float(rw)
+    boxes[:, [1, 3]] *= src_size[1] / float(rh)
+    return boxes
+
+
+def save(path, boxes, video_sha1, args, fps, num_frames, src_size, detector=None, raw=True):
+    """Store source-coordinate (N, 4) x1, y1, x2, y2 boxes with their settings.
+
+    raw=False marks boxes that are already padded and smoothed per args.
+    """
+    meta = dict(settings_key(args, raw), kind=KIND, video_sha1=video_sha1, fps=fps, num_frames=num_frames,
+                source_size=list(src_size), detector=detector)
+    partial_path = path + '.partial'
+    array = array_cache.create(partial_path, (len(boxes), 4), 'float32', meta)
+    array[:] = boxes
+    array.flush()
+    del array
+    os.replace(partial_path, path)
+
+
+def load(path):
+    """(boxes, meta) of a face-box cache file; boxes are source-coordinate x1, y1, x2, y2."""
+    array, meta = array_cache.load(path)
+    if meta.get('kind') != KIND:
+        raise ValueError('{} is not a face-box cache'.format(path))
+    return np.array(array), meta
+
+
+def resolve(boxes, meta, src_size, args):
+    """Stored source-coordinate boxes as transform_frame() pixel boxes for this job.
+
+    Raw entries get args.pads and smoothing here; others are used as stored.
+    """
+    boxes = source_to_frame(boxes, src_size, args)
+    if is_raw(meta):
+        boxes = pad_and_smooth(boxes, frame_size(src_size, args), args)
+    return boxes
+
+
+def lookup(cache_dir, video_sha1, args, num_frames, src_size):
+    """Find cached boxes for this video in cache_dir, or None.
+
+    Prefers the file made with the same transform. A cache of the same video
+    made under another resize/rotate/crop is still usable, since its
+    source-coordinate boxes are mapped through the active transform. Entries
+    are raw detector boxes, so any --pads and smoothing setting can reuse
+    them. Returns (path, boxes, meta) with boxes resolved for this job.
+    """
+    exact = cache_path(cache_dir, video_sha1, args)
+    candidates = [exact] + sorted(p for p in glob.glob(os.path.join(cache_dir, video_sha1 + '-*.boxes')) if p != exact)
+    for path in candidates:
+        if not os.path.isfile(path):
+            continue
+        boxes, meta = load(path)
+        if meta.get('video_sha1') == video_sha1 and meta.get('num_frames') == num_frames and is_raw(meta):
+            return path, resolve(boxes, meta, src_size, args), meta
+    return None
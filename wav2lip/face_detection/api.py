@@ -43,9 +43,16 @@ class NetworkSize(Enum):
 
 ROOT = os.path.dirname(os.path.abspath(__file__))
 
+# Detector backends under face_detection.detection; each package exports a
+# FaceDetector(device, verbose, **kwargs) implementing detect_from_batch.
+#   sfd  - S3FD (VGG16 backbone): accurate on any face size, slow on CPU
+#   haar - opencv's bundled frontal-face cascade: fast, for large frontal faces
+FACE_DETECTORS = ('sfd', 'haar')
+
 class FaceAlignment:
     def __init__(self, landmarks_type, network_size=NetworkSize.LARGE,
-                 device='cuda', flip_input=False, face_detector='sfd', verbose=False):
+                 device='cuda', flip_input=False, face_detector='sfd', verbose=False,
+                 face_detector_kwargs=None):
         self.device = device
         self.flip_input = flip_input
         self.landmarks_type = landmarks_type
@@ -57,13 +64,17 @@ class FaceAlignment:
             torch.backends.cudnn.benchmark = True
 
         # Get the face detector
+        if face_detector not in FACE_DETECTORS:
+            raise ValueError('Unknown face detector {!r}; choose from {}'.format(face_detector, FACE_DETECTORS))
         face_detector_module = __import__('face_detection.detection.' + face_detector,
                                           globals(), locals(), [face_detector], 0)
-        self.face_detector = face_detector_module.FaceDetector(device=device, verbose=verbose)
+        self.face_detector = face_detector_module.FaceDetector(device=device, verbose=verbose,
+                                                               **(face_detector_kwargs or {}))
 
     def get_detections_for_batch(self, images):
         images = images[..., ::-1]
-        detected_faces = self.face_detector.detect_from_batch(images.copy())
+        # Only the best face per image is used
+        detected_faces = self.face_detector.detect_from_batch(images.copy(), top_k=1)
         results = []
 
         for i, d in enumerate(detected_faces):
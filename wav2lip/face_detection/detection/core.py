@@ -51,6 +51,20 @@ class FaceDetector(object):
         """
         raise NotImplementedError
 
+    def detect_from_batch(self, images, top_k=None):
+        """Detects faces in every image of a (B, H, W, 3) batch.
+
+        Returns one (N, 5) array of x1, y1, x2, y2, score per image, highest
+        score first, truncated to top_k faces if given. This default runs
+        detect_from_image per image; backends override it to batch the work.
+        """
+        bboxlists = []
+        for image in images:
+            bboxlist = np.asarray(self.detect_from_image(image), np.float32).reshape(-1, 5)
+            bboxlist = bboxlist[bboxlist[:, 4].argsort()[::-1]]
+            bboxlists.append(bboxlist[:top_k] if top_k is not None else bboxlist)
+        return bboxlists
+
     def detect_from_directory(self, path, extensions=['.jpg', '.png'], recursive=False, show_progress_bar=True):
         """Detects faces from all the images present in a given directory.
 
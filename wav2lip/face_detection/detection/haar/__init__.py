@@ -0,0 +1 @@
+from .haar_detector import HaarDetector as FaceDetector
\ No newline at end of file
@@ -0,0 +1,56 @@
+import cv2
+import numpy as np
+
+from ..core import FaceDetector
+
+CASCADE = 'haarcascade_frontalface_default.xml'
+
+
+class HaarDetector(FaceDetector):
+    """Frontal-face Haar cascade that ships with opencv: no weights to download, fast on CPU.
+
+    Much cheaper than S3FD but only reliable on large, frontal, well-lit
+    faces, which is what our close-up talking-head framing gives. Scores are
+    the cascade's final-stage weights, so they rank faces within an image but
+    are not probabilities. Boxes are tighter than S3FD's around the chin; run
+    compare_face_detectors.py and adjust --pads if needed.
+    """
+
+    def __init__(self, device, verbose=False, min_face_size=None, max_face_size=None,
+                 scale_factor=1.1, min_neighbors=5):
+        super(HaarDetector, self).__init__(device, verbose)
+        self.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + CASCADE)
+        if self.cascade.empty():
+            raise IOError('Could not load {} from {}'.format(CASCADE, cv2.data.haarcascades))
+        self.min_size = (min_face_size, min_face_size) if min_face_size else None
+        self.max_size = (max_face_size, max_face_size) if max_face_size else None
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def detect_from_image(self, tensor_or_path):
+        image = self.tensor_or_path_to_ndarray(tensor_or_path)
+        gray = cv2.cvtColor(np.ascontiguousarray(image), cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        gray = cv2.equalizeHist(gray)
+
+        rects, _, weights = self.cascade.detectMultiScale3(
+            gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+            minSize=self.min_size, maxSize=self.max_size, outputRejectLevels=True)
+        if len(rects) == 0:
+            return np.zeros((0, 5), np.float32)
+
+        rects = np.asarray(rects, np.float32)
+        bboxlist = np.concatenate([rects[:, :2], rects[:, :2] + rects[:, 2:],
+                                   np.asarray(weights, np.float32).reshape(-1, 1)], 1)
+        return bboxlist[bboxlist[:, 4].argsort()[::-1]]
+
+    @property
+    def reference_scale(self):
+        return 195
+
+    @property
+    def reference_x_shift(self):
+        return 0
+
+    @property
+    def reference_y_shift(self):
+        return 0
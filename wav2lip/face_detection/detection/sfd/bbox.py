@@ -10,6 +10,11 @@ import argparse
 import numpy as np
 import torch
 
+try:
+    from torchvision.ops import batched_nms as tv_batched_nms
+except BaseException:
+    tv_batched_nms = None
+
 try:
     from iou import IOU
 except BaseException:
@@ -64,6 +69,27 @@ def nms(dets, thresh):
     return keep
 
 
+def batch_nms(bboxlists, thresh):
+    """nms() for a list of per-image (N, 5) arrays.
+
+    With torchvision the whole batch goes through its batched_nms kernel in
+    one call, image index as the class; otherwise nms() runs per image.
+    Returns the kept boxes of each image, highest score first.
+    """
+    bboxlists = [np.asarray(b, np.float32).reshape(-1, 5) for b in bboxlists]
+    counts = [len(b) for b in bboxlists]
+    if tv_batched_nms is None or sum(counts) == 0:
+        return [b[nms(b, thresh)] for b in bboxlists]
+
+    dets = np.concatenate(bboxlists)
+    ids = np.repeat(np.arange(len(counts)), counts)
+    # nms() counts pixels inclusively; shifting x2/y2 by one matches it exactly
+    boxes = torch.from_numpy(dets[:, :4] + np.array([0, 0, 1, 1], np.float32))
+    keep = tv_batched_nms(boxes, torch.from_numpy(dets[:, 4]), torch.from_numpy(ids), thresh).numpy()
+    kept, kept_ids = dets[keep], ids[keep]
+    return [kept[kept_ids == i] for i in range(len(counts))]
+
+
 def encode(matched, priors, variances):
     """Encode the variances from the priorbox layers into the ground truth boxes
     we have matched (based on jaccard overlap) with the prior boxes.
@@ -16,7 +16,44 @@ from .net_s3fd import s3fd
 from .bbox import *
 
 
-def detect(net, img, device):
+def decode_candidates(olist, threshold=0.05, variances=(0.1, 0.2)):
+    """Decode every anchor scoring above `threshold` across the s3fd pyramid.
+
+    olist is the raw net output [cls1, reg1, ..., cls6, reg6] for a batch,
+    with None for levels the net skipped. Each level's candidates are gathered with one nonzero() and decoded in a
+    single tensor op. Returns one (N, 5) float array of x1, y1, x2, y2, score
+    per image.
+    """
+    batch_size = next(o for o in olist if o is not None).size(0)
+    image_ids, dets = [], []
+    for i in range(len(olist) // 2):
+        ocls, oreg = olist[i * 2], olist[i * 2 + 1]
+        if ocls is None:
+            continue
+        stride = 2**(i + 2)    # 4,8,16,32,64,128
+        scores = F.softmax(ocls, dim=1)[:, 1]
+        b, h, w = torch.nonzero(scores > threshold, as_tuple=True)
+        if b.numel() == 0:
+            continue
+        anchor = torch.full_like(h, stride * 4)
+        priors = torch.stack([stride / 2 + w * stride, stride / 2 + h * stride, anchor, anchor], 1).float()
+        boxes = decode(oreg[b, :, h, w].float(), priors, variances)
+        image_ids.append(b)
+        dets.append(torch.cat([boxes, scores[b, h, w].unsqueeze(1)], 1))
+
+    if not dets:
+        return [np.zeros((0, 5), np.float32) for _ in range(batch_size)]
+    image_ids = torch.cat(image_ids).cpu().numpy()
+    dets = torch.cat(dets).cpu().numpy()
+    return [dets[image_ids == i] for i in range(batch_size)]
+
+
+def run_net(net, imgs, levels=None):
+    with torch.no_grad():
+        return net(imgs) if levels is None else net(imgs, levels)
+
+
+def detect(net, img, device, levels=None):
     img = img - np.array([104, 117, 123])
     img = img.transpose(2, 0, 1)
     img = img.reshape((1,) + img.shape)
@@ -25,37 +62,20 @@ def detect(net, img, device):
         torch.backends.cudnn.benchmark = True
 
     img = torch.from_numpy(img).float().to(device)
-    BB, CC, HH, WW = img.size()
-    with torch.no_grad():
-        olist = net(img)
+    olist = run_net(net, img, levels)
 
-    bboxlist = []
-    for i in range(len(olist) // 2):
-        olist[i * 2] = F.softmax(olist[i * 2], dim=1)
-    olist = [oelem.data.cpu() for oelem in olist]
-    for i in range(len(olist) // 2):
-        ocls, oreg = olist[i * 2], olist[i * 2 + 1]
-        FB, FC, FH, FW = ocls.size()  # feature map size
-        stride = 2**(i + 2)    # 4,8,16,32,64,128
-        anchor = stride * 4
-        poss = zip(*np.where(ocls[:, 1, :, :] > 0.05))
-        for Iindex, hindex, windex in poss:
-            axc, ayc = stride / 2 + windex * stride, stride / 2 + hindex * stride
-            score = ocls[0, 1, hindex, windex]
-            loc = oreg[0, :, hindex, windex].contiguous().view(1, 4)
-            priors = torch.Tensor([[axc / 1.0, ayc / 1.0, stride * 4 / 1.0, stride * 4 / 1.0]])
-            variances = [0.1, 0.2]
-            box = decode(loc, priors, variances)
-            x1, y1, x2, y2 = box[0] * 1.0
-            # cv2.rectangle(imgshow,(int(x1),int(y1)),(int(x2),int(y2)),(0,0,255),1)
-            bboxlist.append([x1, y1, x2, y2, score])
-    bboxlist = np.array(bboxlist)
+    bboxlist = decode_candidates(olist)[0]
     if 0 == len(bboxlist):
         bboxlist = np.zeros((1, 5))
 
     return bboxlist
 
-def batch_detect(net, imgs, device):
+def batch_detect(net, imgs, device, threshold=0.05, levels=None):
+    """Candidate boxes for a (B, H, W, 3) batch: a list of B (N, 5) arrays, ready for nms.
+
+    Only anchors scoring above `threshold` are decoded, and only the pyramid
+    `levels` (see s3fd.forward) are computed.
+    """
     imgs = imgs - np.array([104, 117, 123])
     imgs = imgs.transpose(0, 3, 1, 2)
 
@@ -63,39 +83,13 @@ def batch_detect(net, imgs, device):
         torch.backends.cudnn.benchmark = True
 
     imgs = torch.from_numpy(imgs).float().to(device)
-    BB, CC, HH, WW = imgs.size()
-    with torch.no_grad():
-        olist = net(imgs)
-
-    bboxlist = []
-    for i in range(len(olist) // 2):
-        olist[i * 2] = F.softmax(olist[i * 2], dim=1)
-    olist = [oelem.data.cpu() for oelem in olist]
-    for i in range(len(olist) // 2):
-        ocls, oreg = olist[i * 2], olist[i * 2 + 1]
-        FB, FC, FH, FW = ocls.size()  # feature map size
-        stride = 2**(i + 2)    # 4,8,16,32,64,128
-        anchor = stride * 4
-        poss = zip(*np.where(ocls[:, 1, :, :] > 0.05))
-        for Iindex, hindex, windex in poss:
-            axc, ayc = stride / 2 + windex * stride, stride / 2 + hindex * stride
-            score = ocls[:, 1, hindex, windex]
-            loc = oreg[:, :, hindex, windex].contiguous().view(BB, 1, 4)
-            priors = torch.Tensor([[axc / 1.0, ayc / 1.0, stride * 4 / 1.0, stride * 4 / 1.0]]).view(1, 1, 4)
-            variances = [0.1, 0.2]
-            box = batch_decode(loc, priors, variances)
-            box = box[:, 0] * 1.0
-            # cv2.rectangle(imgshow,(int(x1),int(y1)),(int(x2),int(y2)),(0,0,255),1)
-            bboxlist.append(torch.cat([box, score.unsqueeze(1)], 1).cpu().numpy())
-    bboxlist = np.array(bboxlist)
-    if 0 == len(bboxlist):
-        bboxlist = np.zeros((1, BB, 5))
+    olist = run_net(net, imgs, levels)
 
-    return bboxlist
+    return decode_candidates(olist, threshold)
 
-def flip_detect(net, img, device):
+def flip_detect(net, img, device, levels=None):
     img = cv2.flip(img, 1)
-    b = detect(net, img, device)
+    b = detect(net, img, device, levels)
 
     bboxlist = np.zeros(b.shape)
     bboxlist[:, 0] = img.shape[1] - b[:, 2]
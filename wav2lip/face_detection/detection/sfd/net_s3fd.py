@@ -67,7 +67,17 @@ class s3fd(nn.Module):
         self.conv7_2_mbox_conf = nn.Conv2d(256, 2, kernel_size=3, stride=1, padding=1)
         self.conv7_2_mbox_loc = nn.Conv2d(256, 4, kernel_size=3, stride=1, padding=1)
 
-    def forward(self, x):
+    def forward(self, x, levels=None):
+        """Run the detector, returning [cls1, reg1, ..., cls6, reg6].
+
+        levels, if given, lists the pyramid levels (0-5, strides 4 to 128)
+        whose heads are needed. The other heads come back as None, and the
+        backbone stops after the deepest requested level.
+        """
+        levels = range(6) if levels is None else levels
+        last = max(levels)
+        out = [None] * 12
+
         h = F.relu(self.conv1_1(x))
         h = F.relu(self.conv1_2(h))
         h = F.max_pool2d(h, 2, 2)
@@ -79,51 +89,59 @@ class s3fd(nn.Module):
         h = F.relu(self.conv3_1(h))
         h = F.relu(self.conv3_2(h))
         h = F.relu(self.conv3_3(h))
-        f3_3 = h
+        if 0 in levels:
+            f3_3 = self.conv3_3_norm(h)
+            cls1 = self.conv3_3_norm_mbox_conf(f3_3)
+            # max-out background label
+            chunk = torch.chunk(cls1, 4, 1)
+            bmax = torch.max(torch.max(chunk[0], chunk[1]), chunk[2])
+            out[0] = torch.cat([bmax, chunk[3]], dim=1)
+            out[1] = self.conv3_3_norm_mbox_loc(f3_3)
+        if last < 1:
+            return out
         h = F.max_pool2d(h, 2, 2)
 
         h = F.relu(self.conv4_1(h))
         h = F.relu(self.conv4_2(h))
         h = F.relu(self.conv4_3(h))
-        f4_3 = h
+        if 1 in levels:
+            f4_3 = self.conv4_3_norm(h)
+            out[2] = self.conv4_3_norm_mbox_conf(f4_3)
+            out[3] = self.conv4_3_norm_mbox_loc(f4_3)
+        if last < 2:
+            return out
         h = F.max_pool2d(h, 2, 2)
 
         h = F.relu(self.conv5_1(h))
         h = F.relu(self.conv5_2(h))
         h = F.relu(self.conv5_3(h))
-        f5_3 = h
+        if 2 in levels:
+            f5_3 = self.conv5_3_norm(h)
+            out[4] = self.conv5_3_norm_mbox_conf(f5_3)
+            out[5] = self.conv5_3_norm_mbox_loc(f5_3)
+        if last < 3:
+            return out
         h = F.max_pool2d(h, 2, 2)
 
         h = F.relu(self.fc6(h))
         h = F.relu(self.fc7(h))
-        ffc7 = h
+        if 3 in levels:
+            out[6] = self.fc7_mbox_conf(h)
+            out[7] = self.fc7_mbox_loc(h)
+        if last < 4:
+            return out
+
         h = F.relu(self.conv6_1(h))
         h = F.relu(self.conv6_2(h))
-        f6_2 = h
+        if 4 in levels:
+            out[8] = self.conv6_2_mbox_conf(h)
+            out[9] = self.conv6_2_mbox_loc(h)
+        if last < 5:
+            return out
+
         h = F.relu(self.conv7_1(h))
         h = F.relu(self.conv7_2(h))
-        f7_2 = h
-
-        f3_3 = self.conv3_3_norm(f3_3)
-        f4_3 = self.conv4_3_norm(f4_3)
-        f5_3 = self.conv5_3_norm(f5_3)
-
-        cls1 = self.conv3_3_norm_mbox_conf(f3_3)
-        reg1 = self.conv3_3_norm_mbox_loc(f3_3)
-        cls2 = self.conv4_3_norm_mbox_conf(f4_3)
-        reg2 = self.conv4_3_norm_mbox_loc(f4_3)
-        cls3 = self.conv5_3_norm_mbox_conf(f5_3)
-        reg3 = self.conv5_3_norm_mbox_loc(f5_3)
-        cls4 = self.fc7_mbox_conf(ffc7)
-        reg4 = self.fc7_mbox_loc(ffc7)
-        cls5 = self.conv6_2_mbox_conf(f6_2)
-        reg5 = self.conv6_2_mbox_loc(f6_2)
-        cls6 = self.conv7_2_mbox_conf(f7_2)
-        reg6 = self.conv7_2_mbox_loc(f7_2)
-
-        # max-out background label
-        chunk = torch.chunk(cls1, 4, 1)
-        bmax = torch.max(torch.max(chunk[0], chunk[1]), chunk[2])
-        cls1 = torch.cat([bmax, chunk[3]], dim=1)
-
-        return [cls1, reg1, cls2, reg2, cls3, reg3, cls4, reg4, cls5, reg5, cls6, reg6]
+        if 5 in levels:
+            out[10] = self.conv7_2_mbox_conf(h)
+            out[11] = self.conv7_2_mbox_loc(h)
+        return out
@@ -3,6 +3,9 @@ import cv2
 import torch
 from torch.utils.model_zoo import load_url
 
+import checkpoints
+import graph_export
+
 from ..core import FaceDetector
 
 from .net_s3fd import s3fd
@@ -14,11 +17,66 @@ models_urls = {
 }
 
 
+def pyramid_levels(min_face_size=None, max_face_size=None):
+    """s3fd pyramid levels whose anchors can match faces in the given size range.
+
+    Level i has stride 2**(i + 2) and square anchors of 4x the stride (16 to
+    512 px); a face is kept within a factor of 2 of its level's anchor.
+    """
+    levels = []
+    for i in range(6):
+        anchor = 2**(i + 2) * 4
+        if min_face_size is not None and anchor * 2 < min_face_size:
+            continue
+        if max_face_size is not None and anchor / 2 > max_face_size:
+            continue
+        levels.append(i)
+    return levels
+
+
 class SFDDetector(FaceDetector):
-    def __init__(self, device, path_to_detector=os.path.join(os.path.dirname(os.path.abspath(__file__)), 's3fd.pth'), verbose=False):
+    def __init__(self, device, path_to_detector=os.path.join(os.path.dirname(os.path.abspath(__file__)), 's3fd.pth'), verbose=False,
+                 min_face_size=None, max_face_size=None, path_to_exported=None):
+        """min_face_size/max_face_size (pixels of the detector input) prune the
+        pyramid levels that cannot hold faces of that size: their heads and,
+        past the deepest level kept, the backbone are not computed.
+
+        The BN-folded TorchScript graph from export_models.py (path_to_exported,
+        default s3fd.ts beside the weights) is used when present. It always
+        computes every head, so pruned levels run on the eager net, which
+        is memory-mapped from s3fd.safetensors beside the weights if that
+        exists."""
         super(SFDDetector, self).__init__(device, verbose)
 
-        # Initialise the face detector
+        self.levels = None
+        self.face_detector = None
+        if min_face_size is not None or max_face_size is not None:
+            self.levels = pyramid_levels(min_face_size, max_face_size)
+            if not self.levels:
+                raise ValueError('No S3FD pyramid level fits faces of {}-{} px'.format(min_face_size, max_face_size))
+
+        if self.levels is None:
+            if path_to_exported is None:
+                path_to_exported = os.path.splitext(path_to_detector)[0] + '.ts'
+            if os.path.isfile(path_to_detector):
+                self.face_detector = graph_export.load(path_to_exported, graph_export.KIND_S3FD,
+                                                       path_to_detector, device)
+            if self.face_detector is not None:
+                if verbose:
+                    print('Using exported S3FD graph {}'.format(path_to_exported))
+                return
+
+        # Initialise the face detector, preferring the memory-mapped safetensors
+        # copy written by convert_checkpoints.py while it still matches the weights
+        safetensors_path = os.path.splitext(path_to_detector)[0] + checkpoints.SAFETENSORS_EXT
+        if os.path.isfile(safetensors_path):
+            if (not os.path.isfile(path_to_detector)
+                    or checkpoints.is_converted_from(safetensors_path, path_to_detector)):
+                self.face_detector = checkpoints.load(s3fd, safetensors_path, device)
+                return
+            print('⚠️ {} was converted from different weights than {}; re-run convert_checkpoints.py. '
+                  'Using {}.'.format(safetensors_path, path_to_detector, path_to_detector))
+
         if not os.path.isfile(path_to_detector):
             model_weights = load_url(models_urls['s3fd'])
         else:
@@ -37,19 +95,28 @@ class SFDDetector(FaceDetector):
     def detect_from_image(self, tensor_or_path):
         image = self.tensor_or_path_to_ndarray(tensor_or_path)
 
-        bboxlist = detect(self.face_detector, image, device=self.device)
+        bboxlist = detect(self.face_detector, image, device=self.device, levels=self.levels)
         keep = nms(bboxlist, 0.3)
         bboxlist = bboxlist[keep, :]
         bboxlist = [x for x in bboxlist if x[-1] > 0.5]
 
         return bboxlist
 
-    def detect_from_batch(self, images):
-        bboxlists = batch_detect(self.face_detector, images, device=self.device)
-        keeps = [nms(bboxlists[:, i, :], 0.3) for i in range(bboxlists.shape[1])]
-        bboxlists = [bboxlists[keep, i, :] for i, keep in enumerate(keeps)]
-        bboxlists = [[x for x in bboxlist if x[-1] > 0.5] for bboxlist in bboxlists]
+    def detect_from_batch(self, images, top_k=None):
+        """Faces in each image of a (B, H, W, 3) batch, highest score first.
+
+        The 0.5 score threshold is applied while decoding, so NMS only sees
+        real candidates, and the batch goes through batch_nms together. With
+        top_k=1 NMS is skipped: the best-scoring box always survives it.
+        """
+        bboxlists = batch_detect(self.face_detector, images, device=self.device, threshold=0.5,
+                                 levels=self.levels)
+        if top_k == 1:
+            return [b[b[:, 4].argmax()][None] if len(b) else b for b in bboxlists]
 
+        bboxlists = batch_nms(bboxlists, 0.3)
+        if top_k is not None:
+            bboxlists = [b[:top_k] for b in bboxlists]
         return bboxlists
 
     @property
@@ -0,0 +1,69 @@
+import hashlib
+
+import numpy as np
+import torch
+
+import array_cache
+
+KIND = 'wav2lip_face_feats'
+
+
+def cache_key(args, video_sha1, checkpoint_sha1, boxes=None):
+    """Header fields that must match for a feature cache to be reusable.
+
+    The encoder features depend on the video frames, the Wav2Lip weights, the
+    frame transforms and the face boxes used to crop the model input. `boxes`
+    are the per-frame boxes inference resolved (from --face_det_results or
+    the face-box cache), whichever file they came from; None means --box.
+    """
+    if boxes is not None:
+        boxes = {'sha1': hashlib.sha1(np.ascontiguousarray(boxes, np.float64).tobytes()).hexdigest()}
+    else:
+        boxes = {'box': list(args.box)}
+    return {
+        'kind': KIND,
+        'video_sha1': video_sha1,
+        'checkpoint_sha1': checkpoint_sha1,
+        'img_size': args.img_size,
+        'transform': {'resize_factor': args.resize_factor, 'rotate': bool(args.rotate),
+                      'crop': list(args.crop)},
+        'boxes': boxes,
+    }
+
+
+def feature_shapes(model, img_size):
+    """(C, H, W) of every level of Wav2Lip.encode_faces for one face."""
+    device = next(model.parameters()).device
+    with torch.no_grad():
+        feats = model.encode_faces(torch.zeros(1, 6, img_size, img_size, device=device))
+    return [tuple(f.shape[1:]) for f in feats]
+
+
+class FaceFeatureCache:
+    """Memory-mapped per-frame face-encoder pyramid built by precompute_face_feats.py."""
+
+    def __init__(self, path):
+        self.path = path
+        self.array, self.meta = array_cache.load(path)
+        if self.meta.get('kind') != KIND:
+            raise ValueError('{} is not a face feature cache'.format(path))
+        self.shapes = [tuple(s) for s in self.meta['feat_shapes']]
+        self.sizes = [int(np.prod(s)) for s in self.shapes]
+
+    def __len__(self):
+        return self.array.shape[0]
+
+    def check(self, expected):
+        stale = [k for k, v in expected.items() if self.meta.get(k) != v]
+        if stale:
+            raise ValueError('Face feature cache {} does not match this job ({} differ). '
+                             'Re-run precompute_face_feats.py.'.format(self.path, ', '.join(stale)))
+
+    def gather(self, indices, device):
+        """Encoder features for the given frame indices, ready for Wav2Lip.decode."""
+        flat = np.asarray(self.array[np.asarray(indices) % len(self)], dtype=np.float32)
+        flat = torch.from_numpy(flat)
+        feats = []
+        for part, shape in zip(torch.split(flat, self.sizes, dim=1), self.shapes):
+            feats.append(part.reshape((len(indices),) + shape).contiguous().to(device))
+        return feats
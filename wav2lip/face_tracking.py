@@ -0,0 +1,95 @@
+import cv2
+import numpy as np
+
+THUMB_SIZE = 32
+
+
+def thumbnail(frame):
+    """Tiny greyscale copy of a frame for cheap motion checks."""
+    small = cv2.resize(frame, (THUMB_SIZE, THUMB_SIZE), interpolation=cv2.INTER_AREA)
+    return small.astype(np.float32).mean(axis=2) if small.ndim == 3 else small.astype(np.float32)
+
+
+def box_iou(a, b):
+    """IoU of two (x1, y1, x2, y2) boxes."""
+    ix = max(0., min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0., min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.
+
+
+class KeyframeTracker:
+    """Run a face detector on keyframes only and interpolate boxes in between.
+
+    detect_fn maps a list of frames to a list of (x1, y1, x2, y2) boxes (or
+    None where no face was found). A frame becomes a keyframe every `stride`
+    frames, at the end of every chunk passed to track(), or as soon as its
+    thumbnail differs from the last keyframe's by more than motion_threshold
+    (mean absolute grey level, 0-255), which catches cuts and large moves.
+    Boxes between two keyframes are linearly interpolated. When the two
+    keyframe boxes disagree (IoU below iou_threshold, or a missed face) the
+    interpolation is not trusted and every frame in that gap is detected.
+
+    State carries over between track() calls, so a video can be fed in chunks.
+    """
+
+    def __init__(self, detect_fn, stride=10, motion_threshold=8.0, iou_threshold=0.7):
+        self.detect_fn = detect_fn
+        self.stride = max(1, stride)
+        self.motion_threshold = motion_threshold
+        self.iou_threshold = iou_threshold
+        self.key_box = None     # box of the last keyframe seen so far
+        self.key_thumb = None
+        self.since_key = 0
+        self.frames = 0         # frames seen
+        self.detected = 0       # frames actually run through detect_fn
+
+    def _detect(self, frames):
+        self.detected += len(frames)
+        return list(self.detect_fn(frames)) if frames else []
+
+    def _trusted(self, a, b):
+        return a is not None and b is not None and box_iou(a, b) >= self.iou_threshold
+
+    def track(self, frames):
+        """Boxes for every frame of `frames`, the next chunk of the video."""
+        n = len(frames)
+        if n == 0:
+            return []
+        self.frames += n
+        continuing = self.key_thumb is not None
+
+        keys = []
+        for i, f in enumerate(frames):
+            t = thumbnail(f)
+            self.since_key += 1
+            if (self.key_thumb is None or self.since_key >= self.stride or i == n - 1
+                    or np.abs(t - self.key_thumb).mean() > self.motion_threshold):
+                keys.append(i)
+                self.key_thumb = t
+                self.since_key = 0
+
+        boxes = [None] * n
+        for k, box in zip(keys, self._detect([frames[k] for k in keys])):
+            boxes[k] = box
+
+        # Anchor -1 is the previous chunk's last keyframe
+        anchors = ([(-1, self.key_box)] if continuing else []) + [(k, boxes[k]) for k in keys]
+        redetect = []
+        for (a, box_a), (b, box_b) in zip(anchors, anchors[1:]):
+            if b - a <= 1:
+                continue
+            if not self._trusted(box_a, box_b):
+                redetect.extend(range(a + 1, b))
+                continue
+            box_a, box_b = np.asarray(box_a, np.float32), np.asarray(box_b, np.float32)
+            for i in range(a + 1, b):
+                w = (i - a) / float(b - a)
+                boxes[i] = tuple((1. - w) * box_a + w * box_b)
+
+        for i, box in zip(redetect, self._detect([frames[i] for i in redetect])):
+            boxes[i] = box
+
+        self.key_box = boxes[keys[-1]]
+        return boxes
@@ -1,16 +1,35 @@
 from fastapi import FastAPI, UploadFile, File, BackgroundTasks
 from fastapi.responses import FileResponse
-import subprocess
+import asyncio
+from contextlib import asynccontextmanager
 import os
 import shutil
 import uuid
 
-app = FastAPI(title="Wav2Lip Microservice")
+from service import Wav2LipService
 
 # Ensure directories exist
 os.makedirs("temp", exist_ok=True)
 os.makedirs("results", exist_ok=True)
 
+# Models are loaded once at startup and kept warm between requests
+service = None
+
+@asynccontextmanager
+async def lifespan(app):
+    global service
+    service = Wav2LipService(
+        os.environ.get("WAV2LIP_CHECKPOINT", "checkpoints/wav2lip_gan.pth"),
+        restorer=os.environ.get("WAV2LIP_RESTORER"),
+        restorer_path=os.environ.get("WAV2LIP_RESTORER_PATH"),
+    )
+    try:
+        yield
+    finally:
+        service.close()
+
+app = FastAPI(title="Wav2Lip Microservice", lifespan=lifespan)
+
 @app.post("/sync/")
 async def sync_lip(
     background_tasks: BackgroundTasks,
@@ -29,23 +48,10 @@ async def sync_lip(
     with open(temp_audio, "wb") as buffer:
         shutil.copyfileobj(audio.file, buffer)
 
-    # Run Wav2Lip Inference
-    # Note: We assume 'python' is in the path or venv is active
-    command = [
-        "python", "inference.py",
-        "--checkpoint_path", "checkpoints/wav2lip_gan.pth",
-        "--face", temp_face,
-        "--audio", temp_audio,
-        "--outfile", output_file,
-        "--resize_factor", str(resize_factor)
-    ]
-
     try:
-        # Run process
-        process = subprocess.run(command, capture_output=True, text=True)
-        
-        if process.returncode != 0:
-            return {"error": "Inference failed", "details": process.stderr}
+        # Run Wav2Lip Inference on the warm in-process worker
+        await asyncio.wrap_future(service.submit(
+            temp_face, temp_audio, output_file, resize_factor=resize_factor))
 
         # Cleanup temp files in background
         background_tasks.add_task(os.remove, temp_face)
@@ -0,0 +1,49 @@
+import array_cache
+
+KIND = 'wav2lip_frame_store'
+
+
+def store_key(args, video_sha1):
+    """Header fields that must match for a frame store to serve this job."""
+    return {
+        'kind': KIND,
+        'video_sha1': video_sha1,
+        'transform': {'resize_factor': args.resize_factor, 'rotate': bool(args.rotate),
+                      'crop': list(args.crop)},
+    }
+
+
+def restorer_key(args):
+    """GFPGAN weights and settings restored frames depend on; None when the job restores nothing."""
+    if args.restorer != 'gfpgan' or args.skip_gfpgan or not args.restorer_path:
+        return None
+    return {'sha1': array_cache.file_digest(args.restorer_path), 'weight': args.restore_weight,
+            'mode': args.restore_mode}
+
+
+class FrameStore:
+    """Decoded, transformed base-video frames in a memory-mapped (N, H, W, 3) uint8 array.
+
+    Built once by precompute_frames.py. Indexing returns read-only views
+    straight from the page cache, and looping is just `idx % len(store)`, so
+    jobs never decode, resize or seek the base video.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.array, self.meta = array_cache.load(path)
+        if self.meta.get('kind') != KIND:
+            raise ValueError('{} is not a frame store'.format(path))
+        self.fps = self.meta['fps']
+
+    def __len__(self):
+        return self.array.shape[0]
+
+    def __getitem__(self, idx):
+        return self.array[idx % len(self)]
+
+    def check(self, expected):
+        stale = [k for k, v in expected.items() if self.meta.get(k) != v]
+        if stale:
+            raise ValueError('Frame store {} does not match this job ({} differ). '
+                             'Re-run precompute_frames.py.'.format(self.path, ', '.join(stale)))
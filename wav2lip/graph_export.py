@@ -0,0 +1,88 @@
+import copy
+import json
+import os
+
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+import checkpoints
+
+KIND_WAV2LIP = 'wav2lip'
+KIND_S3FD = 's3fd'
+_META_FILE = 'meta.json'
+
+
+def artifact_path(weights_path, ext='.ts'):
+    """Where export_models.py puts the exported graph of a checkpoint: beside it, same stem."""
+    return os.path.splitext(weights_path)[0] + ext
+
+
+def fold_batchnorm(model):
+    """Copy of an eval-mode model with every Conv/ConvTranspose -> BatchNorm2d pair folded into the conv.
+
+    models/conv.py builds each block as Sequential(conv, BatchNorm2d); the
+    folded conv takes the normalisation's scale and shift into its weight and
+    bias, and the BatchNorm becomes an Identity.
+    """
+    model = copy.deepcopy(model).eval()
+    for seq in model.modules():
+        if not isinstance(seq, nn.Sequential):
+            continue
+        for i in range(len(seq) - 1):
+            conv, bn = seq[i], seq[i + 1]
+            if isinstance(conv, (nn.Conv2d, nn.ConvTranspose2d)) and isinstance(bn, nn.BatchNorm2d):
+                seq[i] = fuse_conv_bn_eval(conv, bn, transpose=isinstance(conv, nn.ConvTranspose2d))
+                seq[i + 1] = nn.Identity()
+    return model
+
+
+def trace(model, example_inputs):
+    """Frozen TorchScript graph of a BN-folded model, traced on example_inputs.
+
+    Freezing inlines the weights as constants so the JIT can propagate them
+    through the graph.
+    """
+    with torch.no_grad():
+        return torch.jit.freeze(torch.jit.trace(fold_batchnorm(model), example_inputs))
+
+
+def save(graph, path, kind, weights_path, optimize=False):
+    """Save a traced graph with the weights it came from, which load() checks.
+
+    The weights' checkpoints.stat_key() is stored beside their sha1, so
+    load() only hashes them once they have changed on disk.
+
+    optimize=True marks it for optimize_for_inference at load time, which
+    fuses Conv+ReLU and Conv+add (the residual blocks) into oneDNN/cuDNN
+    kernels for the device it is loaded on; fused graphs cannot be saved.
+    """
+    meta = {'kind': kind, 'weights_sha1': checkpoints.source_digest(weights_path),
+            'weights_stat': checkpoints.stat_key(weights_path), 'optimize': optimize, 'torch': torch.__version__}
+    torch.jit.save(graph, path, _extra_files={_META_FILE: json.dumps(meta)})
+
+
+def export_onnx(model, example_inputs, path, input_names, output_names):
+    """ONNX copy of the BN-folded model with a dynamic batch dimension (needs the onnx package)."""
+    dynamic_axes = {name: {0: 'batch'} for name in input_names + output_names}
+    with torch.no_grad():
+        torch.onnx.export(fold_batchnorm(model), example_inputs, path, input_names=input_names,
+                          output_names=output_names, dynamic_axes=dynamic_axes, dynamo=False)
+
+
+def load(path, kind, weights_path, device):
+    """The exported graph at `path` on `device` if it was made from the weights at `weights_path`, else None (use eager)."""
+    if not path or not os.path.isfile(path):
+        return None
+    extra = {_META_FILE: ''}
+    graph = torch.jit.load(path, map_location=device, _extra_files=extra)
+    meta = json.loads(extra[_META_FILE] or '{}')
+    same_weights = (meta.get('weights_stat') == checkpoints.stat_key(weights_path)
+                    or meta.get('weights_sha1') == checkpoints.source_digest(weights_path))
+    if meta.get('kind') != kind or not same_weights:
+        print('⚠️ {} was exported from different weights than {}; re-run export_models.py. '
+              'Using the eager model.'.format(path, weights_path))
+        return None
+    if meta.get('optimize'):
+        graph = torch.jit.optimize_for_inference(graph)
+    return graph
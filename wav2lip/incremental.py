@@ -0,0 +1,141 @@
+import cv2
+import numpy as np
+
+import audio
+import mel_cache
+from hparams import hparams as hp
+from mel_cache import MEL_STEP_SIZE
+
+ANCHOR_WINDOW = 256     # samples hashed per anchor fingerprint
+ANCHOR_EVERY = 512      # on average one anchor per this many samples
+MIN_RUN = 5             # shortest run of reused frames worth splicing in
+
+
+def chunk_starts(num_samples, fps):
+    """First mel column of every chunk inference.load_mel_chunks() makes for a wav this long."""
+    return mel_cache.chunk_starts(1 + num_samples // audio.get_hop_size(), fps)
+
+
+def _fingerprints(wav):
+    """Rolling hash of every ANCHOR_WINDOW-sample window (exact sample values)."""
+    bits = np.ascontiguousarray(wav, np.float32).view(np.uint32).astype(np.uint64)
+    # Multiplicative hash; the high half is well mixed even though low mantissa bits are often zero
+    h = (bits * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32)
+    c = np.concatenate([[np.uint64(0)], np.cumsum(h, dtype=np.uint64)])
+    return c[ANCHOR_WINDOW:] - c[:-ANCHOR_WINDOW]
+
+
+def _unique_anchors(wav):
+    """{fingerprint: position} of content-defined anchors that occur exactly once."""
+    f = _fingerprints(wav)
+    pos = np.flatnonzero((f >> np.uint64(8)) % np.uint64(ANCHOR_EVERY) == 0)
+    values, first, counts = np.unique(f[pos], return_index=True, return_counts=True)
+    return dict(zip(values[counts == 1].tolist(), pos[first[counts == 1]].tolist()))
+
+
+def anchor_offsets(new_wav, old_wav):
+    """(positions, offsets): new-wav anchors whose content also occurs in old_wav at position + offset."""
+    old = _unique_anchors(old_wav)
+    pairs = sorted((p, old[v] - p) for v, p in _unique_anchors(new_wav).items() if v in old)
+    if not pairs:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    positions, offsets = np.array(pairs, np.int64).T
+    return positions, offsets
+
+
+def plan_reuse(new_wav, old_wav, fps, min_run=MIN_RUN):
+    """Map output frames of new_wav to frames of a previous render of old_wav that can be reused.
+
+    Returns {new frame: old frame}. A frame is reusable when every sample its
+    mel chunk is computed from (STFT padding and pre-emphasis included)
+    occurs unchanged in old_wav at some offset; candidate offsets come from
+    content-defined anchors, so unchanged spans are found after insertions
+    and deletions of any length. The old frame picked is the one whose chunk
+    starts closest to the shifted position, at most half a frame away. Runs
+    shorter than min_run frames are rendered anyway to avoid flicker.
+    """
+    hop = audio.get_hop_size()
+    pad = hp.n_fft // 2 + 1
+    new_starts = chunk_starts(len(new_wav), fps)
+    old_starts = chunk_starts(len(old_wav), fps)
+    positions, offsets = anchor_offsets(new_wav, old_wav)
+    samples_per_frame = hp.sample_rate / float(fps)
+
+    def same(a, b, d):
+        if a < 0 or b > len(new_wav):
+            # Reflection-padded edge: only identical if the other signal has the same edge
+            if d != 0 or (b > len(new_wav) and len(old_wav) != len(new_wav)):
+                return False
+            a, b = max(a, 0), min(b, len(new_wav))
+        if a + d < 0 or b + d > len(old_wav):
+            return False
+        return np.array_equal(new_wav[a:b], old_wav[a + d:b + d])
+
+    reuse, last_d = {}, None
+    for j, start in enumerate(new_starts):
+        a, b = start * hop - pad, (start + MEL_STEP_SIZE) * hop + pad
+        lo, hi = np.searchsorted(positions, [a - (b - a), b + (b - a)])
+        candidates = ([last_d] if last_d is not None else []) + offsets[lo:hi].tolist() + [0]
+        candidates = list(dict.fromkeys(candidates))
+        d = next((d for d in candidates if same(a, b, d)), None)
+        if d is None:
+            continue
+        target = start * hop + d
+        i0 = int(round(target / float(hop) * fps / 80.))
+        options = [i for i in (i0 - 1, i0, i0 + 1) if 0 <= i < len(old_starts)]
+        if not options:
+            continue
+        i = min(options, key=lambda i: abs(old_starts[i] * hop - target))
+        if abs(old_starts[i] * hop - target) <= samples_per_frame / 2:
+            reuse[j] = i
+            last_d = d
+
+    # Drop short runs
+    runs, run = [], []
+    for j in sorted(reuse):
+        if run and j != run[-1] + 1:
+            runs.append(run)
+            run = []
+        run.append(j)
+    runs.append(run)
+    for run in runs:
+        if len(run) < min_run:
+            for j in run:
+                del reuse[j]
+    return reuse
+
+
+class PreviousFrames:
+    """Random access to the frames of a previous output video, optimised for forward reads."""
+
+    def __init__(self, path, fps, size, num_frames):
+        self.path = path
+        self.stream = cv2.VideoCapture(path)
+        if not self.stream.isOpened():
+            raise ValueError('Could not open previous output {}'.format(path))
+        prev_fps = self.stream.get(cv2.CAP_PROP_FPS)
+        prev_size = (int(self.stream.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.stream.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        prev_frames = int(self.stream.get(cv2.CAP_PROP_FRAME_COUNT))
+        if abs(prev_fps - fps) > 1e-3 or prev_size != tuple(size) or prev_frames != num_frames:
+            self.stream.release()
+            raise ValueError(f"{path} ({prev_size[0]}x{prev_size[1]}, {prev_frames} frames at {prev_fps:g} fps) "
+                             f"does not match a render of --previous_audio ({size[0]}x{size[1]}, "
+                             f"{num_frames} frames at {fps:g} fps)")
+        self.pos = 0
+
+    def get(self, i):
+        if i < self.pos or i > self.pos + 64:
+            self.stream.set(cv2.CAP_PROP_POS_FRAMES, i)
+            self.pos = i
+        while self.pos < i:
+            self.stream.grab()
+            self.pos += 1
+        ret, f = self.stream.read()
+        if not ret:
+            raise ValueError('Could not read frame {} of {}'.format(i, self.path))
+        self.pos += 1
+        return f
+
+    def release(self):
+        self.stream.release()
+
@@ -1,41 +1,29 @@
 from os import listdir, path
 import numpy as np
 import scipy, cv2, os, sys, argparse, audio
-import json, subprocess, random, string
+import json, subprocess, random, string, itertools, copy, tempfile
 from tqdm import tqdm
 from glob import glob
 import torch, face_detection
+import torch.nn.functional as F
 from models import Wav2Lip
 import platform
+import pipeline
+from video_writer import FFmpegPipeWriter
+from array_cache import file_digest
+from face_feats import FaceFeatureCache, cache_key as face_feats_key
+from frame_store import FrameStore, store_key as frame_store_key, restorer_key as frame_restorer_key
+import restoration
+import face_tracking
+import face_boxes
+import incremental
+import silence
+import mel_cache
+import precision
+import graph_export
+import checkpoints
+import memory_plan
 
-# GFPGAN Integration & Compatibility Patch
-try:
-	import torchvision.transforms.functional as F
-	import torchvision.transforms as T
-	import sys
-
-	# Monkey-patch for basicsr (dependency of GFPGAN) which fails on newer torchvision
-	if not hasattr(T, 'functional_tensor'):
-		# Create a virtual module if it's missing
-		from types import ModuleType
-		mock_module = ModuleType('torchvision.transforms.functional_tensor')
-		# Copy all functions from functional to the mock module
-		for attr in dir(F):
-			if not attr.startswith('__'):
-				setattr(mock_module, attr, getattr(F, attr))
-		sys.modules['torchvision.transforms.functional_tensor'] = mock_module
-		T.functional_tensor = mock_module
-		print("🔧 Applied torchvision.transforms.functional_tensor monkey-patch for GFPGAN.")
-
-	import basicsr
-	from gfpgan import GFPGANer
-	HAS_GFPGAN = True
-except ImportError as e:
-	print(f"⚠️ GFPGAN Import Warning: {e}")
-	HAS_GFPGAN = False
-except Exception as e:
-	print(f"⚠️ GFPGAN Initialization Warning: {e}")
-	HAS_GFPGAN = False
 
 parser = argparse.ArgumentParser(description='Inference code to lip-sync videos in the wild using Wav2Lip models')
 
@@ -59,7 +47,30 @@ parser.add_argument('--pads', nargs='+', type=int, default=[0, 10, 0, 0],
 
 parser.add_argument('--face_det_batch_size', type=int, 
 					help='Batch size for face detection', default=16)
+parser.add_argument('--face_detector', type=str, default='sfd', choices=face_detection.FACE_DETECTORS,
+					help='sfd: S3FD, accurate but slow on CPU. haar: opencv frontal-face cascade, much faster '
+					'for close-up frontal footage (check it with compare_face_detectors.py)')
+parser.add_argument('--face_det_stride', type=int, default=1,
+					help='Run the face detector only every N frames and interpolate boxes in between. '
+					'Extra keyframes are added on scene changes or when neighbouring detections disagree')
+parser.add_argument('--face_det_motion', type=float, default=8.0,
+					help='Mean grey-level change (0-255) since the last keyframe that forces a new detection')
+parser.add_argument('--face_det_iou', type=float, default=0.7,
+					help='Keyframe boxes overlapping less than this are not interpolated; the frames between are detected')
+parser.add_argument('--face_det_min_size', type=int, default=None,
+					help='Smallest face (px, in the <=360px detection image) to look for. S3FD pyramid levels '
+					'that only fit smaller faces are skipped; set it for close-up footage')
+parser.add_argument('--face_det_max_size', type=int, default=None,
+					help='Largest face (px, in the detection image) to look for; prunes the coarsest levels')
 parser.add_argument('--wav2lip_batch_size', type=int, help='Batch size for Wav2Lip model(s)', default=128)
+parser.add_argument('--precision', type=str, default='fp32', choices=precision.PRECISIONS,
+					help='Wav2Lip arithmetic: fp32, bf16 (autocast + channels_last) or int8 (CPU only, quantized '
+					'on --calibration_frames of the base video); see compare_precision.py for speed and PSNR')
+parser.add_argument('--calibration_frames', type=int, default=64,
+					help='Base-video frames used to calibrate --precision int8')
+parser.add_argument('--eager', default=False, action='store_true',
+					help='Ignore the BN-folded TorchScript graphs from export_models.py (<checkpoint>.ts, s3fd.ts) '
+					'that are otherwise used for fp32 Wav2Lip and unpruned S3FD when present')
 
 parser.add_argument('--resize_factor', default=1, type=int, 
 			help='Reduce the resolution by this factor. Sometimes, best results are obtained at 480p or 720p')
@@ -76,8 +87,20 @@ parser.add_argument('--rotate', default=False, action='store_true',
 					help='Sometimes videos taken from a phone can be flipped 90deg. If true, will flip video right by 90deg.'
 					'Use if you get a flipped result, despite feeding a normal looking video')
 
+parser.add_argument('--face_box_cache', type=str, default=face_boxes.DEFAULT_CACHE_DIR,
+					help='Directory of face boxes keyed by video content hash. Boxes are looked up here when '
+					'no --face_det_results/--box is given and saved after automatic detection. "" disables it')
+parser.add_argument('--mel_cache', type=str, default=mel_cache.DEFAULT_CACHE_DIR,
+					help='Directory of mel spectrograms keyed by audio content hash; "" disables it')
 parser.add_argument('--face_det_results', type=str, 
 					help='Path to pre-computed face detection results (.npy)', default=None)
+parser.add_argument('--frame_store', type=str, default=None,
+					help='Pre-decoded base-video frames from precompute_frames.py (built with the same '
+					'--resize_factor/--rotate/--crop). Skips decoding and seeking --face per job')
+parser.add_argument('--face_feats_cache', type=str, default=None,
+					help='Face-encoder feature cache from precompute_face_feats.py. Only the audio encoder '
+					'and decoder run per job. Needs the face boxes it was built with (--face_det_results, --box '
+					'or the face-box cache entry they resolve to)')
 
 # GFPGAN Arguments
 parser.add_argument('--restorer', type=str, default=None,
@@ -86,32 +109,96 @@ parser.add_argument('--restorer_path', type=str, default=None,
 					help='Path to restorer model weights')
 parser.add_argument('--skip_gfpgan', action='store_true',
 					help='Skip restoration even if restorer is specified (useful for debugging)')
+parser.add_argument('--restore_mode', type=str, default='full', choices=['full', 'crop'],
+					help='full: GFPGAN detects/aligns faces on the whole frame. crop: restore only the known '
+					'face box in a heuristic unaligned square, skipping GFPGAN\'s detector and alignment (much faster)')
+parser.add_argument('--restore_weight', type=float, default=0.5,
+					help='GFPGAN blend weight between restored and input face')
+parser.add_argument('--restored_frames', type=str, default=None,
+					help='GFPGAN-restored base-video frames from precompute_frames.py --restorer_path. Output '
+					'frames are composited onto these and only the mouth region is restored per job')
+parser.add_argument('--restorer_workers', type=int, default=0,
+					help='GFPGAN worker processes for the restore stage (0 = restore in the main process)')
+parser.add_argument('--restorer_batch_size', type=int, default=8,
+					help='Faces per GFPGAN network batch (and per worker task)')
 
 # Performance & Stability Arguments
 parser.add_argument('--nosmooth', default=False, action='store_true',
 					help='Prevent smoothing face detections over a short temporal window')
+parser.add_argument('--pipeline', default=False, action='store_true',
+					help='Overlap frame decoding, Wav2Lip inference and paste/encode on separate threads')
+parser.add_argument('--pipeline_queue_size', type=int, default=2,
+					help='Max batches buffered between pipeline stages')
+parser.add_argument('--memory_budget', type=str, default=None,
+					help='Process memory to plan for, e.g. 7G, 48G or "auto" (what the system has free). Each '
+					'stage is measured on probe batches built from the first frame, and the face detection, '
+					'detection chunk, Wav2Lip and restorer batch sizes are set to the largest that fit. On CUDA '
+					'the networks are sized to free GPU memory and the frame buffers to this budget')
 
-args = parser.parse_args()
-args.img_size = 96
+# Silence skipping
+parser.add_argument('--skip_silence', default=False, action='store_true',
+					help='Skip the model and restorer for runs of silent mel chunks and show the base frame '
+					'(or its --silence_frames render) instead')
+parser.add_argument('--silence_db', type=float, default=silence.SILENCE_DB,
+					help='A chunk is silent when no mel bin in it is louder than this (dB, same scale as '
+					'audio.melspectrogram before normalisation: -100 is digital silence)')
+parser.add_argument('--silence_frames', type=str, default=None,
+					help='Closed-mouth renders of every base frame from precompute_silence.py, used for '
+					'--skip_silence instead of the untouched base frames')
 
-if os.path.isfile(args.face) and args.face.split('.')[1] in ['jpg', 'png', 'jpeg']:
-	args.static = True
+# Incremental re-render
+parser.add_argument('--previous_output', type=str, default=None,
+					help='Earlier result of this face/checkpoint/options with --previous_audio; frames whose audio '
+					'is unchanged are copied from it and only the edited spans are rendered')
+parser.add_argument('--previous_audio', type=str, default=None,
+					help='Audio --previous_output was rendered from')
 
-def get_smoothened_boxes(boxes, T):
-	for i in range(len(boxes)):
-		if i + T > len(boxes):
-			window = boxes[len(boxes) - T:]
-		else:
-			window = boxes[i : i + T]
-		boxes[i] = np.mean(window, axis=0)
-	return boxes
+# Output encoding
+parser.add_argument('--shards', type=int, default=1,
+					help='Render in N processes, each on a contiguous span of output frames with its own model '
+					'copy and share of the CPU threads; the segments are joined losslessly before the audio mux')
+parser.add_argument('--frame_range', nargs=2, type=int, default=None, metavar=('START', 'END'),
+					help='Render only output frames [START, END) (what each segment of a --shards/--segment_frames job runs)')
+parser.add_argument('--segment_frames', type=int, default=0,
+					help='Write the output as segments of this many frames in --segment_dir, journaling each '
+					'finished one so an interrupted job can be continued with --resume (0 = single pass)')
+parser.add_argument('--segment_dir', type=str, default=None,
+					help='Segment directory for --segment_frames (default: <outfile without extension>.segments)')
+parser.add_argument('--resume', default=False, action='store_true',
+					help='Continue a --segment_frames job, skipping segments its journal lists as done')
+parser.add_argument('--video_only', default=False, action='store_true',
+					help='With --writer ffmpeg, leave the audio out of the output (used for --shards/--segment_frames segments)')
+parser.add_argument('--writer', type=str, default='ffmpeg', choices=['ffmpeg', 'avi'],
+					help='ffmpeg: stream frames into a single ffmpeg process that muxes audio (single pass). '
+					'avi: legacy temp/result-*.avi + separate ffmpeg re-encode')
+parser.add_argument('--ffmpeg_preset', type=str, default='veryfast',
+					help='libx264 preset for --writer ffmpeg')
+parser.add_argument('--ffmpeg_crf', type=int, default=18,
+					help='libx264 CRF for --writer ffmpeg (lower is better quality)')
+parser.add_argument('--ffmpeg_threads', type=int, default=0,
+					help='ffmpeg encoder threads for --writer ffmpeg (0 = auto)')
 
-def face_detect(images, detector=None):
-	if detector is None:
-		print("Initializing face detector...")
-		detector = face_detection.FaceAlignment(face_detection.LandmarksType._2D, 
-												flip_input=False, device=device)
+def _finalize_args(args):
+	args.img_size = 96
+
+	if os.path.isfile(args.face) and args.face.split('.')[1] in ['jpg', 'png', 'jpeg']:
+		args.static = True
+	return args
+
+def parse_args(argv=None):
+	return _finalize_args(parser.parse_args(argv))
 
+def make_args(checkpoint_path, face, audio, **overrides):
+	"""Build an args namespace for in-process runs (same defaults as the CLI)."""
+	args = parser.parse_args(['--checkpoint_path', checkpoint_path, '--face', face, '--audio', audio])
+	for key, value in overrides.items():
+		if not hasattr(args, key):
+			raise TypeError('Unknown inference option: {}'.format(key))
+		setattr(args, key, value)
+	return _finalize_args(args)
+
+def detect_rects(images, args, detector):
+	"""Raw detector boxes (x1, y1, x2, y2) in the coordinates of `images`, None where no face."""
 	# Memory-Safe Downscaling for detection (Internal)
 	# Detection doesn't need high res. 360p is plenty.
 	detection_images = []
@@ -143,36 +230,46 @@ def face_detect(images, detector=None):
 			continue
 		break
 
-	results = []
-	pady1, pady2, padx1, padx2 = args.pads
-	for rect, image, scale in zip(predictions, images, scale_factors):
-		if rect is None:
-			cv2.imwrite('temp/faulty_frame.jpg', image)
-			raise ValueError('Face not detected! Ensure the video contains a face in all the frames.')
+	# Scale coordinates back to original size
+	return [None if rect is None else tuple(v / scale for v in rect[:4])
+			for rect, scale in zip(predictions, scale_factors)]
 
-		# Scale coordinates back to original size
-		y1 = max(0, int(rect[1] / scale) - pady1)
-		y2 = min(image.shape[0], int(rect[3] / scale) + pady2)
-		x1 = max(0, int(rect[0] / scale) - padx1)
-		x2 = min(image.shape[1], int(rect[2] / scale) + padx2)
-		
-		results.append([x1, y1, x2, y2])
+def face_detect(images, args, detector=None, tracker=None):
+	"""Padded, smoothed face boxes (y1, y2, x1, x2) for a list of frames.
 
-	boxes = np.array(results)
-	if not args.nosmooth: boxes = get_smoothened_boxes(boxes, T=5) # ONLY return coordinates relative to the ORIGINAL frames passed in
-	
+	With a face_tracking.KeyframeTracker (built around detect_rects) only its
+	keyframes go through the detector.
+	"""
+	if detector is None:
+		print("Initializing face detector...")
+		detector = load_detector(args)
+
+	if tracker is not None:
+		predictions = tracker.track(images)
+	else:
+		predictions = detect_rects(images, args, detector)
+
+	check_rects(predictions, images)
+	boxes = face_boxes.pad_and_smooth(predictions, (images[0].shape[1], images[0].shape[0]), args)
+	# ONLY return coordinates relative to the ORIGINAL frames passed in
 	results = [(y1, y2, x1, x2) for (x1, y1, x2, y2) in boxes]
 	return results 
 
-def datagen(frames, mels, face_det_results=None):
+def check_rects(rects, images):
+	for rect, image in zip(rects, images):
+		if rect is None:
+			cv2.imwrite('temp/faulty_frame.jpg', image)
+			raise ValueError('Face not detected! Ensure the video contains a face in all the frames.')
+
+def datagen(frames, mels, args, face_det_results=None):
 	img_batch, mel_batch, frame_batch, coords_batch = [], [], [], []
 
 	if face_det_results is None:
 		if args.box[0] == -1:
 			if not args.static:
-				face_det_results = face_detect(frames) # BGR2RGB for CNN face detection
+				face_det_results = face_detect(frames, args) # BGR2RGB for CNN face detection
 			else:
-				face_det_results = face_detect([frames[0]])
+				face_det_results = face_detect([frames[0]], args)
 		else:
 			print('Using the specified bounding box instead of face detection...')
 			y1, y2, x1, x2 = args.box
@@ -231,176 +328,133 @@ def _load(checkpoint_path):
 	return checkpoint
 
 def load_model(path):
-	model = Wav2Lip()
 	print("Load checkpoint from: {}".format(path))
-	checkpoint = _load(path)
-	s = checkpoint["state_dict"]
-	new_s = {}
-	for k, v in s.items():
-		new_s[k.replace('module.', '')] = v
-	model.load_state_dict(new_s)
+	if checkpoints.is_safetensors(path):
+		# Written by convert_checkpoints.py: memory-mapped, nothing to unpickle or rename
+		return checkpoints.load(Wav2Lip, path, device)
+	model = Wav2Lip()
+	model.load_state_dict(checkpoints.inference_state_dict(_load(path)))
 
 	model = model.to(device)
 	return model.eval()
 
-def main():
-	if not os.path.isfile(args.face):
-		raise ValueError('--face argument must be a valid path to video/image file')
+def load_detector(args=None):
+	name, kwargs = 'sfd', {}
+	if args is not None:
+		name = args.face_detector
+		kwargs = {'min_face_size': args.face_det_min_size, 'max_face_size': args.face_det_max_size}
+		if name == 'sfd' and args.eager:
+			kwargs['path_to_exported'] = ''
+	return face_detection.FaceAlignment(face_detection.LandmarksType._2D, 
+										flip_input=False, device=device, face_detector=name,
+										face_detector_kwargs=kwargs)
 
-	elif args.face.split('.')[1] in ['jpg', 'png', 'jpeg']:
-		full_frames = [cv2.imread(args.face)]
-		fps = args.fps
+def load_restorer(args):
+	if args.restorer != 'gfpgan' or args.skip_gfpgan:
+		return None
+	return restoration.load_restorer(args.restorer_path, device)
 
-	else:
-		video_stream = cv2.VideoCapture(args.face)
-		fps = video_stream.get(cv2.CAP_PROP_FPS)
-		full_frames = None # Ensure it is defined for streaming mode
-
-		if fps <= 0:
-			# Likely an LFS pointer or corrupted file
-			video_stream.release()
-			raise ValueError(f"CRITICAL: Could not read FPS from {args.face}. "
-							 "The file might be an LFS pointer (not downloaded) or corrupted. "
-							 "Check your Git LFS budget and ensure models are pulled.")
-
-		print('Getting video duration...')
-		# If we have cache, we only need basic info and then we stream
-		if args.face_det_results:
-			print(f"Using pre-computed face detection results from {args.face_det_results}")
-			cached_boxes = np.load(args.face_det_results)
-			num_frames = int(video_stream.get(cv2.CAP_PROP_FRAME_COUNT))
-			print(f"Video has {num_frames} frames according to metadata.")
-		else:
-			print('Checking video availability (Streaming mode enabled)...')
-			# Just count frames without loading them all into RAM
-			num_frames = int(video_stream.get(cv2.CAP_PROP_FRAME_COUNT))
-			if num_frames == 0:
-				# Fallback if metadata is missing
-				while video_stream.grab(): num_frames += 1
-				video_stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
-			print(f"Video has {num_frames} frames.")
-			full_frames = None # Use None to signal streaming mode
-
-	if not args.audio.endswith('.wav'):
-		print('Extracting raw audio...')
-		command = 'ffmpeg -y -i "{}" -strict -2 "{}"'.format(args.audio, 'temp/temp.wav')
-		subprocess.call(command, shell=True)
-		args.audio = 'temp/temp.wav'
-
-	wav = audio.load_wav(args.audio, 16000)
-	mel = audio.melspectrogram(wav)
-	print(mel.shape)
+def load_models(args, detector=True):
+	"""Load everything main() needs so it can be reused across jobs.
 
-	if np.isnan(mel.reshape(-1)).sum() > 0:
-		raise ValueError('Mel contains nan! Using a TTS voice? Add a small epsilon noise to the wav file and try again')
+	Returns a dict with 'model', 'detector', 'restorer' and 'restore_pool'.
+	The detector is built eagerly unless detector=False, in which case main()
+	creates one on demand. Call close_models() when done to stop the
+	--restorer_workers processes.
+	"""
+	precision.check_device(args.precision, device)
+	model = None
+	if args.precision == 'fp32' and not args.eager:
+		exported_path = graph_export.artifact_path(args.checkpoint_path)
+		model = graph_export.load(exported_path, graph_export.KIND_WAV2LIP, args.checkpoint_path, device)
+		if model is not None:
+			print("Load exported graph from: {}".format(exported_path))
+	if model is None:
+		model = precision.to_precision(load_model(args.checkpoint_path), args.precision)
+	models = {'model': model}
+	print ("Model loaded")
+	models['detector'] = load_detector(args) if detector else None
+	models['restorer'], models['restore_pool'] = None, None
+	if (args.restorer_workers > 0 and args.restorer == 'gfpgan' and not args.skip_gfpgan
+			and restoration.can_load(args.restorer_path)):
+		# Only the workers run GFPGAN, so this process does not load it
+		models['restore_pool'] = restoration.RestorePool(
+			restorer_path=args.restorer_path, workers=args.restorer_workers,
+			batch_size=args.restorer_batch_size, device=device)
+	else:
+		models['restorer'] = load_restorer(args)
+	return models
 
-	mel_chunks = []
-	mel_idx_multiplier = 80./fps 
-	i = 0
-	while 1:
-		start_idx = int(i * mel_idx_multiplier)
-		if start_idx + mel_step_size > len(mel[0]):
-			mel_chunks.append(mel[:, len(mel[0]) - mel_step_size:])
-			break
-		mel_chunks.append(mel[:, start_idx : start_idx + mel_step_size])
-		i += 1
+def close_models(models):
+	if models.get('restore_pool') is not None:
+		models['restore_pool'].close()
 
-	print("Length of mel chunks: {}".format(len(mel_chunks)))
-	
-	# Determine how many frames we actually need
-	num_frames_needed = len(mel_chunks)
-	
-	batch_size = args.wav2lip_batch_size
+def transform_frame(f, args):
+	"""Apply --resize_factor, --rotate and --crop to a decoded frame."""
+	if args.resize_factor > 1:
+		f = cv2.resize(f, (f.shape[1]//args.resize_factor, f.shape[0]//args.resize_factor))
+	if args.rotate:
+		f = cv2.rotate(f, cv2.ROTATE_90_CLOCKWISE)
 	
-	# Load model first to avoid repeating it
-	model = load_model(args.checkpoint_path)
-	print ("Model loaded")
+	y1, y2, x1, x2 = args.crop
+	if x2 == -1: x2 = f.shape[1]
+	if y2 == -1: y2 = f.shape[0]
+	return f[y1:y2, x1:x2]
 
-	# Initialize Restorer
-	restorer = None
-	if args.restorer == 'gfpgan' and not args.skip_gfpgan:
-		if not HAS_GFPGAN:
-			print("❌ Error: gfpgan package not installed. Skipping restoration.")
-		elif not args.restorer_path or not os.path.exists(args.restorer_path):
-			print(f"❌ Error: Restorer path {args.restorer_path} not found. Skipping restoration.")
-		else:
-			print(f"✨ Initializing GFPGAN Restorer with weights: {args.restorer_path}")
-			restorer = GFPGANer(
-				model_path=args.restorer_path,
-				upscale=1,
-				arch='clean',
-				channel_multiplier=2,
-				device=device
-			)
+def load_face_det_results(path, args, video_sha1, src_size):
+	"""Boxes (x1, y1, x2, y2) in transform_frame() pixels from --face_det_results.
 
-	video_stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
-	
-	# Prepare video writer
-	# We need the first frame's shape to initialize the writer
-	ret, first_frame = video_stream.read()
-	if not ret: raise ValueError("Could not read first frame")
-	video_stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
+	Accepts a face-box cache or a bare precompute_face.py .npy; both hold
+	source-resolution boxes, which are mapped through resize/rotate/crop.
+	Raw face-box cache entries also get --pads and smoothing.
+	"""
+	if path.endswith('.npy'):
+		return face_boxes.source_to_frame(np.load(path), src_size, args)
+	boxes, meta = face_boxes.load(path)
+	if meta['video_sha1'] != video_sha1:
+		raise ValueError(f"{path} was made for a different video than {args.face}. Re-run precompute_face.py.")
+	return face_boxes.resolve(boxes, meta, src_size, args)
 
-	if args.resize_factor > 1:
-		first_frame = cv2.resize(first_frame, (first_frame.shape[1]//args.resize_factor, first_frame.shape[0]//args.resize_factor))
-	y1, y2, x1, x2 = args.crop
-	if x2 == -1: x2 = first_frame.shape[1]
-	if y2 == -1: y2 = first_frame.shape[0]
-	first_frame = first_frame[y1:y2, x1:x2]
-	frame_h, frame_w = first_frame.shape[:-1]
-		
-	out = cv2.VideoWriter('temp/result.avi', 
-							cv2.VideoWriter_fourcc(*'DIVX'), fps, (frame_w, frame_h))
-
-	# Pre-compute face boxes if not using cache and not using static image
-	face_det_results = None
-	if not args.face_det_results and args.box[0] == -1:
-		print('✨ Run: Automatic face detection (Streaming mode)...')
-		video_stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
-		
-		detector = face_detection.FaceAlignment(face_detection.LandmarksType._2D, 
-												flip_input=False, device=device)
-		
-		# Process in smaller chunks to keep RAM low
-		all_coords = []
-		chunk_size = 64 # Further reduced chunk size for high-res safety
-		for chunk_start in tqdm(range(0, num_frames, chunk_size), desc="Detecting Faces"):
-			detection_frames = []
-			for _ in range(min(chunk_size, num_frames - chunk_start)):
-				ret, f = video_stream.read()
-				if not ret: break
-				
-				# Optimization: Resize for detection only
-				# We keep 'f' for detection but don't hold full res in memory if possible
-				if args.resize_factor > 1:
-					f = cv2.resize(f, (f.shape[1]//args.resize_factor, f.shape[0]//args.resize_factor))
-				if args.rotate:
-					f = cv2.rotate(f, cv2.ROTATE_90_CLOCKWISE)
-				
-				y1_c, y2_c, x1_c, x2_c = args.crop
-				if x2_c == -1: x2_c = f.shape[1]
-				if y2_c == -1: y2_c = f.shape[0]
-				f = f[y1_c:y2_c, x1_c:x2_c]
-				
-				# Keep it FULL RES for detection_frames so face_detect 
-				# can return coordinates valid for the original frame
-				detection_frames.append(f)
-			
-			if detection_frames:
-				chunk_coords = face_detect(detection_frames, detector=detector)
-				all_coords.extend(chunk_coords)
-				del detection_frames
-		
-		face_det_results = all_coords
-		del detector # Cleanup detector from GPU
-		video_stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
-
-	# Streaming implementation for OOM safety
-	for i in tqdm(range(0, num_frames_needed, batch_size)):
-		# 1. Prepare batch data
-		img_batch, mel_batch, frames, coords = [], [], [], []
+def get_face_coords(j, f, args, cached_boxes=None, face_det_results=None):
+	"""Face box (y1, y2, x1, x2) to use for output frame j."""
+	if cached_boxes is not None:
+		# Use cached boxes
+		c = cached_boxes[j % len(cached_boxes)]
+		x1, y1, x2, y2 = map(int, c)
+		y1 = max(0, y1); y2 = min(f.shape[0], y2)
+		x1 = max(0, x1); x2 = min(f.shape[1], x2)
+		return (y1, y2, x1, x2)
+	elif face_det_results is not None:
+		# Use results from automatic detection (stored as coords)
+		return face_det_results[j % len(face_det_results)]
+	elif args.box[0] != -1:
+		return tuple(args.box)
+	else:
+		# Fallback to center crop
+		h, w = f.shape[:2]
+		return (h//4, h//2, w//4, w//2)
+
+def iter_batches(args, video_stream, full_frames, mel_chunks, cached_boxes=None, face_det_results=None,
+				 crop_faces=True, start=0):
+	"""Decode stage: yield one dict per Wav2Lip batch.
+
+	Keys: 'faces' ((B, img_size, img_size, 3) uint8 BGR crops, or None when
+	crop_faces is False),
+	'mels', 'frames', 'coords', 'indices' (source frame index of each frame)
+	and 'positions' (output frame index of each frame).
+	mel_chunks[0] belongs to output frame `start`; video_stream must already
+	be positioned on its source frame.
+	"""
+	batch_size = args.wav2lip_batch_size
+	num_frames_needed = start + len(mel_chunks)
+	# index of the next frame video_stream will return
+	pos = int(video_stream.get(cv2.CAP_PROP_POS_FRAMES)) if video_stream is not None else 0
+	for i in range(start, num_frames_needed, batch_size):
+		mel_batch, frames, coords, indices, positions = [], [], [], [], []
 		
 		current_batch_end = min(i + batch_size, num_frames_needed)
+		if crop_faces:
+			faces = np.empty((current_batch_end - i, args.img_size, args.img_size, 3), np.uint8)
 		for j in range(i, current_batch_end):
 			# Get frame
 			if full_frames is None:
@@ -408,118 +462,612 @@ def main():
 				if not ret:
 					# End of video reached; if we still need frames, loop back to the start
 					video_stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
+					pos = 0
 					ret, f = video_stream.read()
 					if not ret: break # Should not happen unless video is corrupted
-				
-				# Apply transforms
-				if args.resize_factor > 1:
-					f = cv2.resize(f, (f.shape[1]//args.resize_factor, f.shape[0]//args.resize_factor))
-				if args.rotate:
-					f = cv2.rotate(f, cv2.ROTATE_90_CLOCKWISE)
-				
-				y1, y2, x1, x2 = args.crop
-				if x2 == -1: x2 = f.shape[1]
-				if y2 == -1: y2 = f.shape[0]
-				f = f[y1:y2, x1:x2]
+				f = transform_frame(f, args)
+				idx = pos
+				pos += 1
 			else:
-				# Use j % len(full_frames) to support video looping or single-frame static images
+				# Use j % len(full_frames) to support video looping or single-frame static images.
+				# This is a view; the write stage copies it before pasting.
 				idx = j % len(full_frames)
-				f = full_frames[idx].copy()
+				f = full_frames[idx]
 			
-			# Get face coords
-			if args.face_det_results:
-				# Use cached boxes
-				c = cached_boxes[j % len(cached_boxes)]
-				x1, y1, x2, y2 = map(int, c)
-				y1 = max(0, y1); y2 = min(f.shape[0], y2)
-				x1 = max(0, x1); x2 = min(f.shape[1], x2)
-				face = f[y1:y2, x1:x2]
-				coords_final = (y1, y2, x1, x2)
-			elif face_det_results is not None:
-				# Use results from automatic detection (stored as coords)
-				coords_final = face_det_results[j % len(face_det_results)]
+			coords_final = get_face_coords(j, f, args, cached_boxes, face_det_results)
+			if crop_faces:
+				# Resized straight into the batch buffer; face_batch_tensor() converts to RGB
 				y1, y2, x1, x2 = coords_final
-				face = f[y1:y2, x1:x2]
-			elif args.box[0] != -1:
-				y1, y2, x1, x2 = args.box
-				face = f[y1:y2, x1:x2]
-				coords_final = (y1, y2, x1, x2)
-			else:
-				# Fallback to center crop
-				h, w = f.shape[:2]
-				face = f[h//4:h//2, w//4:w//2]
-				coords_final = (h//4, h//2, w//4, w//2)
-			
-			# Convert face to RGB for the model
-			face_rgb = cv2.cvtColor(face, cv2.COLOR_BGR2RGB)
-			face_rgb = cv2.resize(face_rgb, (args.img_size, args.img_size))
+				cv2.resize(f[y1:y2, x1:x2], (args.img_size, args.img_size), dst=faces[len(frames)])
 			
-			img_batch.append(face_rgb)
-			mel_batch.append(mel_chunks[j])
+			mel_batch.append(mel_chunks[j - start])
 			frames.append(f)
 			coords.append(coords_final)
+			indices.append(idx)
+			positions.append(j)
 			
-		if not img_batch: break
-		
-		# 2. Run inference on batch
-		img_batch_np = np.asarray(img_batch)
-		mel_batch_np = np.asarray(mel_batch)
+		if not frames: break
+		yield {'faces': faces[:len(frames)] if crop_faces else None, 'mels': mel_batch,
+			   'frames': frames, 'coords': coords, 'indices': indices, 'positions': positions,
+			   'shared_frames': full_frames is not None}
 
-		img_masked = img_batch_np.copy()
-		img_masked[:, args.img_size//2:] = 0
-		img_batch_tensor = np.concatenate((img_masked, img_batch_np), axis=3) / 255.
+def iter_frames(args, video_stream, full_frames, num_frames):
+	"""Yield each of the num_frames transformed source frames once, in order."""
+	if full_frames is not None:
+		for idx in range(num_frames):
+			yield full_frames[idx]
+		return
+	video_stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
+	for _ in range(num_frames):
+		ret, f = video_stream.read()
+		if not ret: break
 		
-		img_batch_tensor = torch.FloatTensor(np.transpose(img_batch_tensor, (0, 3, 1, 2))).to(device)
-		mel_batch_tensor = torch.FloatTensor(np.transpose(mel_batch_np, (0, 1, 2))) # mel_chunks are (80, 16)
-		# Needs extra dims: (B, 1, 80, 16)
-		mel_batch_tensor = mel_batch_tensor.unsqueeze(1).to(device)
+		# Keep it FULL RES for detection_frames so face_detect 
+		# can return coordinates valid for the original frame
+		yield transform_frame(f, args)
+	video_stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
 
-		with torch.no_grad():
-			pred = model(mel_batch_tensor, img_batch_tensor)
+def detect_faces_streaming(frames, num_frames, args, detector, chunk_size=64):
+	"""Raw detector boxes (x1, y1, x2, y2) for an iterable of frames, detected in chunks to keep RAM low.
 
-		pred = pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.
-		
-		# 3. Post-process and write
-		for p, f, c in zip(pred, frames, coords):
-			y1, y2, x1, x2 = c
-			p = cv2.resize(p.astype(np.uint8), (x2 - x1, y2 - y1))
-			
-			# Wav2Lip output is RGB (from the model), result frame 'f' is BGR (OpenCV)
-			# We MUST convert back to BGR to avoid the "blue color filter" look
-			p_bgr = cv2.cvtColor(p, cv2.COLOR_RGB2BGR)
-			
-			if restorer is not None:
-				try:
-					# Paste the BGR patch into a copy for restoration
-					f_copy = f.copy()
-					f_copy[y1:y2, x1:x2] = p_bgr
-					
-					# Enhance with GFPGAN (this creates a seamless face)
-					_, _, restored_img = restorer.enhance(f_copy, has_aligned=False, only_center_face=False, paste_back=True)
-					if restored_img is not None:
-						f = restored_img
-					else:
-						# Fallback if restoration fails
-						f[y1:y2, x1:x2] = p_bgr
-				except Exception as e:
-					print(f"⚠️ Restoration failed for a frame: {e}. Falling back to standard sync.")
-					f[y1:y2, x1:x2] = p_bgr
+	With --face_det_stride > 1 a KeyframeTracker spans the chunks so only
+	keyframes are detected.
+	"""
+	tracker = None
+	if args.face_det_stride > 1:
+		tracker = face_tracking.KeyframeTracker(
+			lambda images: detect_rects(images, args, detector), stride=args.face_det_stride,
+			motion_threshold=args.face_det_motion, iou_threshold=args.face_det_iou)
+	frames = iter(frames)
+	all_rects = []
+	for chunk_start in tqdm(range(0, num_frames, chunk_size), desc="Detecting Faces"):
+		detection_frames = list(itertools.islice(frames, chunk_size))
+		if detection_frames:
+			if tracker is not None:
+				chunk_rects = tracker.track(detection_frames)
 			else:
-				# Standard mode (no restorer)
-				f[y1:y2, x1:x2] = p_bgr
+				chunk_rects = detect_rects(detection_frames, args, detector)
+			check_rects(chunk_rects, detection_frames)
+			all_rects.extend(chunk_rects)
+			del detection_frames
+	if tracker is not None:
+		print(f"Face detection ran on {tracker.detected}/{tracker.frames} frames (keyframe tracking)")
+	return all_rects
 
-			out.write(f)
+def face_batch_tensor(faces, args):
+	"""(B, 6, H, W) float32 model input from (B, H, W, 3) uint8 BGR crops: lower-half-masked face + reference face.
 
-	out.release()
-	video_stream.release()
+	The crops go to the device as uint8 and are written into one preallocated
+	float32 tensor; channel order, scaling and masking are in-place torch ops
+	on the whole batch.
+	"""
+	faces = torch.from_numpy(np.ascontiguousarray(faces)).to(device)
+	half = args.img_size // 2
+	out = torch.empty((len(faces), 6, args.img_size, args.img_size), dtype=torch.float32, device=device,
+					  memory_format=precision.memory_format(args.precision))
+	out[:, 3:] = faces.permute(0, 3, 1, 2).flip(1)	# reference face, BGR -> RGB
+	out[:, 3:].div_(255.)
+	out[:, :3, :half] = out[:, 3:, :half]	# masked face: lower half zeroed
+	out[:, :3, half:] = 0
+	return out
+
+def run_model(model, batch, args, face_feats=None):
+	"""Model stage: run Wav2Lip on one batch, adding 'pred', a (B, 3, H, W) RGB tensor in [0, 1] on the device.
+
+	With a FaceFeatureCache only the audio encoder and decoder run; the face
+	encoder pyramid is read from the cache.
+	"""
+	if not batch['mels']:
+		# Every frame of the batch was skipped
+		batch['pred'] = []
+		return batch
+	# mel_chunks are (80, 16); the model needs (B, 1, 80, 16)
+	mel_batch_tensor = torch.from_numpy(np.asarray(batch['mels'], np.float32)).unsqueeze(1).to(device)
+
+	with torch.no_grad(), precision.autocast(args.precision, device):
+		if face_feats is not None:
+			audio_embedding = model.audio_encoder(mel_batch_tensor)
+			pred = model.decode(audio_embedding, face_feats.gather(batch['indices'], device))
+		else:
+			pred = model(mel_batch_tensor, face_batch_tensor(batch['faces'], args))
+
+	batch['pred'] = pred.float()
+	return batch
+
+def resize_predictions(pred, coords):
+	"""Scale (B, 3, H, W) RGB predictions in [0, 1] to their (y1, y2, x1, x2) boxes as BGR uint8 patches.
+
+	On the GPU, boxes of the same size are resized together in one
+	F.interpolate call. On the CPU, cv2's fixed-point uint8 resize is several
+	times faster than float interpolation, so the batch is converted to BGR
+	uint8 in one op and only the resize runs per patch.
+	"""
+	if not len(coords):
+		return []
+	if not pred.is_cuda:
+		with torch.no_grad():
+			pred = (pred * 255.).clamp_(0, 255).to(torch.uint8).permute(0, 2, 3, 1).flip(3).contiguous().numpy()
+		return [cv2.resize(p, (x2 - x1, y2 - y1)) for p, (y1, y2, x1, x2) in zip(pred, coords)]
+
+	groups = {}
+	for k, (y1, y2, x1, x2) in enumerate(coords):
+		groups.setdefault((y2 - y1, x2 - x1), []).append(k)
+	patches = [None] * len(coords)
+	with torch.no_grad():
+		for size, ks in groups.items():
+			p = F.interpolate(pred[ks] * 255., size=size, mode='bilinear', align_corners=False)
+			# Wav2Lip output is RGB, frames are BGR (OpenCV): flip to avoid the "blue color filter" look
+			p = p.flip(1).clamp_(0, 255).to(torch.uint8).permute(0, 2, 3, 1).contiguous().cpu().numpy()
+			for k, patch in zip(ks, p):
+				patches[k] = patch
+	return patches
+
+def calibration_batches(args, video_stream, full_frames, num_frames, mel_chunks, cached_boxes=None,
+						face_det_results=None):
+	"""(mel_batch, face_batch) tensors for --precision int8 calibration.
+
+	Uses --calibration_frames frames spread evenly over the base video, each
+	paired with a mel chunk spread evenly over the job's audio.
+	"""
+	count = max(1, min(args.calibration_frames, num_frames))
+	faces = np.empty((count, args.img_size, args.img_size, 3), np.uint8)
+	for k, idx in enumerate(np.linspace(0, num_frames - 1, count).astype(int)):
+		if full_frames is not None:
+			f = full_frames[idx]
+		else:
+			video_stream.set(cv2.CAP_PROP_POS_FRAMES, idx)
+			ret, f = video_stream.read()
+			if not ret:
+				raise ValueError('Could not read frame {} of {}'.format(idx, args.face))
+			f = transform_frame(f, args)
+		y1, y2, x1, x2 = get_face_coords(idx, f, args, cached_boxes, face_det_results)
+		cv2.resize(f[y1:y2, x1:x2], (args.img_size, args.img_size), dst=faces[k])
+	mels = np.asarray([mel_chunks[i] for i in np.linspace(0, len(mel_chunks) - 1, count).astype(int)], np.float32)
+	for i in range(0, count, args.wav2lip_batch_size):
+		yield (torch.from_numpy(mels[i:i + args.wav2lip_batch_size]).unsqueeze(1),
+			   face_batch_tensor(faces[i:i + args.wav2lip_batch_size], args).cpu())
+
+def skip_frames(batch, skip):
+	"""Take the output frames in `skip` out of a decode batch so neither model nor restorer sees them.
+
+	Adds 'skipped', [(position in batch, output frame, source frame, source
+	index)], and 'rendered', the positions of the frames that are still rendered.
+	"""
+	keep, skipped = [], []
+	for k, (j, f, idx) in enumerate(zip(batch['positions'], batch['frames'], batch['indices'])):
+		if j in skip:
+			skipped.append((k, j, f, idx))
+		else:
+			keep.append(k)
+	if skipped:
+		for key in ('mels', 'frames', 'coords', 'indices', 'positions'):
+			batch[key] = [batch[key][k] for k in keep]
+		if batch['faces'] is not None:
+			batch['faces'] = batch['faces'][keep]
+	batch['skipped'] = skipped
+	batch['rendered'] = keep
+	return batch
+
+def fill_skipped(batch, fill):
+	"""Fill stage: merge 'out' with fill(output frame, source frame, source index) for every skipped frame."""
+	if not batch['skipped']:
+		return batch
+	out = [None] * (len(batch['rendered']) + len(batch['skipped']))
+	for k, f in zip(batch['rendered'], batch['out']):
+		out[k] = f
+	for k, j, f, idx in batch['skipped']:
+		out[k] = fill(j, f, idx)
+	batch['out'] = out
+	return batch
+
+def paste_predictions(batch, restore_pool, restored_frames=None):
+	"""Paste stage: paste predictions back into their frames.
+
+	Adds 'out', the frames in batch order, and 'pasted', the frames
+	restore_faces() restores (the same list unless pasting into pre-restored
+	frames for a restorer).
+	"""
+	frames = []
+	for f, idx in zip(batch['frames'], batch['indices']):
+		if restored_frames is not None:
+			f = restored_frames[idx].copy()
+		elif batch['shared_frames']:
+			f = f.copy()
+		frames.append(f)
+	patches = resize_predictions(batch['pred'], batch['coords'])
+
+	batch['pasted'], batch['out'] = restore_pool.paste(frames, patches, batch['coords'],
+													   mouth_only=restored_frames is not None)
+	return batch
+
+def restore_faces(batch, restore_pool, args, mouth_only=False):
+	"""Restore stage: run the restorer on the pasted faces; replaces 'out' with the finished frames."""
+	batch['out'] = restore_pool.restore(batch.pop('pasted'), batch['out'], batch['coords'], mode=args.restore_mode,
+										weight=args.restore_weight, mouth_only=mouth_only)
+	return batch
+
+def open_frames(args, video_sha1):
+	"""Frame source for args.face: (full_frames, video_stream, fps, num_frames).
+
+	full_frames is an indexable FrameStore/list, or None when frames are
+	streamed from video_stream.
+	"""
+	if args.frame_store:
+		full_frames = FrameStore(args.frame_store)
+		full_frames.check(frame_store_key(args, video_sha1))
+		print(f"Using frame store {args.frame_store} ({len(full_frames)} frames)")
+		return full_frames, None, full_frames.fps, len(full_frames)
+
+	if args.face.split('.')[1] in ['jpg', 'png', 'jpeg']:
+		return [cv2.imread(args.face)], None, args.fps, 1
+
+	video_stream = cv2.VideoCapture(args.face)
+	fps = video_stream.get(cv2.CAP_PROP_FPS)
+
+	if fps <= 0:
+		# Likely an LFS pointer or corrupted file
+		video_stream.release()
+		raise ValueError(f"CRITICAL: Could not read FPS from {args.face}. "
+						 "The file might be an LFS pointer (not downloaded) or corrupted. "
+						 "Check your Git LFS budget and ensure models are pulled.")
+
+	print('Getting video duration...')
+	# If we have cache, we only need basic info and then we stream
+	if args.face_det_results:
+		num_frames = int(video_stream.get(cv2.CAP_PROP_FRAME_COUNT))
+		print(f"Video has {num_frames} frames according to metadata.")
+	else:
+		print('Checking video availability (Streaming mode enabled)...')
+		# Just count frames without loading them all into RAM
+		num_frames = int(video_stream.get(cv2.CAP_PROP_FRAME_COUNT))
+		if num_frames == 0:
+			# Fallback if metadata is missing
+			while video_stream.grab(): num_frames += 1
+			video_stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
+		print(f"Video has {num_frames} frames.")
+	return None, video_stream, fps, num_frames
+
+def find_cached_boxes(args, video_sha1, src_size, num_frames):
+	"""Boxes (x1, y1, x2, y2) from --face_det_results or the face-box cache, else None."""
+	if args.face_det_results:
+		print(f"Using pre-computed face detection results from {args.face_det_results}")
+		return load_face_det_results(args.face_det_results, args, video_sha1, src_size)
+	if args.box[0] == -1 and args.face_box_cache:
+		hit = face_boxes.lookup(args.face_box_cache, video_sha1, args, num_frames, src_size)
+		if hit is not None:
+			path, boxes, meta = hit
+			print(f"Using cached face boxes from {path}")
+			return boxes
+	return None
+
+def plan_memory(args):
+	"""Whether to size batches for --memory_budget (peak memory is measured through Linux /proc)."""
+	if not args.memory_budget:
+		return False
+	if not memory_plan.can_measure(device):
+		print('⚠️ --memory_budget measures memory through Linux /proc; keeping the configured batch sizes')
+		return False
+	return True
+
+def memory_budget(args):
+	"""memory_plan.Budget for --memory_budget.
+
+	sharding.py sets _memory_share on each worker's args: the fraction of
+	free GPU memory that worker plans for. It is not a CLI option.
+	"""
+	return memory_plan.Budget(args.memory_budget, device, getattr(args, '_memory_share', 1.))
+
+def plan_detection(args, detector, frame, num_frames):
+	"""(args with the planned face_det_batch_size, streaming chunk size) for --memory_budget.
+
+	The detector is probed on copies of `frame`, a transformed source frame.
+	"""
+	args = copy.copy(args)
+	budget = memory_budget(args)
+
+	def run(images):
+		args.face_det_batch_size = len(images)
+		detect_rects(images, args, detector)
+
+	cost = memory_plan.measure(run, lambda n: [frame] * n, device)
+	args.face_det_batch_size, chunk_size = memory_plan.plan_detection(budget, cost, frame.nbytes, num_frames)
+	print('🧮 Memory plan: face detection batch {} ({}/image), chunks of {} frames ({} free of {})'.format(
+		args.face_det_batch_size, memory_plan.format_bytes(cost.per_item), chunk_size,
+		memory_plan.format_bytes(budget.host), memory_plan.format_bytes(budget.total)))
+	return args, chunk_size
+
+def plan_render(args, model, frame, coords, shared_frames, num_frames, num_stages, face_feats=None,
+				restore_pool=None, mouth_only=False):
+	"""args with the planned wav2lip_batch_size and restorer_batch_size for --memory_budget.
+
+	The model (and restorer, in a worker of restore_pool if it has any) are
+	probed on batches shaped like the job's: copies of `frame`, a face box
+	`coords` and the job's face features. Every batch in flight holds its
+	output frames, and the decoded ones unless frames are shared. Each
+	--restorer_workers process is charged its own copy of the restorer weights.
+	"""
+	args = copy.copy(args)
+	budget = memory_budget(args)
+
+	def model_batch(n):
+		faces = None if face_feats is not None else np.zeros((n, args.img_size, args.img_size, 3), np.uint8)
+		return {'mels': [np.zeros((80, mel_step_size), np.float32)] * n, 'faces': faces, 'indices': [0] * n}
+
+	model_cost = memory_plan.measure(lambda batch: run_model(model, batch, args, face_feats), model_batch, device)
+	restorer_cost, restorer_weights = None, 0
+	if restore_pool is not None and restore_pool.restoring:
+		y1, y2, x1, x2 = coords
+		patch = np.zeros((y2 - y1, x2 - x1, 3), np.uint8)
+		restorer_cost, restorer_weights = restore_pool.measure(frame, patch, coords, args.restore_mode,
+															   args.restore_weight, mouth_only)
+
+	in_flight = memory_plan.batches_in_flight(args.pipeline, args.pipeline_queue_size, num_stages)
+	frame_bytes = frame.nbytes * (1 if shared_frames else 2)
+	args.wav2lip_batch_size, restorer_batch_size = memory_plan.plan_render(
+		budget, model_cost, frame_bytes, in_flight, num_frames, restorer_cost, args.restorer_workers, restorer_weights)
+	plan = 'Wav2Lip batch {} ({}/frame + {}/frame held by {} batch(es) in flight)'.format(
+		args.wav2lip_batch_size, memory_plan.format_bytes(model_cost.per_item), memory_plan.format_bytes(frame_bytes),
+		in_flight)
+	if restorer_batch_size is not None:
+		args.restorer_batch_size = restorer_batch_size
+		plan += ', restorer batch {} ({}/face)'.format(restorer_batch_size,
+													  memory_plan.format_bytes(restorer_cost.per_item))
+		if args.restorer_workers > 0:
+			plan += ', {} restorer worker(s) holding {} of weights each'.format(
+				args.restorer_workers, memory_plan.format_bytes(restorer_weights))
+	print('🧮 Memory plan: {} ({} free of {})'.format(plan, memory_plan.format_bytes(budget.host),
+													 memory_plan.format_bytes(budget.total)))
+	return args
+
+def detect_boxes(args, detector, video_stream, full_frames, num_frames, fps, video_sha1, src_size):
+	"""Automatic detection over every source frame; saves the raw boxes to the face-box cache.
+
+	Returns face_det_results, a list of (y1, y2, x1, x2) with --pads and
+	smoothing applied over the whole video.
+	"""
+	print('✨ Run: Automatic face detection (Streaming mode)...')
+	# Process in smaller chunks to keep RAM low
+	frames = iter_frames(args, video_stream, full_frames, num_frames)
+	chunk_size = 64
+	if plan_memory(args):
+		first = next(frames)
+		frames = itertools.chain([first], frames)
+		args, chunk_size = plan_detection(args, detector, first, num_frames)
+	# Whole pixels, as face_detect pads them, so fresh and cached boxes agree
+	rects = np.trunc(np.array(detect_faces_streaming(frames, num_frames, args, detector, chunk_size), np.float64))
+
+	if args.face_box_cache and len(rects) == num_frames:
+		path = face_boxes.cache_path(args.face_box_cache, video_sha1, args)
+		face_boxes.save(path, face_boxes.frame_to_source(rects, src_size, args), video_sha1, args,
+						fps, num_frames, src_size, detector=args.face_detector)
+		print(f"Saved face boxes to {path}")
+	boxes = face_boxes.pad_and_smooth(rects, face_boxes.frame_size(src_size, args), args)
+	return [(y1, y2, x1, x2) for (x1, y1, x2, y2) in boxes]
+
+def load_mel_chunks(args, fps):
+	"""Mel spectrogram of args.audio split into one (80, 16) chunk per output frame (a MelChunks view)."""
+	mel = mel_cache.load(args.audio, args.mel_cache)
+	print(mel.shape)
+
+	if np.isnan(mel.reshape(-1)).sum() > 0:
+		raise ValueError('Mel contains nan! Using a TTS voice? Add a small epsilon noise to the wav file and try again')
+
+	mel_chunks = mel_cache.MelChunks.from_mel(mel, fps)
+	print("Length of mel chunks: {}".format(len(mel_chunks)))
+	return mel_chunks
+
+def load_previous_render(args, fps, size, start, end):
+	"""Frames of --previous_output to reuse for output frames [start, end).
+
+	Returns ({output frame: previous frame}, PreviousFrames). Only frames whose
+	audio is unchanged between --previous_audio and args.audio are reused.
+	"""
+	if not args.previous_audio:
+		raise ValueError('--previous_output needs the --previous_audio it was rendered from')
+	new_wav = audio.load_wav(args.audio, 16000)
+	old_wav = audio.load_wav(args.previous_audio, 16000)
+	reuse = incremental.plan_reuse(new_wav, old_wav, fps)
+	reuse = {j: i for j, i in reuse.items() if start <= j < end}
+	previous = incremental.PreviousFrames(args.previous_output, fps, size,
+										  len(incremental.chunk_starts(len(old_wav), fps)))
+	print(f"♻️ Reusing {len(reuse)}/{end - start} frames of {args.previous_output}, "
+		  f"rendering {end - start - len(reuse)}")
+	return reuse, previous
+
+def main(args, models=None, stats=None):
+	"""Run one lip-sync job. Pass `models` from load_models() to skip reloading.
+
+	If `stats` is a list, the pipeline's StageStats are appended to it.
+	"""
+	if (args.shards > 1 or args.segment_frames > 0) and args.frame_range is None:
+		import sharding
+		return sharding.render_segments(args, models)
+
+	if not os.path.isfile(args.face):
+		raise ValueError('--face argument must be a valid path to video/image file')
+
+	video_sha1 = file_digest(args.face)
+	src_size = face_boxes.source_size(args.face)
+	full_frames, video_stream, fps, num_frames = open_frames(args, video_sha1)
+	cached_boxes = find_cached_boxes(args, video_sha1, src_size, num_frames)
+	mel_chunks = load_mel_chunks(args, fps)
+
+	# Output frames [start, end) only, e.g. one shard of a --shards job
+	start, end = args.frame_range if args.frame_range is not None else (0, len(mel_chunks))
+	job_mel_chunks, mel_chunks = mel_chunks, mel_chunks[start:end]
 	
-	# Ensure output directory exists for outfile
-	out_dir = os.path.dirname(args.outfile)
-	if out_dir != '' and not os.path.exists(out_dir):
-		os.makedirs(out_dir)
+	# Determine how many frames we actually need
+	num_frames_needed = len(mel_chunks)
+	
+	# Load model first to avoid repeating it
+	own_models = models is None
+	if own_models:
+		models = load_models(args, detector=False)
+	out, avi_path = None, None
+	try:
+		model = models['model']
+		restorer = models['restorer'] if not args.skip_gfpgan else None
+		restore_pool = models.get('restore_pool') if not args.skip_gfpgan else None
+		if restore_pool is None:
+			restore_pool = restoration.RestorePool(restorer, batch_size=args.restorer_batch_size)
+		restoring = restore_pool.restoring
+
+		# Prepare video writer
+		# We need the first frame's shape to initialize the writer
+		if full_frames is None:
+			video_stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
+			ret, first_frame = video_stream.read()
+			if not ret: raise ValueError("Could not read first frame")
+			video_stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
+			first_frame = transform_frame(first_frame, args)
+		else:
+			first_frame = full_frames[0]
+		frame_h, frame_w = first_frame.shape[:-1]
 
-	command = 'ffmpeg -y -i "{}" -i "{}" -strict -2 -q:v 1 "{}"'.format(args.audio, 'temp/result.avi', args.outfile)
-	subprocess.check_call(command, shell=True)
+		# Ensure output directory exists for outfile
+		out_dir = os.path.dirname(args.outfile)
+		if out_dir != '' and not os.path.exists(out_dir):
+			os.makedirs(out_dir)
+
+		if args.writer == 'ffmpeg':
+			out = FFmpegPipeWriter(args.outfile, fps, (frame_w, frame_h), audio_path=None if args.video_only else args.audio,
+								   preset=args.ffmpeg_preset, crf=args.ffmpeg_crf, threads=args.ffmpeg_threads)
+		else:
+			# Each job gets its own intermediate, so concurrent jobs never share it
+			fd, avi_path = tempfile.mkstemp(suffix='.avi', prefix='result-', dir='temp')
+			os.close(fd)
+			out = cv2.VideoWriter(avi_path, 
+									cv2.VideoWriter_fourcc(*'DIVX'), fps, (frame_w, frame_h))
+
+		reuse, previous = None, None
+		if args.previous_output:
+			reuse, previous = load_previous_render(args, fps, (frame_w, frame_h), start, end)
+
+		# Pre-compute face boxes if not using cache and not using static image
+		face_det_results = None
+		if cached_boxes is None and args.box[0] == -1:
+			detector = models['detector'] or load_detector(args)
+			face_det_results = detect_boxes(args, detector, video_stream, full_frames, num_frames, fps,
+											video_sha1, src_size)
+			if models['detector'] is None:
+				del detector # Cleanup detector from GPU
+
+		if args.precision == 'int8' and not precision.is_quantized(model):
+			print(f"Calibrating int8 Wav2Lip on {args.calibration_frames} base-video frames...")
+			model = models['model'] = precision.quantize(model, calibration_batches(
+				args, video_stream, full_frames, num_frames, job_mel_chunks, cached_boxes, face_det_results))
+
+		face_feats = None
+		if args.face_feats_cache:
+			if cached_boxes is None and args.box[0] == -1:
+				raise ValueError('--face_feats_cache needs the face boxes it was built with: pass --face_det_results or --box')
+			face_feats = FaceFeatureCache(args.face_feats_cache)
+			face_feats.check(face_feats_key(args, video_sha1, checkpoints.source_digest(args.checkpoint_path),
+											cached_boxes))
+			print(f"Using cached face-encoder features from {args.face_feats_cache}")
+			if isinstance(model, torch.jit.ScriptModule):
+				# The exported graph only has forward(); the cache needs audio_encoder() and decode()
+				model = load_model(args.checkpoint_path)
+
+		restored_frames = None
+		if args.restored_frames:
+			restored_frames = FrameStore(args.restored_frames)
+			restored_frames.check(frame_store_key(args, video_sha1))
+			if 'restorer' not in restored_frames.meta:
+				raise ValueError(f"{args.restored_frames} was built without --restorer_path")
+			if restoring and restored_frames.meta['restorer'] != frame_restorer_key(args):
+				raise ValueError(f"{args.restored_frames} was restored with different GFPGAN weights, --restore_weight "
+								 f"or --restore_mode. Re-run precompute_frames.py.")
+			print(f"Compositing onto pre-restored frames from {args.restored_frames}")
+
+		silence_frames = None
+		if args.skip_silence and args.silence_frames:
+			silence_frames = FrameStore(args.silence_frames)
+			silence_frames.check(frame_store_key(args, video_sha1))
+			silence.check_store(silence_frames, args)
+
+		if plan_memory(args):
+			args = plan_render(args, model, first_frame,
+							   get_face_coords(start, first_frame, args, cached_boxes, face_det_results),
+							   full_frames is not None, num_frames_needed,
+							   3 + bool(args.skip_silence or reuse) + restoring,
+							   face_feats, restore_pool, restored_frames is not None)
+		restore_pool.batch_size = max(1, args.restorer_batch_size)
+
+		# Streaming implementation for OOM safety
+		num_batches = (num_frames_needed + args.wav2lip_batch_size - 1) // args.wav2lip_batch_size
+		pbar = tqdm(total=num_batches)
+
+		def write_stage(batch):
+			for f in batch['out']:
+				out.write(f)
+			pbar.update(1)
+
+		if video_stream is not None:
+			video_stream.set(cv2.CAP_PROP_POS_FRAMES, start % num_frames)
+		# Frames that skip the model and restorer: reused from --previous_output or silent
+		skip = set(reuse or ())
+		silent = set()
+		if args.skip_silence:
+			silent = silence.silent_frames(mel_chunks, args.silence_db, start=start) - skip
+			skip |= silent
+
+		def fill(j, f, idx):
+			if reuse and j in reuse:
+				return previous.get(reuse[j])
+			if silence_frames is not None:
+				return silence_frames[idx]
+			return restored_frames[idx] if restored_frames is not None else f
+
+		batches = iter_batches(args, video_stream, full_frames, mel_chunks,
+							   cached_boxes, face_det_results, crop_faces=face_feats is None, start=start)
+		if skip:
+			batches = (skip_frames(batch, skip) for batch in batches)
+		source = ('decode', batches)
+		stages = [('model', lambda batch: run_model(model, batch, args, face_feats)),
+				  ('paste', lambda batch: paste_predictions(batch, restore_pool, restored_frames))]
+		if restoring:
+			stages.append(('restore', lambda batch: restore_faces(batch, restore_pool, args,
+																  restored_frames is not None)))
+		if skip:
+			stages.append(('fill', lambda batch: fill_skipped(batch, fill)))
+		stages.append(('write', write_stage))
+		if args.pipeline:
+			stage_stats = pipeline.run_pipelined(source, stages, queue_size=args.pipeline_queue_size)
+		else:
+			stage_stats = pipeline.run_serial(source, stages)
+	except BaseException:
+		if out is not None and args.writer == 'ffmpeg':
+			out.abort()
+		elif avi_path is not None:
+			out.release()
+			os.remove(avi_path)
+		raise
+	finally:
+		if own_models:
+			close_models(models)
+	pbar.close()
+	if stats is not None:
+		stats.extend(stage_stats)
+	if args.skip_silence:
+		print(f"🤫 Skipped {len(silent)}/{num_frames_needed} silent frames "
+			  f"({'closed-mouth renders' if silence_frames is not None else 'base frames'})")
+	print('Stage timings ({} mode):'.format('pipelined' if args.pipeline else 'serial'))
+	print(pipeline.format_stats(stage_stats))
+
+	out.release()
+	if video_stream is not None:
+		video_stream.release()
+	if previous is not None:
+		previous.release()
+
+	if args.writer == 'avi':
+		command = 'ffmpeg -y -i "{}" -i "{}" -strict -2 -q:v 1 "{}"'.format(args.audio, avi_path, args.outfile)
+		try:
+			subprocess.check_call(command, shell=True)
+		finally:
+			os.remove(avi_path)
+	return args.outfile
 
 if __name__ == '__main__':
-	main()
+	main(parse_args())
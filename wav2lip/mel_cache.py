@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import array_cache
+import audio
+from hparams import hparams as hp
+
+KIND = 'wav2lip_mel'
+DEFAULT_CACHE_DIR = os.path.join('cache', 'mel')
+MEL_STEP_SIZE = 16
+
+# hparams that shape audio.melspectrogram()
+_MEL_HPARAMS = ('num_mels', 'n_fft', 'hop_size', 'win_size', 'sample_rate', 'frame_shift_ms', 'use_lws',
+                'preemphasize', 'preemphasis', 'signal_normalization', 'allow_clipping_in_normalization',
+                'symmetric_mels', 'max_abs_value', 'min_level_db', 'ref_level_db', 'fmin', 'fmax')
+
+
+def settings_key():
+    # 'downmix' keeps mels from before audio.load_wav averaged channels out of the way
+    return dict({name: hp.data.get(name) for name in _MEL_HPARAMS}, downmix='mean')
+
+
+def cache_path(cache_dir, audio_sha1):
+    digest = hashlib.sha1(json.dumps(settings_key(), sort_keys=True).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, '{}-{}.mel'.format(audio_sha1, digest[:12]))
+
+
+def compute(path):
+    """(80, T) float32 mel spectrogram of any audio file, decoded straight to 16 kHz."""
+    return audio.melspectrogram(audio.load_wav(path, hp.sample_rate)).astype(np.float32)
+
+
+def load(path, cache_dir=DEFAULT_CACHE_DIR):
+    """Mel spectrogram of the audio file at `path`, from the content-addressed cache when present.
+
+    Files are keyed by the audio's sha1 and the mel hparams, and written under
+    a per-process, per-thread temporary name before being renamed into place,
+    so concurrent jobs on the same audio never see a partial file.
+    """
+    if not cache_dir:
+        return compute(path)
+    mel_path = cache_path(cache_dir, array_cache.file_digest(path))
+    if os.path.isfile(mel_path):
+        mel, meta = array_cache.load(mel_path)
+        if meta.get('kind') == KIND:
+            return mel
+    mel = compute(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    partial_path = '{}.{}-{}.partial'.format(mel_path, os.getpid(), threading.get_ident())
+    array = array_cache.create(partial_path, mel.shape, 'float32', dict(settings_key(), kind=KIND))
+    array[:] = mel
+    array.flush()
+    del array
+    os.replace(partial_path, mel_path)
+    return mel
+
+
+def chunk_starts(mel_len, fps):
+    """First column of every MEL_STEP_SIZE-column chunk, one chunk per output frame at `fps`.
+
+    Chunk i starts at int(i * 80 / fps); the last one is aligned to the end of
+    the spectrogram.
+    """
+    if mel_len < MEL_STEP_SIZE:
+        raise ValueError('Audio is too short: {} mel frames, need at least {}'.format(mel_len, MEL_STEP_SIZE))
+    n = int((mel_len - MEL_STEP_SIZE) * fps / 80.) + 2
+    starts = (np.arange(n) * 80. / fps).astype(np.int64)
+    starts = starts[starts + MEL_STEP_SIZE <= mel_len]
+    return np.append(starts, mel_len - MEL_STEP_SIZE)
+
+
+class MelChunks:
+    """The per-frame (80, 16) mel windows of a spectrogram, without copying.
+
+    All windows are one strided view of the mel (sliding_window_view);
+    indexing picks the window starting at that frame's column, slicing returns
+    the MelChunks of a frame range, and batch() gathers a (B, 80, 16) array.
+    """
+
+    def __init__(self, mel, starts):
+        self.mel = mel
+        self.windows = sliding_window_view(mel, MEL_STEP_SIZE, axis=1)   # (80, T - 15, 16)
+        self.starts = np.asarray(starts)
+
+    @classmethod
+    def from_mel(cls, mel, fps):
+        return cls(mel, chunk_starts(mel.shape[1], fps))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return MelChunks(self.mel, self.starts[i])
+        return self.windows[:, self.starts[i]]
+
+    def batch(self, i, j):
+        return self.windows[:, self.starts[i:j]].transpose(1, 0, 2)
@@ -0,0 +1,196 @@
+import os
+import re
+from collections import namedtuple
+
+import torch
+
+HEADROOM = 0.9              # plan to this fraction of the budget
+PROBE_SIZES = (8, 2)        # batch sizes each stage is measured at
+RESTORER_SHARE = 0.25       # of the network budget, for the restorer when there is one
+MAX_FACE_DET_BATCH = 128
+MAX_DETECT_CHUNK = 2048
+MAX_WAV2LIP_BATCH = 512
+MAX_RESTORER_BATCH = 64
+
+_UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+
+def parse_size(text):
+    """Bytes in '7G', '512M', '1.5g', '64000K' or plain '123456'; None for 'auto'."""
+    if text.lower() == 'auto':
+        return None
+    m = re.fullmatch(r'\s*([0-9.]+)\s*([KMGT]?)i?B?\s*', text, re.IGNORECASE)
+    if not m:
+        raise ValueError('Cannot parse memory size {!r}; use e.g. 7G, 512M or auto'.format(text))
+    return int(float(m.group(1)) * _UNITS[m.group(2).upper()])
+
+
+def _proc_bytes(path, key):
+    with open(path) as f:
+        for line in f:
+            if line.startswith(key + ':'):
+                return int(line.split()[1]) * 1024
+    raise KeyError('{} not in {}'.format(key, path))
+
+
+def resident():
+    return _proc_bytes('/proc/self/status', 'VmRSS')
+
+
+def can_measure(device):
+    """Resident and available memory are read from /proc (Linux) on every device.
+
+    Peak host memory also needs /proc/self/clear_refs; CUDA keeps its own
+    statistics of device memory.
+    """
+    if not (os.path.isfile('/proc/self/status') and os.path.isfile('/proc/meminfo')):
+        return False
+    return device != 'cpu' or os.access('/proc/self/clear_refs', os.W_OK)
+
+
+class PeakMemory:
+    """Context manager: .peak is the most memory the block used above what was in use when it started.
+
+    On the CPU that is the process's peak resident set (VmHWM), which the
+    kernel resets when '5' is written to /proc/self/clear_refs; on CUDA it is
+    torch's max_memory_allocated.
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self.peak = 0
+
+    def __enter__(self):
+        if self.device == 'cpu':
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+            self.start = resident()
+        else:
+            torch.cuda.synchronize()
+            torch.cuda.reset_peak_memory_stats()
+            self.start = torch.cuda.memory_allocated()
+        return self
+
+    def __exit__(self, *exc):
+        if self.device == 'cpu':
+            self.peak = _proc_bytes('/proc/self/status', 'VmHWM') - self.start
+        else:
+            torch.cuda.synchronize()
+            self.peak = torch.cuda.max_memory_allocated() - self.start
+        self.peak = max(self.peak, 0)
+
+
+class StageCost(namedtuple('StageCost', 'fixed per_item')):
+    """Working memory of a stage at batch size n: fixed + n * per_item bytes."""
+
+    def total(self, n):
+        return self.fixed + n * self.per_item
+
+    def batch_size(self, budget, limit):
+        return int(max(1, min(limit, (budget - self.fixed) // self.per_item)))
+
+
+def measure(run, make_batch, device, sizes=PROBE_SIZES):
+    """StageCost of run(make_batch(n)), fitted to its peak memory at two batch sizes.
+
+    The larger probe runs first. Memory the allocator keeps from it can only
+    make the smaller probe look cheaper, which overestimates the per-item cost
+    rather than underestimating it.
+    """
+    peaks = {}
+    for n in sorted(sizes, reverse=True):
+        batch = make_batch(n)
+        with PeakMemory(device) as pm:
+            run(batch)
+        peaks[n] = pm.peak
+        del batch
+    big, small = max(sizes), min(sizes)
+    per_item = max((peaks[big] - peaks[small]) / (big - small), 1)
+    return StageCost(max(peaks[small] - per_item * small, 0), per_item)
+
+
+def _total(text):
+    """(bytes a --memory_budget allows this process, bytes it already uses)."""
+    total = parse_size(text)
+    in_use = resident()
+    available = in_use + _proc_bytes('/proc/meminfo', 'MemAvailable')
+    return (available if total is None else min(total, available)), in_use
+
+
+def split(text, workers):
+    """--memory_budget for each of `workers` processes this one is about to start.
+
+    What the budget leaves beside this process is resolved here, before the
+    workers load anything, and divided evenly between them.
+    """
+    total, in_use = _total(text)
+    return str(max(int(total - in_use), 0) // workers)
+
+
+class Budget:
+    """What a --memory_budget leaves for batches once the models are loaded.
+
+    `host` is process memory (RAM) still unused under the budget, capped by
+    what the system has available. `device` is what the networks may use:
+    the same RAM on the CPU, free GPU memory on CUDA, of which a worker
+    plans for its `share`.
+    """
+
+    def __init__(self, text, device, share=1.0):
+        total, in_use = _total(text)
+        self.total = total
+        self.host = HEADROOM * total - in_use
+        self.shared = device == 'cpu'
+        self.device = self.host if self.shared else HEADROOM * torch.cuda.mem_get_info()[0] * share
+
+
+def plan_detection(budget, cost, frame_bytes, num_frames):
+    """(detector batch size, frames per streaming chunk).
+
+    On the CPU the detector batch gets at most half of the budget; the rest
+    holds the decoded frames of a chunk.
+    """
+    limit = max(1, min(MAX_FACE_DET_BATCH, num_frames))
+    batch = cost.batch_size(budget.device / 2 if budget.shared else budget.device, limit)
+    host = budget.host - (cost.total(batch) if budget.shared else 0)
+    chunk = int(min(host // frame_bytes, MAX_DETECT_CHUNK, num_frames))
+    return batch, max(batch, chunk)
+
+
+def batches_in_flight(pipelined, queue_size, num_stages):
+    """Most Wav2Lip batches alive at once: one per stage thread and queue slot when pipelined."""
+    return num_stages * (queue_size + 1) + 1 if pipelined else 1
+
+
+def plan_render(budget, model_cost, frame_bytes, in_flight, num_frames, restorer_cost=None, restorer_workers=0,
+                restorer_weights=0):
+    """(Wav2Lip batch size, restorer batch size or None).
+
+    frame_bytes is the host memory a batch holds per frame (decoded and
+    output frames); every in-flight batch holds it. The restorer, whose
+    chunks may run in several workers at once, gets RESTORER_SHARE of the
+    network budget and the model the rest. Each restorer worker also loads
+    its own copy of the restorer_weights bytes of weights, which are charged
+    before either is sized.
+    """
+    limit = max(1, min(MAX_WAV2LIP_BATCH, num_frames))
+    restorer_batch, restorer_use = None, 0
+    if restorer_cost is not None:
+        copies = max(1, restorer_workers)
+        restorer_use = restorer_weights * restorer_workers
+        restorer_batch = restorer_cost.batch_size((budget.device - restorer_use) * RESTORER_SHARE / copies,
+                                                  MAX_RESTORER_BATCH)
+        restorer_use += restorer_cost.total(restorer_batch) * copies
+    if budget.shared:
+        cost = StageCost(model_cost.fixed, model_cost.per_item + in_flight * frame_bytes)
+        batch = cost.batch_size(budget.device - restorer_use, limit)
+    else:
+        batch = model_cost.batch_size(budget.device - restorer_use, limit)
+        batch = max(1, min(batch, int(budget.host // (in_flight * frame_bytes))))
+    if restorer_batch is not None:
+        restorer_batch = min(restorer_batch, batch)
+    return batch, restorer_batch
+
+
+def format_bytes(n):
+    return '{:.1f} GB'.format(n / (1 << 30)) if abs(n) >= 1 << 30 else '{:.1f} MB'.format(n / (1 << 20))
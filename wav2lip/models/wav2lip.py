@@ -84,23 +84,19 @@ class Wav2Lip(nn.Module):
             nn.Conv2d(32, 3, kernel_size=1, stride=1, padding=0),
             nn.Sigmoid()) 
 
-    def forward(self, audio_sequences, face_sequences):
-        # audio_sequences = (B, T, 1, 80, 16)
-        B = audio_sequences.size(0)
-
-        input_dim_size = len(face_sequences.size())
-        if input_dim_size > 4:
-            audio_sequences = torch.cat([audio_sequences[:, i] for i in range(audio_sequences.size(1))], dim=0)
-            face_sequences = torch.cat([face_sequences[:, :, i] for i in range(face_sequences.size(2))], dim=0)
-
-        audio_embedding = self.audio_encoder(audio_sequences) # B, 512, 1, 1
-
+    def encode_faces(self, face_sequences):
+        # face_sequences = (B, 6, 96, 96): masked target + reference face.
+        # Returns the skip-connection pyramid, one tensor per encoder block.
         feats = []
         x = face_sequences
         for f in self.face_encoder_blocks:
             x = f(x)
             feats.append(x)
+        return feats
 
+    def decode(self, audio_embedding, face_feats):
+        # audio_embedding = (B, 512, 1, 1), face_feats as returned by encode_faces
+        feats = list(face_feats)
         x = audio_embedding
         for f in self.face_decoder_blocks:
             x = f(x)
@@ -113,7 +109,20 @@ class Wav2Lip(nn.Module):
             
             feats.pop()
 
-        x = self.output_block(x)
+        return self.output_block(x)
+
+    def forward(self, audio_sequences, face_sequences):
+        # audio_sequences = (B, T, 1, 80, 16)
+        B = audio_sequences.size(0)
+
+        input_dim_size = len(face_sequences.size())
+        if input_dim_size > 4:
+            audio_sequences = torch.cat([audio_sequences[:, i] for i in range(audio_sequences.size(1))], dim=0)
+            face_sequences = torch.cat([face_sequences[:, :, i] for i in range(face_sequences.size(2))], dim=0)
+
+        audio_embedding = self.audio_encoder(audio_sequences) # B, 512, 1, 1
+
+        x = self.decode(audio_embedding, self.encode_faces(face_sequences))
 
         if input_dim_size > 4:
             x = torch.split(x, B, dim=0) # [(B, C, H, W)]
@@ -0,0 +1,165 @@
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class StageStats:
+    """Timing and input-queue depth counters for one pipeline stage."""
+
+    def __init__(self, name, queue_size=0):
+        self.name = name
+        self.queue_size = queue_size
+        self.items = 0
+        self.busy = 0.0     # seconds spent doing work
+        self.starved = 0.0  # seconds waiting for input
+        self.blocked = 0.0  # seconds waiting for room downstream
+        self.depth_sum = 0
+        self.depth_max = 0
+
+    def sample_depth(self, depth):
+        self.depth_sum += depth
+        self.depth_max = max(self.depth_max, depth)
+
+    def as_dict(self):
+        return {
+            'items': self.items,
+            'busy_s': round(self.busy, 3),
+            'starved_s': round(self.starved, 3),
+            'blocked_s': round(self.blocked, 3),
+            'queue_size': self.queue_size,
+            'queue_depth_avg': round(self.depth_sum / self.items, 2) if self.items else 0.0,
+            'queue_depth_max': self.depth_max,
+        }
+
+
+def format_stats(stats):
+    lines = []
+    for s in stats:
+        d = s.as_dict()
+        line = '  {:<8} {:>5} items  busy {:>8.2f}s  starved {:>8.2f}s  blocked {:>8.2f}s'.format(
+            s.name, d['items'], d['busy_s'], d['starved_s'], d['blocked_s'])
+        if s.queue_size:
+            line += '  in-queue avg {:.2f}/{} max {}'.format(
+                d['queue_depth_avg'], s.queue_size, d['queue_depth_max'])
+        lines.append(line)
+    slowest = max(stats, key=lambda s: s.busy)
+    lines.append('  bottleneck: {}'.format(slowest.name))
+    return '\n'.join(lines)
+
+
+def run_serial(source, stages):
+    """Run `source` and `stages` one item at a time on the calling thread.
+
+    source is a (name, iterable) pair, stages a list of (name, fn) pairs where
+    each fn takes the previous stage's output. Returns a list of StageStats.
+    """
+    src_name, iterable = source
+    stats = [StageStats(src_name)] + [StageStats(name) for name, _ in stages]
+    it = iter(iterable)
+    while True:
+        t0 = time.perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            break
+        stats[0].busy += time.perf_counter() - t0
+        stats[0].items += 1
+        for (_, fn), st in zip(stages, stats[1:]):
+            t0 = time.perf_counter()
+            item = fn(item)
+            st.busy += time.perf_counter() - t0
+            st.items += 1
+    return stats
+
+
+def run_pipelined(source, stages, queue_size=2):
+    """Run `source` and every stage on its own thread, linked by bounded queues.
+
+    Same contract as run_serial(). Each queue holds at most `queue_size` items
+    so a slow stage applies back-pressure instead of buffering the whole job.
+    The first exception raised by any stage stops the pipeline and is re-raised
+    here.
+    """
+    src_name, iterable = source
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    stats = [StageStats(src_name)] + [StageStats(name, queue_size) for name, _ in stages]
+    stop = threading.Event()
+    errors = []
+
+    def put(q, item, st):
+        t0 = time.perf_counter()
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        st.blocked += time.perf_counter() - t0
+
+    def get(q, st):
+        st.sample_depth(q.qsize())
+        t0 = time.perf_counter()
+        while not stop.is_set():
+            try:
+                item = q.get(timeout=0.1)
+                break
+            except queue.Empty:
+                pass
+        else:
+            item = _DONE
+        st.starved += time.perf_counter() - t0
+        return item
+
+    def produce():
+        st = stats[0]
+        try:
+            it = iter(iterable)
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    break
+                st.busy += time.perf_counter() - t0
+                st.items += 1
+                put(queues[0], item, st)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            put(queues[0], _DONE, st)
+
+    def consume(k):
+        fn, st = stages[k][1], stats[k + 1]
+        out_q = queues[k + 1] if k + 1 < len(queues) else None
+        try:
+            while True:
+                item = get(queues[k], st)
+                if item is _DONE:
+                    break
+                t0 = time.perf_counter()
+                item = fn(item)
+                st.busy += time.perf_counter() - t0
+                st.items += 1
+                if out_q is not None:
+                    put(out_q, item, st)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            if out_q is not None:
+                put(out_q, _DONE, st)
+
+    threads = [threading.Thread(target=produce, name=src_name, daemon=True)]
+    threads += [threading.Thread(target=consume, args=(k,), name=name, daemon=True)
+                for k, (name, _) in enumerate(stages)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if errors:
+        raise errors[0]
+    return stats
@@ -0,0 +1,91 @@
+import contextlib
+import copy
+
+import torch
+
+PRECISIONS = ('fp32', 'bf16', 'int8')
+QUANT_BACKEND = 'x86'
+
+
+def check_device(precision, device):
+    if precision == 'int8' and device != 'cpu':
+        raise ValueError('--precision int8 runs on the CPU only (quantized kernels); use bf16 or fp32 on {}'.format(device))
+
+
+def memory_format(precision):
+    """bf16 convolutions on the CPU are fastest on NHWC (channels_last) tensors."""
+    return torch.channels_last if precision == 'bf16' else torch.contiguous_format
+
+
+def to_precision(model, precision):
+    """Prepare a loaded fp32 Wav2Lip for `precision`. int8 still needs quantize() with calibration data."""
+    if precision == 'bf16':
+        model = model.to(memory_format=torch.channels_last)
+    return model
+
+
+def autocast(precision, device):
+    """Context for running the model: CPU/CUDA autocast to bfloat16 for bf16, nothing otherwise."""
+    if precision == 'bf16':
+        return torch.autocast(device_type=device, dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+def quantizable_blocks(model):
+    """Names of the Wav2Lip submodules that are quantized as separate FX graphs.
+
+    Wav2Lip.forward itself is not traceable (it branches on the input rank),
+    and keeping the block structure means encode_faces()/decode() still work
+    for --face_feats_cache. Tensors between blocks stay float32.
+    """
+    names = ['audio_encoder']
+    names += ['face_encoder_blocks.{}'.format(i) for i in range(len(model.face_encoder_blocks))]
+    names += ['face_decoder_blocks.{}'.format(i) for i in range(len(model.face_decoder_blocks))]
+    return names + ['output_block']
+
+
+def is_quantized(model):
+    return getattr(model, 'precision', 'fp32') == 'int8'
+
+
+def _replace(model, name, module):
+    parent, _, child = name.rpartition('.')
+    setattr(model.get_submodule(parent) if parent else model, child, module)
+
+
+def quantize(model, calibration):
+    """int8 copy of an fp32 Wav2Lip, calibrated on (mel_batch, face_batch) tensors.
+
+    Uses FX graph mode post-training static quantization: Conv+BatchNorm+ReLU
+    are fused, observers record activation ranges while the calibration
+    batches run, and convert_fx swaps in quantized kernels.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    torch.backends.quantized.engine = QUANT_BACKEND
+    qconfig_mapping = get_default_qconfig_mapping(QUANT_BACKEND)
+    model = copy.deepcopy(model).cpu().eval()
+    names = quantizable_blocks(model)
+    calibration = iter(calibration)
+    mel_batch, face_batch = next(calibration)
+
+    # Example inputs for tracing each block, captured from one fp32 pass
+    example_inputs = {}
+    hooks = [model.get_submodule(n).register_forward_pre_hook(
+        lambda module, inputs, n=n: example_inputs.setdefault(n, inputs)) for n in names]
+    with torch.no_grad():
+        model(mel_batch, face_batch)
+    for hook in hooks:
+        hook.remove()
+
+    for n in names:
+        _replace(model, n, prepare_fx(model.get_submodule(n), qconfig_mapping, example_inputs[n]))
+    with torch.no_grad():
+        model(mel_batch, face_batch)
+        for mel_batch, face_batch in calibration:
+            model(mel_batch, face_batch)
+    for n in names:
+        _replace(model, n, convert_fx(model.get_submodule(n)))
+    model.precision = 'int8'
+    return model
@@ -1,15 +1,22 @@
 
 import os
-import gc
 import cv2
 import numpy as np
 from tqdm import tqdm
 import torch
 import face_detection
+import face_tracking
 import argparse
+from types import SimpleNamespace
+
+import array_cache
+import face_boxes
+import memory_plan
 
 # Max width for detection (480p is plenty for bounding boxes, saves ~5x RAM)
 DETECT_MAX_WIDTH = 640
+# Frames read per chunk when keyframe tracking (boxes are interpolated within a chunk)
+TRACK_CHUNK = 64
 
 def get_smoothened_boxes(boxes, T):
     for i in range(len(boxes)):
@@ -20,13 +27,31 @@ def get_smoothened_boxes(boxes, T):
         boxes[i] = np.mean(window, axis=0)
     return boxes
 
-def precompute_face_boxes(video_path, output_path, batch_size=2, nosmooth=False):
+def precompute_face_boxes(video_path, output_path, batch_size=2, nosmooth=False,
+                          face_det_stride=1, face_det_motion=8.0, face_det_iou=0.7,
+                          face_det_min_size=None, face_det_max_size=None, face_detector='sfd',
+                          cache_dir=face_boxes.DEFAULT_CACHE_DIR, memory_budget=None):
     device = 'cpu'
     print(f'Starting face pre-computation on {device} (Low-RAM Mode)...')
     
     # Initialize detector
     detector = face_detection.FaceAlignment(face_detection.LandmarksType._2D, 
-                                            flip_input=False, device=device)
+                                            flip_input=False, device=device, face_detector=face_detector,
+                                            face_detector_kwargs={'min_face_size': face_det_min_size,
+                                                                  'max_face_size': face_det_max_size})
+
+    # Detect only keyframes and interpolate the rest (see face_tracking.py)
+    tracker = None
+    read_size = batch_size
+    if face_det_stride > 1:
+        def detect(frames):
+            preds = []
+            for i in range(0, len(frames), batch_size):
+                preds.extend(detector.get_detections_for_batch(np.array(frames[i:i + batch_size])))
+            return preds
+        tracker = face_tracking.KeyframeTracker(detect, stride=face_det_stride,
+                                                motion_threshold=face_det_motion, iou_threshold=face_det_iou)
+        read_size = max(batch_size, TRACK_CHUNK)
     
     # Load video
     video_stream = cv2.VideoCapture(video_path)
@@ -35,6 +60,7 @@ def precompute_face_boxes(video_path, output_path, batch_size=2, nosmooth=False)
         return
 
     total_frames = int(video_stream.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = video_stream.get(cv2.CAP_PROP_FPS)
     orig_w = int(video_stream.get(cv2.CAP_PROP_FRAME_WIDTH))
     orig_h = int(video_stream.get(cv2.CAP_PROP_FRAME_HEIGHT))
     
@@ -48,6 +74,20 @@ def precompute_face_boxes(video_path, output_path, batch_size=2, nosmooth=False)
         det_w = orig_w
         det_h = orig_h
 
+    if memory_budget and memory_plan.can_measure(device):
+        # Size the batch (and keyframe-tracking chunk) by probing the detector on the first frame
+        ok, frame = video_stream.read()
+        video_stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        if ok:
+            frame = cv2.cvtColor(cv2.resize(frame, (det_w, det_h)) if scale < 1.0 else frame, cv2.COLOR_BGR2RGB)
+            budget = memory_plan.Budget(memory_budget, device)
+            cost = memory_plan.measure(lambda frames: detector.get_detections_for_batch(np.array(frames)),
+                                       lambda n: [frame] * n, device)
+            batch_size, chunk = memory_plan.plan_detection(budget, cost, frame.nbytes, total_frames)
+            read_size = batch_size if tracker is None else max(chunk, TRACK_CHUNK)
+            print(f'🧮 Memory plan: batch {batch_size} ({memory_plan.format_bytes(cost.per_item)}/image) within '
+                  f'{memory_plan.format_bytes(budget.total)}')
+
     print(f'Total frames: {total_frames} | Original: {orig_w}x{orig_h} | Detection: {det_w}x{det_h} | Batch: {batch_size}')
     
     predictions = []
@@ -55,7 +95,7 @@ def precompute_face_boxes(video_path, output_path, batch_size=2, nosmooth=False)
     
     while True:
         batch_frames = []
-        for _ in range(batch_size):
+        for _ in range(read_size):
             still_reading, frame = video_stream.read()
             if not still_reading:
                 break
@@ -71,7 +111,10 @@ def precompute_face_boxes(video_path, output_path, batch_size=2, nosmooth=False)
         # Process batch
         try:
             batch_np = np.array(batch_frames)
-            preds = detector.get_detections_for_batch(batch_np)
+            if tracker is not None:
+                preds = tracker.track(batch_frames)
+            else:
+                preds = detector.get_detections_for_batch(batch_np)
             predictions.extend(preds)
             pbar.update(len(batch_frames))
         except Exception as e:
@@ -80,10 +123,11 @@ def precompute_face_boxes(video_path, output_path, batch_size=2, nosmooth=False)
         
         # Free batch memory immediately
         del batch_frames, batch_np
-        gc.collect()
 
     pbar.close()
     video_stream.release()
+    if tracker is not None:
+        print(f'Face detection ran on {tracker.detected}/{tracker.frames} frames (keyframe tracking)')
     
     # Convert predictions to box coordinates and scale back to original resolution
     boxes = []
@@ -109,6 +153,7 @@ def precompute_face_boxes(video_path, output_path, batch_size=2, nosmooth=False)
         pad = np.tile(last, (total_frames - len(boxes), 1))
         boxes = np.vstack([boxes, pad])
 
+    raw_boxes = boxes.copy()
     if not nosmooth:
         print("Applying temporal smoothing...")
         boxes = get_smoothened_boxes(boxes, T=5)
@@ -116,12 +161,44 @@ def precompute_face_boxes(video_path, output_path, batch_size=2, nosmooth=False)
     np.save(output_path, boxes)
     print(f'✅ CACHE EXPORT SUCCESSFUL: {len(boxes)} frames saved to {output_path}')
 
+    # Also file the boxes under the video's content hash so inference.py finds them by itself.
+    # They are raw (unpadded, unsmoothed) source-resolution boxes; inference applies its own
+    # --pads and smoothing when it loads them.
+    if cache_dir:
+        settings = SimpleNamespace(resize_factor=1, rotate=False, crop=[0, -1, 0, -1])
+        video_sha1 = array_cache.file_digest(video_path)
+        path = face_boxes.cache_path(cache_dir, video_sha1, settings)
+        face_boxes.save(path, raw_boxes, video_sha1, settings, fps, total_frames, (orig_w, orig_h),
+                        detector=face_detector)
+        print(f'✅ Face boxes cached as {path}')
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--video', type=str, required=True, help='Path to Base-vedio.mp4')
     parser.add_argument('--output', type=str, default='Base-vedio.npy', help='Output cache path')
     parser.add_argument('--batch_size', type=int, default=2, help='Batch size for detection')
     parser.add_argument('--nosmooth', action='store_true', help='Disable smoothing')
+    parser.add_argument('--face_detector', type=str, default='sfd', choices=face_detection.FACE_DETECTORS,
+                        help='sfd: S3FD (accurate). haar: opencv cascade (fast, close-up frontal faces)')
+    parser.add_argument('--face_det_stride', type=int, default=1,
+                        help='Detect only every N frames and interpolate boxes in between')
+    parser.add_argument('--face_det_motion', type=float, default=8.0,
+                        help='Mean grey-level change since the last keyframe that forces a new detection')
+    parser.add_argument('--face_det_iou', type=float, default=0.7,
+                        help='Keyframe boxes overlapping less than this are re-detected frame by frame')
+    parser.add_argument('--face_det_min_size', type=int, default=None,
+                        help='Smallest face (px, at detection resolution) to look for; skips fine S3FD levels')
+    parser.add_argument('--face_det_max_size', type=int, default=None,
+                        help='Largest face (px, at detection resolution) to look for; skips coarse S3FD levels')
+    parser.add_argument('--cache_dir', type=str, default=face_boxes.DEFAULT_CACHE_DIR,
+                        help='Face-box cache directory read by inference.py --face_box_cache ("" to skip)')
+    parser.add_argument('--memory_budget', type=str, default=None,
+                        help='Process memory to plan for (e.g. 7G or auto); replaces --batch_size with the '
+                        'largest detection batch that fits')
     args = parser.parse_args()
     
-    precompute_face_boxes(args.video, args.output, batch_size=args.batch_size, nosmooth=args.nosmooth)
+    precompute_face_boxes(args.video, args.output, batch_size=args.batch_size, nosmooth=args.nosmooth,
+                          face_det_stride=args.face_det_stride, face_det_motion=args.face_det_motion,
+                          face_det_iou=args.face_det_iou, face_det_min_size=args.face_det_min_size,
+                          face_det_max_size=args.face_det_max_size, face_detector=args.face_detector,
+                          cache_dir=args.cache_dir, memory_budget=args.memory_budget)
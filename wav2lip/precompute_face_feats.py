@@ -0,0 +1,89 @@
+import os
+import argparse
+
+import cv2
+import numpy as np
+import torch
+from tqdm import tqdm
+
+import array_cache
+import checkpoints
+import face_boxes
+import face_feats
+import inference
+
+
+def precompute_face_feats(args, output_path, batch_size=64, dtype='float16'):
+    """Run the Wav2Lip face encoder once over every frame of args.face.
+
+    The masked+reference face input never changes for a fixed base video, so
+    its skip-connection pyramid is stored per frame in a memory-mapped cache
+    that inference.py --face_feats_cache reads instead of re-encoding. At
+    img_size 96 that is about 0.58 MB per frame in float16 (1.16 MB in
+    float32), i.e. about 0.9 GB per minute of 25 fps base video.
+    """
+    if not args.face_det_results and args.box[0] == -1:
+        raise ValueError('Pass --face_det_results or --box so the face crops match inference')
+
+    model = inference.load_model(args.checkpoint_path)
+    video_sha1 = array_cache.file_digest(args.face)
+    cached_boxes = None
+    if args.face_det_results:
+        cached_boxes = inference.load_face_det_results(args.face_det_results, args, video_sha1,
+                                                       face_boxes.source_size(args.face))
+    shapes = face_feats.feature_shapes(model, args.img_size)
+    sizes = [int(np.prod(s)) for s in shapes]
+
+    video_stream = cv2.VideoCapture(args.face)
+    if not video_stream.isOpened():
+        raise ValueError('Could not open video {}'.format(args.face))
+    num_frames = int(video_stream.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    meta = face_feats.cache_key(args, video_sha1, checkpoints.source_digest(args.checkpoint_path), cached_boxes)
+    meta.update(num_frames=num_frames, feat_shapes=[list(s) for s in shapes])
+    partial_path = output_path + '.partial'
+    cache = array_cache.create(partial_path, (num_frames, sum(sizes)), dtype, meta)
+    print('Encoding {} frames -> {} ({:.1f} MB/frame)'.format(
+        num_frames, output_path, sum(sizes) * np.dtype(dtype).itemsize / 1e6))
+
+    for start in tqdm(range(0, num_frames, batch_size)):
+        faces = np.empty((min(batch_size, num_frames - start), args.img_size, args.img_size, 3), np.uint8)
+        for k in range(len(faces)):
+            ret, f = video_stream.read()
+            if not ret:
+                raise ValueError('Video ended at frame {} but reports {} frames'.format(start + k, num_frames))
+            f = inference.transform_frame(f, args)
+            y1, y2, x1, x2 = inference.get_face_coords(start + k, f, args, cached_boxes)
+            cv2.resize(f[y1:y2, x1:x2], (args.img_size, args.img_size), dst=faces[k])
+
+        with torch.no_grad():
+            feats = model.encode_faces(inference.face_batch_tensor(faces, args))
+        flat = torch.cat([f.reshape(len(faces), -1) for f in feats], dim=1)
+        cache[start:start + len(faces)] = flat.cpu().numpy().astype(dtype)
+
+    video_stream.release()
+    cache.flush()
+    del cache
+    os.replace(partial_path, output_path)
+    print(f'✅ FACE FEATURE CACHE EXPORT SUCCESSFUL: {num_frames} frames saved to {output_path}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--checkpoint_path', type=str, required=True, help='Wav2Lip checkpoint used at inference')
+    parser.add_argument('--video', type=str, required=True, help='Path to Base-vedio.mp4')
+    parser.add_argument('--output', type=str, default='Base-vedio.feats', help='Output cache path')
+    parser.add_argument('--face_det_results', type=str, default=None, help='Face boxes from precompute_face.py')
+    parser.add_argument('--box', nargs='+', type=int, default=[-1, -1, -1, -1], help='Constant box (top, bottom, left, right)')
+    parser.add_argument('--resize_factor', default=1, type=int)
+    parser.add_argument('--crop', nargs='+', type=int, default=[0, -1, 0, -1])
+    parser.add_argument('--rotate', default=False, action='store_true')
+    parser.add_argument('--batch_size', type=int, default=64, help='Frames per encoder batch')
+    parser.add_argument('--dtype', type=str, default='float16', choices=['float32', 'float16'],
+                        help='Storage precision; float32 doubles the file size (about 1.16 MB per frame)')
+    cli = parser.parse_args()
+
+    args = inference.make_args(cli.checkpoint_path, cli.video, '',
+                               face_det_results=cli.face_det_results, box=cli.box,
+                               resize_factor=cli.resize_factor, crop=cli.crop, rotate=cli.rotate)
+    precompute_face_feats(args, cli.output, batch_size=cli.batch_size, dtype=cli.dtype)
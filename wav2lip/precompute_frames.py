@@ -0,0 +1,101 @@
+import os
+import argparse
+
+import cv2
+from tqdm import tqdm
+
+import array_cache
+import face_boxes
+import frame_store
+import inference
+import restoration
+
+
+def precompute_frames(args, output_path, restorer=None):
+    """Decode args.face once, apply resize/rotate/crop and store the frames.
+
+    The result is a FrameStore that inference.py --frame_store reads instead
+    of decoding the base video on every job. With a GFPGAN `restorer` every
+    frame is restored first, producing the --restored_frames store; in
+    --restore_mode crop only the face box from --face_det_results/--box is.
+    """
+    video_sha1 = array_cache.file_digest(args.face)
+    cached_boxes = None
+    if restorer is not None and args.restore_mode == 'crop':
+        if not args.face_det_results and args.box[0] == -1:
+            raise ValueError('--restore_mode crop needs --face_det_results or --box')
+        if args.face_det_results:
+            cached_boxes = inference.load_face_det_results(args.face_det_results, args, video_sha1,
+                                                           face_boxes.source_size(args.face))
+
+    video_stream = cv2.VideoCapture(args.face)
+    if not video_stream.isOpened():
+        raise ValueError('Could not open video {}'.format(args.face))
+    fps = video_stream.get(cv2.CAP_PROP_FPS)
+    num_frames = int(video_stream.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    ret, first_frame = video_stream.read()
+    if not ret:
+        raise ValueError('Could not read first frame of {}'.format(args.face))
+    video_stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    frame_h, frame_w = inference.transform_frame(first_frame, args).shape[:2]
+
+    meta = frame_store.store_key(args, video_sha1)
+    meta.update(fps=fps, num_frames=num_frames)
+    if restorer is not None:
+        meta['restorer'] = frame_store.restorer_key(args)
+    partial_path = output_path + '.partial'
+    store = array_cache.create(partial_path, (num_frames, frame_h, frame_w, 3), 'uint8', meta)
+    print('Storing {} frames of {}x{} -> {} ({:.1f} MB)'.format(
+        num_frames, frame_w, frame_h, output_path, store.nbytes / 1e6))
+
+    for idx in tqdm(range(num_frames)):
+        ret, f = video_stream.read()
+        if not ret:
+            raise ValueError('Video ended at frame {} but reports {} frames'.format(idx, num_frames))
+        f = inference.transform_frame(f, args)
+        if restorer is not None and args.restore_mode == 'crop':
+            coords = inference.get_face_coords(idx, f, args, cached_boxes)
+            f = restoration.restore_crops(restorer, [f], [coords], args.restore_weight)[0]
+        elif restorer is not None:
+            _, _, restored = restorer.enhance(f, has_aligned=False, only_center_face=False,
+                                              paste_back=True, weight=args.restore_weight)
+            if restored is not None:
+                f = restored
+        store[idx] = f
+
+    video_stream.release()
+    store.flush()
+    del store
+    os.replace(partial_path, output_path)
+    print(f'✅ FRAME STORE EXPORT SUCCESSFUL: {num_frames} frames saved to {output_path}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--video', type=str, required=True, help='Path to Base-vedio.mp4')
+    parser.add_argument('--output', type=str, default='Base-vedio.frames', help='Output frame store path')
+    parser.add_argument('--resize_factor', default=1, type=int)
+    parser.add_argument('--crop', nargs='+', type=int, default=[0, -1, 0, -1])
+    parser.add_argument('--rotate', default=False, action='store_true')
+    parser.add_argument('--restorer_path', type=str, default=None,
+                        help='GFPGAN weights; if set, store GFPGAN-restored frames for --restored_frames')
+    parser.add_argument('--restore_weight', type=float, default=0.5, help='GFPGAN blend weight')
+    parser.add_argument('--restore_mode', type=str, default='full', choices=['full', 'crop'],
+                        help='As inference.py --restore_mode; jobs must use the same mode')
+    parser.add_argument('--face_det_results', type=str, default=None,
+                        help='Face boxes for --restore_mode crop (precompute_face.py output or a face-box cache)')
+    parser.add_argument('--box', nargs='+', type=int, default=[-1, -1, -1, -1],
+                        help='Constant box (top, bottom, left, right) for --restore_mode crop')
+    cli = parser.parse_args()
+
+    args = inference.make_args('', cli.video, '', resize_factor=cli.resize_factor,
+                               crop=cli.crop, rotate=cli.rotate, restorer='gfpgan',
+                               restorer_path=cli.restorer_path, restore_weight=cli.restore_weight,
+                               restore_mode=cli.restore_mode, face_det_results=cli.face_det_results, box=cli.box)
+    restorer = None
+    if cli.restorer_path:
+        restorer = inference.load_restorer(args)
+        if restorer is None:
+            raise SystemExit('Could not load GFPGAN from {}'.format(cli.restorer_path))
+    precompute_frames(args, cli.output, restorer=restorer)
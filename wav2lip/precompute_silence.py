@@ -0,0 +1,97 @@
+import os
+import argparse
+
+import cv2
+from tqdm import tqdm
+
+import array_cache
+import face_boxes
+import frame_store
+import inference
+import restoration
+import silence
+
+
+def precompute_silence(args, output_path):
+    """Render every frame of args.face with a closed mouth (the mel of digital silence).
+
+    The result is a FrameStore that inference.py --skip_silence
+    --silence_frames shows for silent stretches of the audio, so pauses get
+    the same mouth and restoration look as speech without running the model
+    or restorer per job.
+    """
+    if not args.face_det_results and args.box[0] == -1:
+        raise ValueError('Pass --face_det_results or --box so the face crops match inference')
+
+    models = inference.load_models(args, detector=False)
+    video_sha1 = array_cache.file_digest(args.face)
+    src_size = face_boxes.source_size(args.face)
+    full_frames, video_stream, fps, num_frames = inference.open_frames(args, video_sha1)
+    cached_boxes = inference.find_cached_boxes(args, video_sha1, src_size, num_frames)
+
+    if full_frames is None:
+        ret, first_frame = video_stream.read()
+        if not ret:
+            raise ValueError('Could not read first frame of {}'.format(args.face))
+        video_stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        first_frame = inference.transform_frame(first_frame, args)
+    else:
+        first_frame = full_frames[0]
+    frame_h, frame_w = first_frame.shape[:2]
+
+    meta = frame_store.store_key(args, video_sha1)
+    meta.update(fps=fps, num_frames=num_frames, silence=silence.store_key(args))
+    partial_path = output_path + '.partial'
+    store = array_cache.create(partial_path, (num_frames, frame_h, frame_w, 3), 'uint8', meta)
+    print('Rendering {} closed-mouth frames of {}x{} -> {} ({:.1f} MB)'.format(
+        num_frames, frame_w, frame_h, output_path, store.nbytes / 1e6))
+
+    restore_pool = models['restore_pool']
+    if restore_pool is None:
+        restore_pool = restoration.RestorePool(models['restorer'], batch_size=args.restorer_batch_size)
+    mel_chunks = [silence.silent_mel_chunk()] * num_frames
+    batches = inference.iter_batches(args, video_stream, full_frames, mel_chunks, cached_boxes)
+    try:
+        for batch in tqdm(batches, total=(num_frames + args.wav2lip_batch_size - 1) // args.wav2lip_batch_size):
+            batch = inference.paste_predictions(inference.run_model(models['model'], batch, args), restore_pool)
+            if restore_pool.restoring:
+                batch = inference.restore_faces(batch, restore_pool, args)
+            for j, f in zip(batch['positions'], batch['out']):
+                store[j] = f
+    finally:
+        inference.close_models(models)
+
+    if video_stream is not None:
+        video_stream.release()
+    store.flush()
+    del store
+    os.replace(partial_path, output_path)
+    print(f'✅ SILENCE FRAME EXPORT SUCCESSFUL: {num_frames} frames saved to {output_path}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--checkpoint_path', type=str, required=True, help='Wav2Lip checkpoint used at inference')
+    parser.add_argument('--video', type=str, required=True, help='Path to Base-vedio.mp4')
+    parser.add_argument('--output', type=str, default='Base-vedio.silence', help='Output frame store path')
+    parser.add_argument('--face_det_results', type=str, default=None, help='Face boxes from precompute_face.py')
+    parser.add_argument('--box', nargs='+', type=int, default=[-1, -1, -1, -1], help='Constant box (top, bottom, left, right)')
+    parser.add_argument('--pads', nargs='+', type=int, default=[0, 10, 0, 0])
+    parser.add_argument('--nosmooth', default=False, action='store_true')
+    parser.add_argument('--resize_factor', default=1, type=int)
+    parser.add_argument('--crop', nargs='+', type=int, default=[0, -1, 0, -1])
+    parser.add_argument('--rotate', default=False, action='store_true')
+    parser.add_argument('--restorer_path', type=str, default=None,
+                        help='GFPGAN weights; if set, restore the closed-mouth frames like inference does')
+    parser.add_argument('--restore_mode', type=str, default='full', choices=['full', 'crop'])
+    parser.add_argument('--restore_weight', type=float, default=0.5, help='GFPGAN blend weight')
+    parser.add_argument('--batch_size', type=int, default=64, help='Frames per Wav2Lip batch')
+    cli = parser.parse_args()
+
+    args = inference.make_args(cli.checkpoint_path, cli.video, '',
+                               face_det_results=cli.face_det_results, box=cli.box, pads=cli.pads,
+                               nosmooth=cli.nosmooth, resize_factor=cli.resize_factor, crop=cli.crop,
+                               rotate=cli.rotate, restorer='gfpgan' if cli.restorer_path else None,
+                               restorer_path=cli.restorer_path, restore_mode=cli.restore_mode,
+                               restore_weight=cli.restore_weight, wav2lip_batch_size=cli.batch_size)
+    precompute_silence(args, cli.output)
@@ -0,0 +1,352 @@
+import os
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+import torch
+
+import memory_plan
+
+# GFPGAN Integration & Compatibility Patch
+try:
+    import torchvision.transforms.functional as F
+    import torchvision.transforms as T
+
+    # Monkey-patch for basicsr (dependency of GFPGAN) which fails on newer torchvision
+    if not hasattr(T, 'functional_tensor'):
+        # Create a virtual module if it's missing
+        from types import ModuleType
+        mock_module = ModuleType('torchvision.transforms.functional_tensor')
+        # Copy all functions from functional to the mock module
+        for attr in dir(F):
+            if not attr.startswith('__'):
+                setattr(mock_module, attr, getattr(F, attr))
+        sys.modules['torchvision.transforms.functional_tensor'] = mock_module
+        T.functional_tensor = mock_module
+        print("🔧 Applied torchvision.transforms.functional_tensor monkey-patch for GFPGAN.")
+
+    import basicsr
+    from gfpgan import GFPGANer
+    HAS_GFPGAN = True
+except ImportError as e:
+    print(f"⚠️ GFPGAN Import Warning: {e}")
+    HAS_GFPGAN = False
+except Exception as e:
+    print(f"⚠️ GFPGAN Initialization Warning: {e}")
+    HAS_GFPGAN = False
+
+# GFPGAN works on 512x512 faces aligned to the FFHQ template, where the face
+# box (brow to chin) spans a bit over half the crop and sits slightly low.
+GFPGAN_SIZE = 512
+CROP_SCALE = 1.8      # crop side relative to the face box height
+CROP_SHIFT_Y = -0.1   # crop centre offset relative to the face box height
+FEATHER = 0.1         # blend ramp width relative to the face box size
+WORKER_SCALE = 1.5    # side of the crop sent to a restorer worker relative to face_region's
+
+
+def can_load(restorer_path):
+    """Whether GFPGAN is installed and its weights exist; prints why not."""
+    if not HAS_GFPGAN:
+        print("❌ Error: gfpgan package not installed. Skipping restoration.")
+        return False
+    if not restorer_path or not os.path.exists(restorer_path):
+        print(f"❌ Error: Restorer path {restorer_path} not found. Skipping restoration.")
+        return False
+    return True
+
+
+def load_restorer(restorer_path, device):
+    if not can_load(restorer_path):
+        return None
+    print(f"✨ Initializing GFPGAN Restorer with weights: {restorer_path}")
+    return GFPGANer(
+        model_path=restorer_path,
+        upscale=1,
+        arch='clean',
+        channel_multiplier=2,
+        device=device
+    )
+
+
+def weights_bytes(restorer):
+    """Memory a loaded GFPGANer holds in weights: GFPGAN and its face helper's detection and parsing nets."""
+    modules = [restorer.gfpgan]
+    helper = getattr(restorer, 'face_helper', None)
+    if helper is not None:
+        modules += [m for m in vars(helper).values() if isinstance(m, torch.nn.Module)]
+    tensors = [t for m in modules for t in list(m.parameters()) + list(m.buffers())]
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def face_region(coords):
+    """Square GFPGAN input region (y1, y2, x1, x2) around a face box; may leave the frame.
+
+    This is a heuristic stand-in for FFHQ alignment: the square is scaled and
+    shifted from the box alone, with no landmarks, so tilted or turned faces
+    reach GFPGAN unrotated and restore less well than in mode 'full'.
+    """
+    y1, y2, x1, x2 = coords
+    side = int(round(max(y2 - y1, x2 - x1) * CROP_SCALE))
+    cy = (y1 + y2) / 2. + CROP_SHIFT_Y * (y2 - y1)
+    cx = (x1 + x2) / 2.
+    # Round half up, so a box moved by whole pixels moves its region by exactly as much
+    ry1, rx1 = int(np.floor(cy - side / 2. + 0.5)), int(np.floor(cx - side / 2. + 0.5))
+    return ry1, ry1 + side, rx1, rx1 + side
+
+
+def worker_region(coords, shape):
+    """Part of a frame of `shape` that a restorer worker gets for a face box instead of the whole frame.
+
+    It is face_region with a margin, clipped to the frame, so crop mode sees
+    (and edge-pads) exactly the pixels it would in the frame and
+    GFPGANer.enhance (mode 'full') still finds and aligns the face.
+    """
+    ry1, ry2, rx1, rx2 = face_region(coords)
+    margin = int(round((ry2 - ry1) * (WORKER_SCALE - 1) / 2))
+    h, w = shape[:2]
+    return max(ry1 - margin, 0), min(ry2 + margin, h), max(rx1 - margin, 0), min(rx2 + margin, w)
+
+
+def to_region(coords, region):
+    """Box (y1, y2, x1, x2) in frame pixels moved into the pixels of the frame's `region`."""
+    y1, y2, x1, x2 = coords
+    ry1, _, rx1, _ = region
+    return y1 - ry1, y2 - ry1, x1 - rx1, x2 - rx1
+
+
+def crop_padded(frame, region):
+    """frame[region], edge-padded where the region extends past the frame."""
+    ry1, ry2, rx1, rx2 = region
+    h, w = frame.shape[:2]
+    crop = frame[max(ry1, 0):min(ry2, h), max(rx1, 0):min(rx2, w)]
+    pad = ((max(-ry1, 0), max(ry2 - h, 0)), (max(-rx1, 0), max(rx2 - w, 0)), (0, 0))
+    if any(p for axis in pad for p in axis):
+        crop = np.pad(crop, pad, mode='edge')
+    return crop
+
+
+def feather_mask(shape, box, feather):
+    """Float mask of `shape` that is 1 inside `box` (y1, y2, x1, x2) and ramps to 0 at its edges."""
+    y1, y2, x1, x2 = box
+    mask = np.zeros(shape, np.float32)
+    ramp = max(1, int(feather))
+    mask[y1 + ramp:y2 - ramp, x1 + ramp:x2 - ramp] = 1.
+    k = 2 * ramp + 1
+    return cv2.GaussianBlur(mask, (k, k), 0)
+
+
+def run_gfpgan(restorer, faces, weight=0.5):
+    """Run the GFPGAN network alone on a list of BGR 512x512 uint8 faces."""
+    t = torch.from_numpy(np.ascontiguousarray(np.stack(faces)[..., ::-1]))
+    t = t.permute(0, 3, 1, 2).float().div_(255.).sub_(0.5).div_(0.5).to(restorer.device)
+    with torch.no_grad():
+        out = restorer.gfpgan(t, return_rgb=False, weight=weight)[0]
+    out = out.clamp_(-1, 1).add_(1).div_(2).mul_(255.).round_().byte()
+    return np.ascontiguousarray(out.permute(0, 2, 3, 1).cpu().numpy()[..., ::-1])
+
+
+def restore_crops(restorer, frames, coords, weight=0.5, blend_box=None, targets=None):
+    """Restore the known face region of each frame in place, skipping GFPGAN's detector.
+
+    Each face box is expanded to a square by face_region (no landmark
+    alignment), resized to 512, run through the network in one batch and
+    blended back with a feathered mask. blend_box, if given, maps a face box
+    to the sub-box that should be blended (e.g. just the mouth); by default
+    the whole face box is. targets, if given, receive the blend instead of
+    frames and are returned.
+    """
+    regions = [face_region(c) for c in coords]
+    faces = [cv2.resize(crop_padded(f, r), (GFPGAN_SIZE, GFPGAN_SIZE), interpolation=cv2.INTER_AREA)
+             for f, r in zip(frames, regions)]
+    restored = run_gfpgan(restorer, faces, weight)
+
+    targets = frames if targets is None else targets
+    for f, c, r, face in zip(targets, coords, regions, restored):
+        ry1, ry2, rx1, rx2 = r
+        side = ry2 - ry1
+        face = cv2.resize(face, (side, side), interpolation=cv2.INTER_LINEAR)
+
+        y1, y2, x1, x2 = blend_box(c) if blend_box is not None else c
+        feather = FEATHER * min(y2 - y1, x2 - x1)
+        mask = feather_mask((side, side), (y1 - ry1, y2 - ry1, x1 - rx1, x2 - rx1), feather)
+
+        # Only the part of the region that lies inside the frame is written back
+        h, w = f.shape[:2]
+        fy1, fy2, fx1, fx2 = max(ry1, 0), min(ry2, h), max(rx1, 0), min(rx2, w)
+        sub = (slice(fy1 - ry1, fy2 - ry1), slice(fx1 - rx1, fx2 - rx1))
+        m = mask[sub][..., None]
+        dst = f[fy1:fy2, fx1:fx2]
+        dst[:] = np.rint(face[sub] * m + dst * (1. - m)).astype(np.uint8)
+    return targets
+
+
+def mouth_box(coords):
+    """Lower half of a face box: the only part Wav2Lip regenerates."""
+    y1, y2, x1, x2 = coords
+    return (y1 + (y2 - y1) // 2, y2, x1, x2)
+
+
+def paste(frames, patches, coords, box=None):
+    """Hard-paste each BGR patch into its frame, optionally only the part inside box(coords)."""
+    for f, p, c in zip(frames, patches, coords):
+        y1, y2, x1, x2 = c
+        by1, by2, bx1, bx2 = box(c) if box is not None else c
+        f[by1:by2, bx1:bx2] = p[by1 - y1:by2 - y1, bx1 - x1:bx2 - x1]
+    return frames
+
+
+def paste_batch(frames, patches, coords, restoring=True, mouth_only=False):
+    """Paste stage: (frames to restore, frames that receive the restored faces).
+
+    The patches are hard-pasted into frames and both lists are the same. With
+    mouth_only the frames are pre-restored base frames from
+    precompute_frames.py --restorer_path: when restoring, the patches go into
+    scratch copies and the frames later receive only the restored lower
+    halves; otherwise only the mouth is pasted, so the upper face keeps its
+    offline restoration.
+    """
+    if mouth_only and restoring:
+        return paste([f.copy() for f in frames], patches, coords), frames
+    pasted = paste(frames, patches, coords, box=mouth_box if mouth_only else None)
+    return pasted, pasted
+
+
+def restore_pasted(restorer, pasted, targets, coords, mode='full', weight=0.5, mouth_only=False):
+    """Restore stage: restore the faces of paste_batch() output; returns the output frames.
+
+    mode 'crop' pushes every face through the GFPGAN network in one batch;
+    mode 'full' runs GFPGANer.enhance per frame. With mouth_only the face is
+    restored from the scratch copy and only its lower half is feather-blended
+    into targets. If restoration fails the pasted frames are returned as is.
+    """
+    if mouth_only or mode == 'crop':
+        try:
+            return restore_crops(restorer, pasted, coords, weight,
+                                 blend_box=mouth_box if mouth_only else None, targets=targets)
+        except Exception as e:
+            print(f"⚠️ Restoration failed for a batch: {e}. Falling back to standard sync.")
+            return pasted
+    return [restore_frame(restorer, f, weight) for f in pasted]
+
+
+def restore_batch(restorer, frames, patches, coords, mode='full', weight=0.5, mouth_only=False):
+    """paste_batch() then restore_pasted(); without a restorer the patches are only pasted."""
+    pasted, targets = paste_batch(frames, patches, coords, restorer is not None, mouth_only)
+    if restorer is None:
+        return pasted
+    return restore_pasted(restorer, pasted, targets, coords, mode, weight, mouth_only)
+
+
+def restore_frame(restorer, f, weight=0.5):
+    """Restore a frame that already holds the Wav2Lip patch with GFPGANer.enhance.
+
+    GFPGAN runs on the whole frame with its own face detection and landmark
+    alignment. Returns f unchanged if restoration fails.
+    """
+    try:
+        # Enhance with GFPGAN (this creates a seamless face)
+        _, _, restored_img = restorer.enhance(f, has_aligned=False, only_center_face=False,
+                                              paste_back=True, weight=weight)
+        if restored_img is not None:
+            return restored_img
+    except Exception as e:
+        print(f"⚠️ Restoration failed for a frame: {e}. Falling back to standard sync.")
+    return f
+
+
+_worker_restorer = None
+
+
+def _init_worker(restorer_path, device, threads):
+    global _worker_restorer
+    torch.set_num_threads(threads)
+    _worker_restorer = load_restorer(restorer_path, device)
+
+
+def _restore_in_worker(pasted, targets, coords, mode, weight, mouth_only):
+    return restore_pasted(_worker_restorer, pasted, pasted if targets is None else targets, coords,
+                          mode, weight, mouth_only)
+
+
+def _measure_in_worker(crop, patch, coords, mode, weight, mouth_only, device):
+    return measure(_worker_restorer, crop, patch, coords, mode, weight, mouth_only, device)
+
+
+def measure(restorer, frame, patch, coords, mode, weight, mouth_only, device):
+    """(memory_plan.StageCost of restore_batch on copies of frame, bytes of the restorer's weights)."""
+    cost = memory_plan.measure(
+        lambda b: restore_batch(restorer, b, [patch] * len(b), [coords] * len(b), mode, weight, mouth_only),
+        lambda n: [frame.copy() for _ in range(n)], device)
+    return cost, weights_bytes(restorer)
+
+
+class RestorePool:
+    """Restoration stage that splits each Wav2Lip batch into GFPGAN batches.
+
+    With workers=0 the chunks run one after another on `restorer` in the
+    calling process. Otherwise every chunk is submitted to a pool of spawned
+    processes that each load their own GFPGANer from restorer_path and share
+    the CPU cores between them, and the caller needs no restorer of its own.
+    Workers are sent only the worker_region crop around each pasted face
+    (and, with mouth_only, the same crop of the frame that receives it) and
+    the restored crops are written back here; results are collected in
+    submission order, so frames reach the encoder in order.
+    """
+
+    def __init__(self, restorer=None, restorer_path=None, workers=0, batch_size=8, device='cpu'):
+        self.restorer = restorer
+        self.batch_size = max(1, batch_size)
+        self.device = str(device)
+        self.executor = None
+        if workers > 0:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            print(f"✨ Starting {workers} GFPGAN worker processes ({threads} threads each)")
+            self.executor = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker, initargs=(restorer_path, self.device, threads))
+
+    @property
+    def restoring(self):
+        return self.restorer is not None or self.executor is not None
+
+    def measure(self, frame, patch, coords, mode='full', weight=0.5, mouth_only=False):
+        """Working memory and weights of one restorer (see measure()), in a worker if there are any."""
+        if self.executor is None:
+            return measure(self.restorer, frame, patch, coords, mode, weight, mouth_only, self.device)
+        y1, y2, x1, x2 = region = worker_region(coords, frame.shape)
+        return self.executor.submit(_measure_in_worker, frame[y1:y2, x1:x2], patch,
+                                    to_region(coords, region), mode, weight, mouth_only, self.device).result()
+
+    def paste(self, frames, patches, coords, mouth_only=False):
+        """paste_batch() for this pool: (frames to restore, frames that receive the restored faces)."""
+        return paste_batch(frames, patches, coords, self.restoring, mouth_only)
+
+    def restore(self, pasted, targets, coords, mode='full', weight=0.5, mouth_only=False):
+        """restore_pasted() over GFPGAN batches of paste() output; returns the output frames."""
+        spans = [slice(i, i + self.batch_size) for i in range(0, len(pasted), self.batch_size)]
+        if self.executor is None:
+            out = []
+            for s in spans:
+                out.extend(restore_pasted(self.restorer, pasted[s], targets[s], coords[s],
+                                          mode, weight, mouth_only))
+            return out
+        regions = [worker_region(c, f.shape) for f, c in zip(pasted, coords)]
+        crops = [f[y1:y2, x1:x2] for f, (y1, y2, x1, x2) in zip(pasted, regions)]
+        target_crops = None
+        if targets is not pasted:
+            target_crops = [f[y1:y2, x1:x2] for f, (y1, y2, x1, x2) in zip(targets, regions)]
+        local = [to_region(c, r) for c, r in zip(coords, regions)]
+        futures = [self.executor.submit(_restore_in_worker, crops[s],
+                                        None if target_crops is None else target_crops[s], local[s],
+                                        mode, weight, mouth_only) for s in spans]
+        restored = [crop for fut in futures for crop in fut.result()]
+        for f, (y1, y2, x1, x2), crop in zip(targets, regions, restored):
+            f[y1:y2, x1:x2] = crop
+        return targets
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import inference
+
+
+class Wav2LipService:
+    """Long-lived lip-sync worker that keeps Wav2Lip, S3FD and GFPGAN warm.
+
+    Models are loaded once in the constructor and every job runs
+    inference.main() in-process on a single worker thread, so requests only
+    pay for the actual lip-sync work and never run on the models at once.
+    Options that decide which models are loaded (MODEL_OPTIONS) are fixed
+    by the constructor; a job that overrides them is rejected.
+    """
+
+    MODEL_OPTIONS = ('face_detector', 'face_det_min_size', 'face_det_max_size', 'precision', 'eager',
+                     'restorer', 'restorer_path', 'skip_gfpgan', 'restorer_workers')
+
+    def __init__(self, checkpoint_path, restorer=None, restorer_path=None, **defaults):
+        self.defaults = dict(defaults, restorer=restorer, restorer_path=restorer_path)
+        self.checkpoint_path = checkpoint_path
+
+        self.load_args = inference.make_args(checkpoint_path, '', '', **self.defaults)
+        self.models = inference.load_models(self.load_args)
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='wav2lip')
+
+    def _run(self, face, audio, outfile, options):
+        args = inference.make_args(self.checkpoint_path, face, audio,
+                                   outfile=outfile, **dict(self.defaults, **options))
+        return inference.main(args, models=self.models)
+
+    def submit(self, face, audio, outfile, **options):
+        """Queue a job and return a concurrent.futures.Future for the output path."""
+        for name in self.MODEL_OPTIONS:
+            if name in options and options[name] != getattr(self.load_args, name):
+                raise ValueError('{}={!r} does not match the loaded models ({!r}); start a Wav2LipService '
+                                 'with it instead'.format(name, options[name], getattr(self.load_args, name)))
+        out_dir = os.path.dirname(outfile)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        return self._executor.submit(self._run, face, audio, outfile, options)
+
+    def run(self, face, audio, outfile, **options):
+        return self.submit(face, audio, outfile, **options).result()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        inference.close_models(self.models)
@@ -0,0 +1,231 @@
+import copy
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import torch
+
+import checkpoints
+import face_boxes
+import inference
+import memory_plan
+from array_cache import file_digest
+
+
+JOURNAL_NAME = 'journal.json'
+
+# Options that do not change the rendered pixels; they may differ between a
+# run and its --resume.
+_NON_RENDER_OPTIONS = {'outfile', 'resume', 'segment_dir', 'shards', 'frame_range', 'video_only', 'writer',
+                       'pipeline', 'pipeline_queue_size', 'ffmpeg_threads', 'restorer_workers',
+                       'face_det_batch_size', 'face_box_cache', 'audio', 'face', 'checkpoint_path',
+                       'wav2lip_batch_size', 'restorer_batch_size', 'memory_budget', '_memory_share', 'mel_cache',
+                       'face_feats_cache'}
+
+_worker_models = None
+
+
+def split_range(total, shards):
+    """Up to `shards` contiguous, near-equal [start, end) spans covering range(total)."""
+    bounds = np.linspace(0, total, shards + 1).round().astype(int)
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def fixed_spans(total, size):
+    """Contiguous [start, end) spans of `size` frames (the last may be shorter)."""
+    return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+
+def journal_key(args, video_sha1, audio_sha1, num_frames_needed):
+    """What a segment directory was rendered from; --resume only reuses segments if this matches."""
+    options = {k: v for k, v in sorted(vars(args).items()) if k not in _NON_RENDER_OPTIONS}
+    return {'video_sha1': video_sha1, 'audio_sha1': audio_sha1,
+            'checkpoint_sha1': checkpoints.source_digest(args.checkpoint_path),
+            'num_frames': num_frames_needed, 'options': json.loads(json.dumps(options, default=str))}
+
+
+class Journal:
+    """Completed [start, end) segments of one job, kept as journal.json in its segment directory.
+
+    Every record() rewrites the file atomically, so a crash at any point
+    leaves a journal that lists only segments whose files are complete.
+    """
+
+    def __init__(self, workdir, key, resume):
+        self.path = os.path.join(workdir, JOURNAL_NAME)
+        self.key = key
+        self.done = {}
+        if resume and os.path.isfile(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get('key') != key:
+                raise ValueError(f"{self.path} was written for a different job (inputs or options changed). "
+                                 "Remove the segment directory or run without --resume.")
+            self.done = {(s, e): os.path.join(workdir, name) for s, e, name in data['segments']}
+            self.done = {span: path for span, path in self.done.items() if os.path.isfile(path)}
+        self._write()
+
+    def record(self, span, path):
+        self.done[tuple(span)] = path
+        self._write()
+
+    def _write(self):
+        segments = [[s, e, os.path.basename(p)] for (s, e), p in sorted(self.done.items())]
+        partial_path = self.path + '.partial'
+        with open(partial_path, 'w') as f:
+            json.dump({'key': self.key, 'segments': segments}, f, indent=1)
+        os.replace(partial_path, self.path)
+
+
+def _init_worker(threads, args):
+    global _worker_models
+    torch.set_num_threads(threads)
+    _worker_models = inference.load_models(args, detector=False)
+
+
+def _render_segment(args):
+    return inference.main(args, _worker_models)
+
+
+def concat_segments(segment_paths, audio_path, outfile, workdir):
+    """Join video-only segments by stream copy (concat demuxer) and mux the audio."""
+    list_path = os.path.join(workdir, 'segments.txt')
+    with open(list_path, 'w') as f:
+        for path in segment_paths:
+            f.write("file '{}'\n".format(os.path.abspath(path)))
+    command = ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+               '-i', audio_path, '-map', '0:v:0', '-map', '1:a:0', '-c:v', 'copy', '-c:a', 'aac', outfile]
+    subprocess.check_call(command)
+
+
+def resolve_boxes(args, models, workdir, video_stream, full_frames, num_frames, fps, video_sha1, src_size):
+    """Path of a face-box file every shard can read, or None when args already pins the boxes.
+
+    Looks in the face-box cache first and otherwise runs detection once here,
+    so shards never detect on their own.
+    """
+    if args.face_det_results or args.box[0] != -1:
+        return None
+    path = os.path.join(workdir, 'boxes.boxes')
+    if os.path.isfile(path) and face_boxes.load(path)[1].get('video_sha1') == video_sha1:
+        return path     # left by the run being resumed
+    boxes = inference.find_cached_boxes(args, video_sha1, src_size, num_frames)
+    if boxes is None:
+        detector = (models or {}).get('detector') or inference.load_detector(args)
+        face_det_results = inference.detect_boxes(args, detector, video_stream, full_frames, num_frames, fps,
+                                                  video_sha1, src_size)
+        boxes = [(x1, y1, x2, y2) for (y1, y2, x1, x2) in face_det_results]
+
+    face_boxes.save(path, face_boxes.frame_to_source(boxes, src_size, args), video_sha1, args,
+                    fps, num_frames, src_size, raw=False)
+    return path
+
+
+def segment_dir(args):
+    return args.segment_dir or os.path.splitext(args.outfile)[0] + '.segments'
+
+
+def render_segments(args, models=None):
+    """Render one job as a series of video-only segments and join them.
+
+    With --shards N the output is cut into N spans rendered by N spawned
+    worker processes, each with its own models and cpu_count / N torch
+    threads. With --segment_frames the spans are that many frames long and
+    go to a persistent segment directory whose journal records every finished
+    segment; --resume skips those and renders only what is missing. The
+    parent does the shared work once (mel chunk count, face boxes) and, since all segments use the same encoder settings, the
+    concat demuxer joins them without re-encoding while the audio is muxed in.
+    """
+    if not os.path.isfile(args.face):
+        raise ValueError('--face argument must be a valid path to video/image file')
+    if args.resume and args.segment_frames <= 0:
+        raise ValueError('--resume needs --segment_frames')
+    persistent = args.segment_frames > 0
+    if persistent:
+        workdir = segment_dir(args)
+        os.makedirs(workdir, exist_ok=True)
+    else:
+        os.makedirs('temp', exist_ok=True)
+        workdir = tempfile.mkdtemp(prefix='shards-', dir='temp')
+
+    video_stream, own_models = None, False
+    try:
+        video_sha1 = file_digest(args.face)
+        audio_sha1 = file_digest(args.audio)
+        src_size = face_boxes.source_size(args.face)
+        full_frames, video_stream, fps, num_frames = inference.open_frames(args, video_sha1)
+        num_frames_needed = len(inference.load_mel_chunks(args, fps))
+        journal = Journal(workdir, journal_key(args, video_sha1, audio_sha1, num_frames_needed), args.resume)
+        boxes_path = resolve_boxes(args, models, workdir, video_stream, full_frames, num_frames, fps,
+                                   video_sha1, src_size)
+        if video_stream is not None:
+            video_stream.release()
+            video_stream = None
+
+        if persistent:
+            spans = fixed_spans(num_frames_needed, args.segment_frames)
+        else:
+            spans = split_range(num_frames_needed, args.shards)
+        pending = [span for span in spans if span not in journal.done]
+        workers = max(1, min(args.shards, len(pending)))
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        print(f"✨ Rendering {num_frames_needed} frames as {len(spans)} segments "
+              f"({len(spans) - len(pending)} already done) with {workers} worker(s)")
+
+        # Every worker plans its batches on its own part of --memory_budget
+        memory_budget = args.memory_budget
+        if workers > 1 and memory_budget and memory_plan.can_measure(inference.device):
+            memory_budget = memory_plan.split(memory_budget, workers)
+
+        segment_args = {}
+        for start, end in pending:
+            a = copy.copy(args)
+            a.frame_range = [start, end]
+            a.outfile = os.path.join(workdir, 'part-{:08d}-{:08d}.mp4'.format(start, end))
+            a.writer, a.video_only = 'ffmpeg', True
+            if boxes_path is not None:
+                a.face_det_results = boxes_path
+            if workers > 1:
+                a.ffmpeg_threads = threads
+                a.memory_budget, a._memory_share = memory_budget, getattr(args, '_memory_share', 1.) / workers
+            segment_args[(start, end)] = a
+
+        if workers > 1:
+            errors = []
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker, initargs=(threads, args)) as executor:
+                futures = {executor.submit(_render_segment, a): span for span, a in segment_args.items()}
+                for future in as_completed(futures):
+                    try:
+                        journal.record(futures[future], future.result())
+                    except Exception as e:
+                        errors.append(e)
+            if errors:
+                raise errors[0]
+        elif segment_args:
+            own_models = models is None
+            if own_models:
+                models = inference.load_models(args, detector=False)
+            for span, a in segment_args.items():
+                journal.record(span, inference.main(a, models))
+
+        out_dir = os.path.dirname(args.outfile)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        concat_segments([journal.done[span] for span in spans], args.audio, args.outfile, workdir)
+    finally:
+        if video_stream is not None:
+            video_stream.release()
+        if own_models:
+            inference.close_models(models)
+        if not persistent:
+            shutil.rmtree(workdir, ignore_errors=True)
+    if persistent:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(f"✅ Joined {len(spans)} segments into {args.outfile}")
+    return args.outfile
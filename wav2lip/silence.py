@@ -0,0 +1,44 @@
+import numpy as np
+
+import audio
+import checkpoints
+import frame_store
+from hparams import hparams as hp
+
+SILENCE_DB = -60.
+MIN_RUN = 5     # shorter pauses (stops, breaths between words) are still rendered
+
+
+def silent_mel_chunk():
+    """The (80, 16) mel chunk of digital silence, what a closed mouth is rendered from."""
+    return audio.melspectrogram(np.zeros(16 * audio.get_hop_size(), np.float32))[:, :16]
+
+
+def chunk_levels(mel_chunks):
+    """Loudest mel bin of every chunk in dB (-100 is digital silence)."""
+    if not len(mel_chunks):
+        return np.zeros(0)
+    return audio._denormalize(np.asarray(mel_chunks)).max(axis=(1, 2))
+
+
+def silent_frames(mel_chunks, threshold_db=SILENCE_DB, min_run=MIN_RUN, start=0):
+    """Output frames (mel_chunks[0] is frame `start`) in runs of at least min_run silent chunks."""
+    silent = np.concatenate([[False], chunk_levels(mel_chunks) <= threshold_db, [False]])
+    edges = np.flatnonzero(np.diff(silent.astype(np.int8)))
+    frames = set()
+    for run_start, run_end in zip(edges[::2], edges[1::2]):
+        if run_end - run_start >= min_run:
+            frames.update(range(start + run_start, start + run_end))
+    return frames
+
+
+def store_key(args):
+    """What closed-mouth renders depend on besides the base frames (see frame_store.store_key)."""
+    return {'checkpoint_sha1': checkpoints.source_digest(args.checkpoint_path), 'pads': list(args.pads),
+            'box': list(args.box), 'smooth': not args.nosmooth, 'restorer': frame_store.restorer_key(args)}
+
+
+def check_store(store, args):
+    if store.meta.get('silence') != store_key(args):
+        raise ValueError('{} was rendered with a different checkpoint, face box or restorer settings. '
+                         'Re-run precompute_silence.py.'.format(store.path))
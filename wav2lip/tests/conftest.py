@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The wav2lip modules import each other as top-level modules (import audio, import inference, ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
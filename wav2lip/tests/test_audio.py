@@ -0,0 +1,52 @@
+import shutil
+
+import numpy as np
+import pytest
+from scipy.io import wavfile
+
+import audio
+
+librosa = pytest.importorskip('librosa')
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='load_wav needs ffmpeg')
+
+
+def tone(sr, seconds, freqs, seed=0):
+    """(samples, channels) int16 test signal: one sine plus noise per channel."""
+    t = np.arange(int(sr * seconds)) / float(sr)
+    rng = np.random.default_rng(seed)
+    channels = [0.4 * np.sin(2 * np.pi * f * t) + rng.normal(0, 0.05, len(t)) for f in freqs]
+    return (np.stack(channels, 1) * 32767).astype(np.int16)
+
+
+@pytest.mark.parametrize('src_sr', [16000, 44100, 48000])
+@pytest.mark.parametrize('freqs', [(440,), (440, 1000), (220, 440, 3000)], ids=['mono', 'stereo', '3ch'])
+@pytest.mark.parametrize('sr', [16000, 22050])
+def test_load_wav_matches_librosa(tmp_path, src_sr, freqs, sr):
+    path = str(tmp_path / 'in.wav')
+    data = tone(src_sr, 1.5, freqs)
+    wavfile.write(path, src_sr, data if len(freqs) > 1 else data[:, 0])
+
+    wav = audio.load_wav(path, sr)
+    expected = librosa.load(path, sr=sr)[0]
+    assert wav.dtype == np.float32
+    assert len(wav) == len(expected)
+    np.testing.assert_allclose(wav, expected, rtol=0, atol=1e-6)
+
+
+def test_stereo_is_the_channel_average(tmp_path):
+    # Opposite channels cancel; one silent channel halves the other (ffmpeg's -ac 1 gives about 0.707)
+    path = str(tmp_path / 'opposite.wav')
+    left = tone(16000, 0.5, (440,))[:, 0]
+    wavfile.write(path, 16000, np.stack([left, -left], 1))
+    np.testing.assert_allclose(audio.load_wav(path, 16000), 0, atol=1e-6)
+
+    path = str(tmp_path / 'one_side.wav')
+    wavfile.write(path, 16000, np.stack([left, np.zeros_like(left)], 1))
+    np.testing.assert_allclose(audio.load_wav(path, 16000), left / 32768. / 2, atol=1e-6)
+
+
+def test_load_wav_reports_undecodable_input(tmp_path):
+    path = tmp_path / 'bad.wav'
+    path.write_bytes(b'not audio')
+    with pytest.raises(ValueError):
+        audio.load_wav(str(path), 16000)
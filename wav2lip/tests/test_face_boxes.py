@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import face_boxes
+
+SRC_SIZE = (320, 240)
+TRANSFORMS = [
+    dict(resize_factor=1, rotate=False, crop=[0, -1, 0, -1]),
+    dict(resize_factor=2, rotate=False, crop=[0, -1, 0, -1]),
+    dict(resize_factor=1, rotate=True, crop=[0, -1, 0, -1]),
+    dict(resize_factor=2, rotate=True, crop=[10, -1, 20, 100]),
+    dict(resize_factor=1, rotate=False, crop=[30, 200, 40, 300]),
+]
+
+
+def job(pads=(0, 10, 0, 0), nosmooth=False, **transform):
+    return SimpleNamespace(pads=list(pads), nosmooth=nosmooth, **dict(TRANSFORMS[0], **transform))
+
+
+def transform_frame(f, args):
+    """inference.transform_frame without importing inference."""
+    import cv2
+    if args.resize_factor > 1:
+        f = cv2.resize(f, (f.shape[1] // args.resize_factor, f.shape[0] // args.resize_factor))
+    if args.rotate:
+        f = cv2.rotate(f, cv2.ROTATE_90_CLOCKWISE)
+    y1, y2, x1, x2 = args.crop
+    if x2 == -1: x2 = f.shape[1]
+    if y2 == -1: y2 = f.shape[0]
+    return f[y1:y2, x1:x2]
+
+
+@pytest.mark.parametrize('transform', TRANSFORMS)
+def test_source_frame_round_trip(transform):
+    args = job(**transform)
+    boxes = np.array([[40, 60, 120, 180], [100, 20, 300, 230]], np.float64)
+    frame = face_boxes.source_to_frame(boxes, SRC_SIZE, args)
+    np.testing.assert_allclose(face_boxes.frame_to_source(frame, SRC_SIZE, args), boxes,
+                               atol=args.resize_factor)
+
+
+@pytest.mark.parametrize('transform', TRANSFORMS)
+def test_source_to_frame_follows_transform_frame(transform):
+    args = job(**transform)
+    w, h = SRC_SIZE
+    src = np.zeros((h, w), np.uint8)
+    x1, y1, x2, y2 = 80, 60, 200, 180
+    src[y1:y2, x1:x2] = 255
+    frame = transform_frame(src, args)
+
+    assert face_boxes.frame_size(SRC_SIZE, args) == (frame.shape[1], frame.shape[0])
+    ys, xs = np.nonzero(frame > 127)
+    expected = [xs.min(), ys.min(), xs.max() + 1, ys.max() + 1]
+    np.testing.assert_allclose(face_boxes.source_to_frame([x1, y1, x2, y2], SRC_SIZE, args)[0], expected, atol=1)
+
+
+def test_pad_and_smooth_pads_and_clips():
+    args = job(pads=(5, 10, 3, 4), nosmooth=True)
+    boxes = face_boxes.pad_and_smooth([[2.7, 1.2, 100.9, 50.5], [50, 60, 318, 235]], (320, 240), args)
+    np.testing.assert_array_equal(boxes, [[0, 0, 104, 60], [47, 55, 320, 240]])
+
+
+def test_pad_and_smooth_averages_over_five_frames():
+    boxes = np.zeros((8, 4))
+    boxes[:, 0] = [0, 0, 0, 0, 10, 0, 0, 0]
+    smoothed = face_boxes.pad_and_smooth(boxes, (320, 240), job(pads=(0, 0, 0, 0)))
+    np.testing.assert_array_equal(smoothed[:, 0], [2, 2, 2, 2, 2, 0, 0, 0])
+
+
+def test_lookup_applies_job_pads_to_raw_entry(tmp_path):
+    saved = job(pads=(0, 0, 0, 0), nosmooth=True)
+    raw = np.array([[100, 50, 200, 180]] * 6, np.float32)
+    path = face_boxes.cache_path(str(tmp_path), 'abc', saved)
+    face_boxes.save(path, raw, 'abc', saved, 25., 6, SRC_SIZE)
+
+    for pads in ([0, 10, 0, 0], [5, 5, 5, 5]):
+        args = job(pads=pads, resize_factor=2)
+        hit = face_boxes.lookup(str(tmp_path), 'abc', args, 6, SRC_SIZE)
+        assert hit is not None and hit[0] == path
+        expected = face_boxes.pad_and_smooth(face_boxes.source_to_frame(raw, SRC_SIZE, args),
+                                             face_boxes.frame_size(SRC_SIZE, args), args)
+        np.testing.assert_array_equal(hit[1], expected)
+
+    assert face_boxes.lookup(str(tmp_path), 'abc', job(), 7, SRC_SIZE) is None
+    assert face_boxes.lookup(str(tmp_path), 'other', job(), 6, SRC_SIZE) is None
+
+
+def test_resolved_boxes_are_used_as_stored(tmp_path):
+    args = job(pads=(0, 10, 0, 0))
+    boxes = np.array([[100, 50, 200, 190]] * 4, np.float32)
+    path = str(tmp_path / 'resolved.boxes')
+    face_boxes.save(path, boxes, 'abc', args, 25., 4, SRC_SIZE, raw=False)
+
+    stored, meta = face_boxes.load(path)
+    assert not face_boxes.is_raw(meta)
+    np.testing.assert_array_equal(face_boxes.resolve(stored, meta, SRC_SIZE, args), boxes)
+    # Not a raw entry, so the cache does not hand it to jobs with other pads
+    assert face_boxes.lookup(str(tmp_path), 'abc', args, 4, SRC_SIZE) is None
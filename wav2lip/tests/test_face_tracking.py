@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from face_tracking import KeyframeTracker, box_iou
+
+
+def make_frames(n, size=64):
+    """Near-identical frames with their index in the first pixel, so the thumbnails do not move."""
+    frames = np.full((n, size, size, 3), 128, np.uint8)
+    frames[:, 0, 0, 0] = np.arange(n)
+    return list(frames)
+
+
+def moving_box(i):
+    return (10. + i, 20. + 2 * i, 110. + i, 140. + 2 * i)
+
+
+class Detector:
+    def __init__(self, box_fn=moving_box):
+        self.box_fn = box_fn
+        self.calls = []
+
+    def __call__(self, frames):
+        indices = [int(f[0, 0, 0]) for f in frames]
+        self.calls.extend(indices)
+        return [self.box_fn(i) for i in indices]
+
+
+def test_box_iou():
+    assert box_iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.
+    assert box_iou((0, 0, 10, 10), (20, 20, 30, 30)) == 0.
+    assert box_iou((0, 0, 10, 10), (5, 0, 15, 10)) == pytest.approx(50. / 150.)
+
+
+def test_detects_keyframes_and_interpolates_between_them():
+    detector = Detector()
+    tracker = KeyframeTracker(detector, stride=5)
+    boxes = tracker.track(make_frames(12))
+
+    assert detector.calls == [0, 5, 10, 11]
+    assert (tracker.detected, tracker.frames) == (4, 12)
+    np.testing.assert_allclose(boxes, [moving_box(i) for i in range(12)], rtol=0, atol=1e-4)
+
+
+def test_interpolates_across_chunks():
+    frames = make_frames(20)
+    detector = Detector()
+    tracker = KeyframeTracker(detector, stride=6)
+    boxes = tracker.track(frames[:8]) + tracker.track(frames[8:])
+
+    assert len(boxes) == 20
+    assert tracker.detected < 20
+    np.testing.assert_allclose(boxes, [moving_box(i) for i in range(20)], rtol=0, atol=1e-4)
+
+
+def test_redetects_gap_when_keyframes_disagree():
+    # The face jumps between the two keyframes, so nothing in between is interpolated
+    detector = Detector(lambda i: (0., 0., 50., 50.) if i < 5 else (200., 200., 250., 250.))
+    tracker = KeyframeTracker(detector, stride=8)
+    boxes = tracker.track(make_frames(9))
+
+    assert sorted(detector.calls) == list(range(9))
+    assert boxes[4] == (0., 0., 50., 50.) and boxes[5] == (200., 200., 250., 250.)
+
+
+def test_redetects_gap_after_missed_face():
+    detector = Detector(lambda i: None if i == 0 else (0., 0., 50., 50.))
+    tracker = KeyframeTracker(detector, stride=4)
+    boxes = tracker.track(make_frames(5))
+
+    assert sorted(detector.calls) == list(range(5))
+    assert boxes[0] is None and all(b == (0., 0., 50., 50.) for b in boxes[1:])
+
+
+def test_motion_starts_a_keyframe():
+    frames = make_frames(10)
+    for f in frames[6:]:
+        f[8:, :] = 255     # scene cut at frame 6
+    detector = Detector()
+    tracker = KeyframeTracker(detector, stride=100, motion_threshold=8.)
+    tracker.track(frames)
+
+    assert detector.calls == [0, 6, 9]
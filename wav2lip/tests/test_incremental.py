@@ -0,0 +1,54 @@
+import numpy as np
+
+import incremental
+from hparams import hparams as hp
+
+FPS = 25.
+SAMPLES_PER_FRAME = int(hp.sample_rate / FPS)
+
+
+def noise(seconds, seed):
+    return np.random.default_rng(seed).normal(0, 0.1, int(seconds * hp.sample_rate)).astype(np.float32)
+
+
+def num_frames(wav):
+    return len(incremental.chunk_starts(len(wav), FPS))
+
+
+def test_identical_audio_reuses_every_frame():
+    wav = noise(4, 0)
+    reuse = incremental.plan_reuse(wav, wav.copy(), FPS)
+    assert reuse == {j: j for j in range(num_frames(wav))}
+
+
+def test_unrelated_audio_reuses_nothing():
+    assert incremental.plan_reuse(noise(4, 0), noise(4, 1), FPS) == {}
+
+
+def test_insertion_shifts_the_frames_after_it():
+    old = noise(6, 0)
+    at, inserted = 2 * hp.sample_rate, 25 * SAMPLES_PER_FRAME      # one second, whole frames
+    new = np.concatenate([old[:at], noise(1, 2), old[at:]])
+    reuse = incremental.plan_reuse(new, old, FPS)
+
+    edit = at // SAMPLES_PER_FRAME
+    shift = inserted // SAMPLES_PER_FRAME
+    for j, i in reuse.items():
+        assert i == (j if j < edit else j - shift)
+    # Frames clear of the edit (a chunk reads 16 mel columns, about 5 frames ahead) are all found
+    assert all(reuse.get(j) == j for j in range(edit - 6))
+    assert all(reuse.get(j) == j - shift for j in range(edit + shift + 3, num_frames(new) - 3))
+    # Frames whose audio contains the new second are rendered
+    assert not any(edit + 1 <= j < edit + shift - 1 for j in reuse)
+
+
+def test_short_runs_are_not_reused():
+    old = noise(4, 0)
+    new = old.copy()
+    # Two changed samples whose chunks leave only frames 31-33 untouched in between
+    new[30 * SAMPLES_PER_FRAME] += 0.5
+    new[33 * SAMPLES_PER_FRAME + 3501] += 0.5
+    assert [j for j in incremental.plan_reuse(new, old, FPS, min_run=1) if 25 <= j < 40] == [31, 32, 33]
+    reuse = incremental.plan_reuse(new, old, FPS, min_run=5)
+    assert not any(25 <= j < 40 for j in reuse)
+    assert all(reuse.get(j) == j for j in range(25))
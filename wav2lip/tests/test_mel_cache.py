@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import mel_cache
+from mel_cache import MEL_STEP_SIZE
+
+
+def reference_chunks(mel, fps):
+    """The original inference.py chunking loop."""
+    mel_chunks = []
+    mel_idx_multiplier = 80. / fps
+    i = 0
+    while 1:
+        start_idx = int(i * mel_idx_multiplier)
+        if start_idx + MEL_STEP_SIZE > len(mel[0]):
+            mel_chunks.append(mel[:, len(mel[0]) - MEL_STEP_SIZE:])
+            break
+        mel_chunks.append(mel[:, start_idx: start_idx + MEL_STEP_SIZE])
+        i += 1
+    return mel_chunks
+
+
+@pytest.mark.parametrize('fps', [24., 25., 29.97, 30., 50., 60.])
+@pytest.mark.parametrize('mel_len', [16, 17, 80, 81, 799, 800, 801, 2003])
+def test_chunk_starts_match_reference_loop(mel_len, fps):
+    mel = np.random.default_rng(0).normal(size=(80, mel_len)).astype(np.float32)
+    expected = reference_chunks(mel, fps)
+    chunks = mel_cache.MelChunks.from_mel(mel, fps)
+
+    assert len(chunks) == len(expected)
+    for i, chunk in enumerate(expected):
+        np.testing.assert_array_equal(chunks[i], chunk)
+    np.testing.assert_array_equal(chunks.batch(0, len(chunks)), np.stack(expected))
+
+
+def test_chunk_starts_rejects_short_audio():
+    with pytest.raises(ValueError):
+        mel_cache.chunk_starts(MEL_STEP_SIZE - 1, 25.)
+
+
+def test_slices_keep_their_frames():
+    mel = np.arange(80 * 200, dtype=np.float32).reshape(80, 200)
+    chunks = mel_cache.MelChunks.from_mel(mel, 25.)
+    part = chunks[10:20]
+    assert len(part) == 10
+    np.testing.assert_array_equal(part.batch(0, 10), chunks.batch(10, 20))
@@ -0,0 +1,48 @@
+import pytest
+
+import memory_plan
+
+GB = 1 << 30
+
+
+@pytest.fixture
+def memory(monkeypatch):
+    """Pretend this process holds 1 GB and the system has 6 GB available."""
+    state = {'resident': 1 * GB, 'available': 6 * GB}
+    monkeypatch.setattr(memory_plan, 'resident', lambda: state['resident'])
+    monkeypatch.setattr(memory_plan, '_proc_bytes', lambda path, key: state['available'])
+    return state
+
+
+@pytest.mark.parametrize('text, expected', [('7G', 7 * GB), ('512M', 512 << 20), ('1.5g', int(1.5 * GB)),
+                                            ('64000K', 64000 << 10), ('123456', 123456), ('2GiB', 2 * GB),
+                                            ('auto', None)])
+def test_parse_size(text, expected):
+    assert memory_plan.parse_size(text) == expected
+
+
+def test_parse_size_rejects_garbage():
+    with pytest.raises(ValueError):
+        memory_plan.parse_size('lots')
+
+
+def test_split_divides_what_the_budget_leaves(memory):
+    # 5 GB budget, 1 GB already used here: 4 GB between 4 workers
+    share = memory_plan.split('5G', 4)
+    assert memory_plan.parse_size(share) == GB
+
+
+def test_split_is_capped_by_available_memory(memory):
+    # The budget exceeds the 7 GB this process could reach (1 GB held + 6 GB available)
+    assert memory_plan.parse_size(memory_plan.split('64G', 3)) == 2 * GB
+    assert memory_plan.parse_size(memory_plan.split('auto', 3)) == 2 * GB
+
+
+def test_split_never_goes_negative(memory):
+    memory['resident'] = 3 * GB
+    assert memory_plan.split('2G', 2) == '0'
+
+
+def test_worker_budgets_sum_to_at_most_the_whole(memory):
+    for workers in range(1, 9):
+        assert workers * memory_plan.parse_size(memory_plan.split('5G', workers)) <= 4 * GB
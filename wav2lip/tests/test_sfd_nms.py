@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import torch
+
+from face_detection.detection.sfd import bbox
+
+
+def random_dets(rng, n, clusters=3):
+    """(n, 5) x1, y1, x2, y2, score candidates clustered around a few faces, with distinct scores."""
+    centres = rng.uniform(50, 300, (clusters, 2))
+    c = centres[rng.integers(0, clusters, n)] + rng.normal(0, 6, (n, 2))
+    half = rng.uniform(20, 40, (n, 1))
+    scores = rng.permutation(n) / float(n) * 0.5 + 0.5
+    return np.hstack([c - half, c + half, scores[:, None]]).astype(np.float32)
+
+
+def reference_batched_nms(boxes, scores, idxs, iou_threshold):
+    """torchvision.ops.batched_nms semantics (exclusive x2/y2, keep order by score) in plain torch."""
+    order = torch.argsort(scores, descending=True)
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    suppressed = torch.zeros(len(boxes), dtype=torch.bool)
+    for i in order.tolist():
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        w = (torch.minimum(boxes[i, 2], boxes[:, 2]) - torch.maximum(boxes[i, 0], boxes[:, 0])).clamp(min=0)
+        h = (torch.minimum(boxes[i, 3], boxes[:, 3]) - torch.maximum(boxes[i, 1], boxes[:, 1])).clamp(min=0)
+        iou = w * h / (area[i] + area - w * h)
+        suppressed |= (iou > iou_threshold) & (idxs == idxs[i])
+    return torch.tensor(keep, dtype=torch.int64)
+
+
+def make_batch(seed):
+    rng = np.random.default_rng(seed)
+    return [random_dets(rng, n) for n in (40, 0, 1, 25, 60)]
+
+
+def test_nms_keeps_highest_of_overlapping_boxes():
+    dets = np.array([[0, 0, 100, 100, 0.9], [2, 2, 102, 102, 0.95], [200, 200, 260, 260, 0.8]], np.float32)
+    assert bbox.nms(dets, 0.3) == [1, 2]
+    assert bbox.nms(np.zeros((0, 5), np.float32), 0.3) == []
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_batch_nms_matches_per_image_nms(seed):
+    batch = make_batch(seed)
+    kept = bbox.batch_nms(batch, 0.3)
+    assert len(kept) == len(batch)
+    for dets, k in zip(batch, kept):
+        np.testing.assert_array_equal(k, dets[bbox.nms(dets, 0.3)])
+        assert np.all(np.diff(k[:, 4]) <= 0)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_batched_kernel_matches_fallback(seed, monkeypatch):
+    if bbox.tv_batched_nms is None:
+        pytest.skip('torchvision is not installed; batch_nms already uses the fallback')
+    batch = make_batch(seed)
+    kept = bbox.batch_nms(batch, 0.3)
+    monkeypatch.setattr(bbox, 'tv_batched_nms', None)
+    fallback = bbox.batch_nms(batch, 0.3)
+    for a, b in zip(kept, fallback):
+        np.testing.assert_array_equal(a, b)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_batched_path_matches_fallback(seed, monkeypatch):
+    # The one-call path (ids as classes, inclusive-pixel shift) checked against a reference kernel
+    batch = make_batch(seed)
+    monkeypatch.setattr(bbox, 'tv_batched_nms', reference_batched_nms)
+    kept = bbox.batch_nms(batch, 0.3)
+    monkeypatch.setattr(bbox, 'tv_batched_nms', None)
+    fallback = bbox.batch_nms(batch, 0.3)
+    for a, b in zip(kept, fallback):
+        np.testing.assert_array_equal(a, b)
@@ -0,0 +1,43 @@
+import subprocess
+
+import numpy as np
+
+
+class FFmpegPipeWriter:
+    """Drop-in replacement for cv2.VideoWriter that encodes in a single pass.
+
+    Raw BGR frames are streamed to one ffmpeg process over stdin. When
+    `audio_path` is given the audio track is muxed by the same process, so the
+    result is the final H.264/AAC mp4 with no intermediate file on disk.
+    """
+
+    def __init__(self, path, fps, size, audio_path=None, preset='veryfast', crf=18, threads=0):
+        width, height = size
+        self.path = path
+        command = ['ffmpeg', '-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', '{}x{}'.format(width, height),
+                   '-r', str(fps), '-i', '-']
+        if audio_path is not None:
+            command += ['-i', audio_path, '-map', '0:v:0', '-map', '1:a:0', '-c:a', 'aac']
+        command += ['-c:v', 'libx264', '-preset', preset, '-crf', str(crf),
+                    # yuv420p needs even dimensions
+                    '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p',
+                    '-threads', str(threads), path]
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        try:
+            self.proc.stdin.write(memoryview(np.ascontiguousarray(frame)))
+        except BrokenPipeError:
+            raise RuntimeError('ffmpeg encoder for {} exited early (code {})'.format(
+                self.path, self.proc.poll()))
+
+    def release(self):
+        self.proc.stdin.close()
+        if self.proc.wait() != 0:
+            raise RuntimeError('ffmpeg encoder for {} failed with code {}'.format(
+                self.path, self.proc.returncode))
+
+    def abort(self):
+        self.proc.kill()
+        self.proc.wait()